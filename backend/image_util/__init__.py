@@ -6,6 +6,7 @@ from backend.image_util.infill_methods.patchmatch import PatchMatch  # noqa: F40
 from backend.image_util.pngwriter import (  # noqa: F401
     PngWriter,
     PromptFormatter,
+    build_pnginfo,
     retrieve_metadata,
     write_metadata,
 )
@@ -37,11 +37,7 @@ class PngWriter:
     # returns full path of output
     def save_image_and_prompt_to_png(self, image, dream_prompt, name, metadata=None, compress_level=6):
         path = os.path.join(self.outdir, name)
-        info = PngImagePlugin.PngInfo()
-        info.add_text("Dream", dream_prompt)
-        if metadata:
-            info.add_text("sd-metadata", json.dumps(metadata))
-        image.save(path, "PNG", pnginfo=info, compress_level=compress_level)
+        image.save(path, "PNG", pnginfo=build_pnginfo(dream_prompt, metadata), compress_level=compress_level)
         return path
 
     def retrieve_metadata(self, img_basename):
@@ -54,6 +50,17 @@ class PngWriter:
         return all_metadata["sd-metadata"]
 
 
+def build_pnginfo(dream_prompt, metadata=None):
+    """
+    Builds the PNG text chunks that retrieve_metadata() reads back
+    """
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Dream", dream_prompt)
+    if metadata:
+        info.add_text("sd-metadata", json.dumps(metadata))
+    return info
+
+
 def retrieve_metadata(img_path):
     """
     Given a path to a PNG image, returns the "sd-metadata"
@@ -2,8 +2,9 @@
 
 import hashlib
 import os
+import threading
 from pathlib import Path
-from typing import Callable, Literal, Optional, Union
+from typing import Callable, Dict, Literal, Optional, Tuple, Union
 import uuid
 from blake3 import blake3
 from tqdm import tqdm
@@ -34,6 +35,37 @@ HASHING_ALGORITHMS = Literal[
 MODEL_FILE_EXTENSIONS = (".ckpt", ".safetensors", ".bin", ".pt", ".pth")
 
 
+def model_fingerprint(model_path: Union[str, Path]) -> str:
+    """
+    Return a cheap identity for the model at model_path, derived from its resolved path, size and mtime.
+
+    For a directory, the size and mtime are aggregated over the model weights files it contains, so that replacing
+    a weights file inside a diffusers folder changes the fingerprint. No file content is read.
+
+    Args:
+        model_path: Path to the model file or directory
+
+    Returns:
+        str: A string of the form "<path>:<size>:<mtime_ns>"
+    """
+    model_path = Path(model_path).resolve()
+    if model_path.is_file():
+        stat = model_path.stat()
+        return f"{model_path.as_posix()}:{stat.st_size}:{stat.st_mtime_ns}"
+    elif model_path.is_dir():
+        total_size = 0
+        latest_mtime_ns = model_path.stat().st_mtime_ns
+        for root, _dirs, files in os.walk(model_path):
+            for file in files:
+                if file.endswith(MODEL_FILE_EXTENSIONS):
+                    stat = os.stat(os.path.join(root, file))
+                    total_size += stat.st_size
+                    latest_mtime_ns = max(latest_mtime_ns, stat.st_mtime_ns)
+        return f"{model_path.as_posix()}:{total_size}:{latest_mtime_ns}"
+    else:
+        raise OSError(f"Not a valid file or directory: {model_path}")
+
+
 class ModelHash:
     """
     Creates a hash of a model using a specified algorithm. The hash is prefixed by the algorithm used.
@@ -60,8 +92,15 @@ class ModelHash:
         # MD5
         ModelHash("md5").hash("path/to/model/dir/") # "md5:a0cd925fc063f98dbf029eee315060c3"
         ```
+
+    Hashes are memoized per process by `model_fingerprint`, so asking for the hash of an unchanged model again only
+    costs a `stat` call. Any change to the path, size or mtime of the model files invalidates the memoized value.
     """
 
+    # (algorithm, fingerprint) -> hash, shared by all instances
+    _hash_memo: Dict[Tuple[str, str], str] = {}
+    _hash_memo_lock = threading.Lock()
+
     def __init__(
         self, algorithm: HASHING_ALGORITHMS = "blake3_single", file_filter: Optional[Callable[[str], bool]] = None
     ) -> None:
@@ -94,6 +133,23 @@ class ModelHash:
         """
 
         model_path = Path(model_path)
+        if self.algorithm == "random" or self._file_filter is not self._default_file_filter:
+            # Random "hashes" must not repeat, and the fingerprint only tracks the default set of weights files.
+            return self._hash_uncached(model_path)
+
+        memo_key = (self.algorithm, model_fingerprint(model_path))
+        with self._hash_memo_lock:
+            cached = self._hash_memo.get(memo_key)
+        if cached is not None:
+            return cached
+
+        hash_ = self._hash_uncached(model_path)
+        with self._hash_memo_lock:
+            self._hash_memo[memo_key] = hash_
+        return hash_
+
+    def _hash_uncached(self, model_path: Path) -> str:
+        """Compute the hash of the model at model_path, ignoring the fingerprint memo."""
         # blake3_single is a single-threaded version of blake3, prefix should still be "blake3:"
         prefix = self._get_prefix(self.algorithm)
         if model_path.is_file():
@@ -81,6 +81,10 @@ class LoadedModelWithoutConfig:
         finally:
             self._cache.unlock(self._cache_record)
 
+    def prefetch(self, working_mem_bytes: Optional[int] = None) -> bool:
+        """Start loading the model into VRAM ahead of its use, if it fits without offloading other models."""
+        return self._cache.prefetch(self._cache_record, working_mem_bytes)
+
     @property
     def model(self) -> AnyModel:
         """Return the model without locking it."""
@@ -105,6 +109,9 @@ class LoadedModel(LoadedModelWithoutConfig):
 
 class ModelLoaderConfig(BaseModel):
     models_path: Path = Field(default=Path("models"), description="Path to the models directory.")
+    mmap_checkpoints: bool = Field(
+        default=True, description="Memory-map checkpoint files so processes loading the same model share its pages."
+    )
 
 class ModelLoaderBase(ABC):
     """Abstract base class for loading models into RAM/VRAM."""
@@ -1,7 +1,9 @@
-from typing import Any
+from typing import Any, Optional
 
 import torch
 
+from backend.model_manager.load.model_cache.device_transfer import DeviceTransfer
+
 
 class CachedModelOnlyFullLoad:
     """A wrapper around a PyTorch model to handle full loads and unloads between the CPU and the compute device.
@@ -10,7 +12,12 @@ class CachedModelOnlyFullLoad:
     """
 
     def __init__(
-        self, model: torch.nn.Module | Any, compute_device: torch.device, total_bytes: int, keep_ram_copy: bool = False
+        self,
+        model: torch.nn.Module | Any,
+        compute_device: torch.device,
+        total_bytes: int,
+        keep_ram_copy: bool = False,
+        transfer: Optional[DeviceTransfer] = None,
     ):
         """Initialize a CachedModelOnlyFullLoad.
         Args:
@@ -20,6 +27,9 @@ class CachedModelOnlyFullLoad:
             keep_ram_copy (bool): Whether to keep a read-only copy of the model's state dict in RAM. Keeping a RAM copy
                 increases RAM usage, but speeds up model offload from VRAM and LoRA patching (assuming there is
                 sufficient RAM).
+            transfer (DeviceTransfer | None): Used to pin the RAM copy and to copy weights to the compute device. Copies
+                may be asynchronous, so callers must call `transfer.wait()` before using the model. Defaults to
+                synchronous copies.
         """
         # model is often a torch.nn.Module, but could be any model type. Throughout this class, we handle both cases.
         self._model = model
@@ -31,6 +41,14 @@ class CachedModelOnlyFullLoad:
         if isinstance(model, torch.nn.Module) and keep_ram_copy:
             self._cpu_state_dict = model.state_dict()
 
+        self._transfer = transfer or DeviceTransfer(compute_device, async_copies=False)
+        # Pinned RAM copies are what allow host-to-device copies to run asynchronously.
+        self._pinned_bytes = 0
+        if self._cpu_state_dict is not None:
+            self._pinned_bytes = self._transfer.pin(self._cpu_state_dict)
+            if self._pinned_bytes > 0:
+                self._model.load_state_dict(self._cpu_state_dict, assign=True)
+
         self._total_bytes = total_bytes
         self._is_in_vram = False
 
@@ -43,6 +61,10 @@ class CachedModelOnlyFullLoad:
         # TODO(ryand): Document this better.
         return self._cpu_state_dict
 
+    def pinned_bytes(self) -> int:
+        """Get the size (in bytes) of the weights that are held in pinned memory."""
+        return self._pinned_bytes
+
     def total_bytes(self) -> int:
         """Get the total size (in bytes) of all the weights in the model."""
         return self._total_bytes
@@ -74,7 +96,7 @@ class CachedModelOnlyFullLoad:
         if self._cpu_state_dict is not None:
             new_state_dict: dict[str, torch.Tensor] = {}
             for k, v in self._cpu_state_dict.items():
-                new_state_dict[k] = v.to(self._compute_device, copy=True)
+                new_state_dict[k] = self._transfer.to_device(v)
             self._model.load_state_dict(new_state_dict, assign=True)
         self._model.to(self._compute_device)
 
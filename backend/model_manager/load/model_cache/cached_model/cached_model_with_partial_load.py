@@ -1,5 +1,8 @@
+from typing import Optional
+
 import torch
 
+from ..device_transfer import DeviceTransfer
 from ..torch_module_autocast.custom_modules.custom_module_mixin import (
     CustomModuleMixin,
 )
@@ -11,87 +14,103 @@ class CachedModelWithPartialLoad:
 
     Note: "VRAM" is used throughout this class to refer to the memory on the compute device. It could be CUDA memory,
     MPS memory, etc.
+
+    Weights are copied to the compute device through `transfer`. Copies may be asynchronous, so callers must call
+    `transfer.wait()` before running the model.
     """
 
-    def __init__(self, model: torch.nn.Module, compute_device: torch.device, keep_ram_copy: bool = False):
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        compute_device: torch.device,
+        keep_ram_copy: bool = False,
+        transfer: Optional[DeviceTransfer] = None,
+    ):
         self._model = model
         self._compute_device = compute_device
+        self._transfer = transfer or DeviceTransfer(compute_device, async_copies=False)
 
         model_state_dict = model.state_dict()
         # A CPU read-only copy of the model's state dict. Used for faster model unloads from VRAM, and to speed up LoRA
         # patching. Set to `None` if keep_ram_copy is False.
         self._cpu_state_dict: dict[str, torch.Tensor] | None = model_state_dict if keep_ram_copy else None
 
-        # A dictionary of the size of each tensor in the state dict.
-        # HACK(ryand): We use this dictionary any time we are doing byte tracking calculations. We do this for
+        self._modules_that_support_autocast = self._find_modules_that_support_autocast()
+
+        # HACK(ryand): The byte sizes are used any time we are doing byte tracking calculations. We do this for
         # consistency in case the application code has modified the model's size (e.g. by casting to a different
         # precision). Of course, this means that we are making model cache load/unload decisions based on model size
         # data that may not be fully accurate.
-        self._state_dict_bytes = {k: calc_tensor_size(v) for k, v in model_state_dict.items()}
+        (
+            self._state_dict_bytes,
+            self._keys_in_modules_that_do_not_support_autocast,
+            self._state_dict_keys_by_module_prefix,
+        ) = self._index_state_dict(model_state_dict)
 
         self._total_bytes = sum(self._state_dict_bytes.values())
         self._cur_vram_bytes: int | None = None
 
-        self._modules_that_support_autocast = self._find_modules_that_support_autocast()
-        self._keys_in_modules_that_do_not_support_autocast = self._find_keys_in_modules_that_do_not_support_autocast(
-            model_state_dict
-        )
-        self._state_dict_keys_by_module_prefix = self._group_state_dict_keys_by_module_prefix(model_state_dict)
+        # Pinned RAM copies are what allow host-to-device copies to run asynchronously. Only the RAM copy is pinned,
+        # because it is the copy that weights return to when they are offloaded.
+        self._pinned_bytes = 0
+        if self._cpu_state_dict is not None:
+            self._pinned_bytes = self._transfer.pin(self._cpu_state_dict)
+            if self._pinned_bytes > 0:
+                self._model.load_state_dict(self._cpu_state_dict, assign=True)
 
     def _find_modules_that_support_autocast(self) -> dict[str, torch.nn.Module]:
         """Find all modules that support autocasting."""
         return {n: m for n, m in self._model.named_modules() if isinstance(m, CustomModuleMixin)}  # type: ignore
 
-    def _find_keys_in_modules_that_do_not_support_autocast(self, state_dict: dict[str, torch.Tensor]) -> set[str]:
-        keys_in_modules_that_do_not_support_autocast: set[str] = set()
-        for key in state_dict.keys():
-            for module_name in self._modules_that_support_autocast.keys():
-                if key.startswith(module_name):
-                    break
-            else:
-                keys_in_modules_that_do_not_support_autocast.add(key)
-        return keys_in_modules_that_do_not_support_autocast
-
-    def _group_state_dict_keys_by_module_prefix(self, state_dict: dict[str, torch.Tensor]) -> dict[str, list[str]]:
-        """A helper function that groups state dict keys by module prefix.
-
-        Example:
-        ```
-        state_dict = {
-            "weight": ...,
-            "module.submodule.weight": ...,
-            "module.submodule.bias": ...,
-            "module.other_submodule.weight": ...,
-            "module.other_submodule.bias": ...,
-        }
-
-        output = group_state_dict_keys_by_module_prefix(state_dict)
-
-        # The output will be:
-        output = {
-            "": [
-                "weight",
-            ],
-            "module.submodule": [
-                "module.submodule.weight",
-                "module.submodule.bias",
-            ],
-            "module.other_submodule": [
-                "module.other_submodule.weight",
-                "module.other_submodule.bias",
-            ],
-        }
-        ```
+    def _index_state_dict(
+        self, state_dict: dict[str, torch.Tensor]
+    ) -> tuple[dict[str, int], set[str], dict[str, list[str]]]:
+        """Index the state dict in a single pass.
+
+        Returns:
+            - The size in bytes of each tensor in the state dict.
+            - The keys that do not belong to a module (or a descendant of a module) that supports autocasting.
+            - The state dict keys grouped by module prefix, e.g.:
+                ```
+                {
+                    "": ["weight"],
+                    "module.submodule": ["module.submodule.weight", "module.submodule.bias"],
+                }
+                ```
+
+        Each module prefix is resolved against the autocast modules once, by walking up its parent modules, so the
+        cost is linear in the number of keys rather than keys x autocast modules.
         """
+        autocast_module_names = set(self._modules_that_support_autocast.keys())
+        # Module prefix -> whether the module or one of its ancestors supports autocasting.
+        supports_autocast: dict[str, bool] = {}
+
+        def _supports_autocast(module_name: str) -> bool:
+            result = supports_autocast.get(module_name)
+            if result is None:
+                if module_name in autocast_module_names:
+                    result = True
+                elif module_name == "":
+                    result = False
+                else:
+                    result = _supports_autocast(module_name.rpartition(".")[0])
+                supports_autocast[module_name] = result
+            return result
+
+        state_dict_bytes: dict[str, int] = {}
+        keys_in_modules_that_do_not_support_autocast: set[str] = set()
         state_dict_keys_by_module_prefix: dict[str, list[str]] = {}
-        for key in state_dict.keys():
-            split = key.rsplit(".", 1)
-            # `split` will have length 1 if the root module has parameters.
-            module_name = split[0] if len(split) > 1 else ""
-            if module_name not in state_dict_keys_by_module_prefix:
-                state_dict_keys_by_module_prefix[module_name] = []
-            state_dict_keys_by_module_prefix[module_name].append(key)
-        return state_dict_keys_by_module_prefix
+        for key, tensor in state_dict.items():
+            state_dict_bytes[key] = calc_tensor_size(tensor)
+            # The module name is empty if the root module has parameters.
+            module_name = key.rpartition(".")[0]
+            module_keys = state_dict_keys_by_module_prefix.get(module_name)
+            if module_keys is None:
+                module_keys = state_dict_keys_by_module_prefix[module_name] = []
+            module_keys.append(key)
+            if not _supports_autocast(module_name):
+                keys_in_modules_that_do_not_support_autocast.add(key)
+        return state_dict_bytes, keys_in_modules_that_do_not_support_autocast, state_dict_keys_by_module_prefix
 
     def _move_non_persistent_buffers_to_device(self, device: torch.device):
         """Move the non-persistent buffers to the target device. These buffers are not included in the state dict,
@@ -120,6 +139,10 @@ class CachedModelWithPartialLoad:
         # TODO(ryand): Document this better.
         return self._cpu_state_dict
 
+    def pinned_bytes(self) -> int:
+        """Get the size (in bytes) of the weights that are held in pinned memory."""
+        return self._pinned_bytes
+
     def total_bytes(self) -> int:
         """Get the total size (in bytes) of all the weights in the model."""
         return self._total_bytes
@@ -187,7 +210,7 @@ class CachedModelWithPartialLoad:
                 if key in keys_to_convert:
                     # It is important that we overwrite `state_dict[key]` to avoid keeping two copies of the same
                     # parameter.
-                    state_dict[key] = state_dict[key].to(target_device)
+                    state_dict[key] = self._to_device(state_dict[key], target_device)
                 # Note that we keep parameters that have not been moved to a new device in case the module implements
                 # weird custom state dict loading logic that requires all parameters to be present.
                 module_state_dict[key[prefix_len:]] = state_dict[key]
@@ -215,10 +238,15 @@ class CachedModelWithPartialLoad:
             if target_device.type == "cpu":
                 state_dict[key] = cpu_state_dict[key]
             else:
-                state_dict[key] = state_dict[key].to(target_device)
+                state_dict[key] = self._to_device(state_dict[key], target_device)
 
         self._model.load_state_dict(state_dict, assign=True)
 
+    def _to_device(self, tensor: torch.Tensor, target_device: torch.device) -> torch.Tensor:
+        if target_device.type == self._compute_device.type:
+            return self._transfer.to_device(tensor)
+        return tensor.to(target_device)
+
     @torch.no_grad()
     def partial_load_to_vram(self, vram_bytes_to_load: int) -> int:
         """Load more weights into VRAM without exceeding vram_bytes_to_load.
@@ -0,0 +1,84 @@
+import threading
+
+import torch
+
+from backend.util.calc_tensor_size import calc_tensor_size
+
+
+class DeviceTransfer:
+    """Copies model weights from the CPU to the execution device.
+
+    RAM copies of weights are pinned (page-locked) as long as they fit in `pinned_budget_bytes`, so copies from them
+    can run asynchronously. On CUDA, host-to-device copies are issued non-blocking on a dedicated stream, so they
+    overlap with compute on the current stream. Weights copied with `to_device()` must not be used before `wait()` has
+    been called on the stream that will use them.
+
+    On other devices (or with `async_copies=False`) the same calls run synchronously, so this code path is exercised
+    without a GPU as well.
+    """
+
+    def __init__(self, device: torch.device, pinned_budget_bytes: int = 0, async_copies: bool = True):
+        self._device = device
+        self._pinned_budget_bytes = pinned_budget_bytes
+        self._pinned_bytes = 0
+        self._lock = threading.Lock()
+        # Pinned memory and streams are CUDA concepts; other devices copy synchronously.
+        self._stream = torch.cuda.Stream(device) if async_copies and device.type == "cuda" else None
+
+    @property
+    def pinned_bytes(self) -> int:
+        """The number of bytes of pinned memory currently held by cached models."""
+        return self._pinned_bytes
+
+    def pin(self, state_dict: dict[str, torch.Tensor]) -> int:
+        """Replace the CPU tensors in state_dict with pinned copies, while they fit in the pinned budget.
+
+        Tensors that share memory (e.g. tied weights) share a single pinned copy.
+
+        Returns:
+            The number of bytes pinned. Pass it to `release()` when the state dict is dropped.
+        """
+        if self._stream is None:
+            return 0
+
+        bytes_pinned = 0
+        pinned_copies: dict[tuple, torch.Tensor] = {}
+        for key, tensor in state_dict.items():
+            if tensor.device.type != "cpu" or tensor.is_pinned():
+                continue
+            tensor_id = (tensor.data_ptr(), tensor.dtype, tuple(tensor.shape), tensor.stride())
+            if tensor_id in pinned_copies:
+                state_dict[key] = pinned_copies[tensor_id]
+                continue
+
+            size = calc_tensor_size(tensor)
+            with self._lock:
+                if self._pinned_bytes + size > self._pinned_budget_bytes:
+                    # A smaller tensor further on may still fit.
+                    continue
+                self._pinned_bytes += size
+            state_dict[key] = pinned_copies[tensor_id] = tensor.pin_memory()
+            bytes_pinned += size
+        return bytes_pinned
+
+    def release(self, num_bytes: int) -> None:
+        """Return pinned bytes to the budget."""
+        with self._lock:
+            self._pinned_bytes -= num_bytes
+
+    def to_device(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Copy a tensor to the execution device."""
+        if self._stream is None:
+            return tensor.to(self._device, copy=True)
+
+        with torch.cuda.stream(self._stream):
+            result = tensor.to(self._device, non_blocking=True, copy=True)
+        # The copy is consumed on the current stream, so the allocator must not reuse its memory before that stream is
+        # done with it.
+        result.record_stream(torch.cuda.current_stream(self._device))
+        return result
+
+    def wait(self) -> None:
+        """Make the current stream wait for every copy issued so far. This does not block the host."""
+        if self._stream is not None:
+            torch.cuda.current_stream(self._device).wait_stream(self._stream)
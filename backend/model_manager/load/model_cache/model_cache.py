@@ -19,6 +19,7 @@ from backend.model_manager.load.model_cache.cached_model.cached_model_only_full_
 from backend.model_manager.load.model_cache.cached_model.cached_model_with_partial_load import (
     CachedModelWithPartialLoad,
 )
+from backend.model_manager.load.model_cache.device_transfer import DeviceTransfer
 from backend.model_manager.load.model_cache.torch_module_autocast.torch_module_autocast import (
     apply_custom_layers_to_model,
 )
@@ -96,6 +97,7 @@ class ModelCache:
         storage_device: torch.device | str = "cpu",
         log_memory_usage: bool = False,
         logger: Optional[Logger] = None,
+        pinned_memory_gb: float = 0,
     ):
         """Initialize the model RAM cache.
 
@@ -115,6 +117,8 @@ class ModelCache:
             snapshots, so it is recommended to disable this feature unless you are actively inspecting the model cache's
             behaviour.
         :param logger: InvokeAILogger to use (otherwise creates one)
+        :param pinned_memory_gb: The amount of CPU RAM (in GB) that may be pinned to hold the RAM copies of model
+            weights. Copies from pinned memory to the execution device run asynchronously on a dedicated stream.
         """
         self._enable_partial_loading = enable_partial_loading
         self._keep_ram_copy_of_weights = keep_ram_copy_of_weights
@@ -125,6 +129,8 @@ class ModelCache:
         self._max_ram_cache_size_gb = max_ram_cache_size_gb
         self._max_vram_cache_size_gb = max_vram_cache_size_gb
 
+        self._transfer = DeviceTransfer(self._execution_device, pinned_budget_bytes=int(pinned_memory_gb * GB))
+
         self._logger = logger
         self._log_memory_usage = log_memory_usage
         self._stats: Optional[CacheStats] = None
@@ -140,6 +146,11 @@ class ModelCache:
         # - Requests to empty the cache from a separate thread
         self._lock = threading.RLock()
 
+    @property
+    def execution_device_working_mem_gb(self) -> float:
+        """The amount of working memory to keep on the execution device (in GB), for passes outside the model cache."""
+        return self._execution_device_working_mem_gb
+
     @property
     @synchronized
     def stats(self) -> Optional[CacheStats]:
@@ -177,11 +188,15 @@ class ModelCache:
         # Wrap model.
         if isinstance(model, torch.nn.Module) and running_with_cuda and self._enable_partial_loading:
             wrapped_model = CachedModelWithPartialLoad(
-                model, self._execution_device, keep_ram_copy=self._keep_ram_copy_of_weights
+                model, self._execution_device, keep_ram_copy=self._keep_ram_copy_of_weights, transfer=self._transfer
             )
         else:
             wrapped_model = CachedModelOnlyFullLoad(
-                model, self._execution_device, size, keep_ram_copy=self._keep_ram_copy_of_weights
+                model,
+                self._execution_device,
+                size,
+                keep_ram_copy=self._keep_ram_copy_of_weights,
+                transfer=self._transfer,
             )
 
         cache_record = CacheRecord(key=key, cached_model=wrapped_model)
@@ -251,6 +266,8 @@ class ModelCache:
 
         try:
             self._load_locked_model(cache_entry, working_mem_bytes)
+            # Weights may still be in flight on the transfer stream, e.g. after a prefetch.
+            self._transfer.wait()
             # self._logger.debug(
             #     f"Finished locking model {cache_entry.key} (Type: {cache_entry.cached_model.model.__class__.__name__})"
             # )
@@ -266,6 +283,28 @@ class ModelCache:
 
         # self._log_cache_state()
 
+    @synchronized
+    def prefetch(self, cache_entry: CacheRecord, working_mem_bytes: Optional[int] = None) -> bool:
+        """Start copying a model into VRAM ahead of its use, e.g. the VAE while the last denoise steps run.
+
+        The model is only prefetched if it fits in the VRAM that is available without offloading other models. The
+        copies are asynchronous when the weights are pinned; `lock()` waits for them before the model is used.
+
+        Returns:
+            True if the model is (being) loaded into VRAM.
+        """
+        if self._execution_device.type == "cpu" or cache_entry.key not in self._cached_models:
+            return False
+
+        model_vram_needed = cache_entry.cached_model.total_bytes() - cache_entry.cached_model.cur_vram_bytes()
+        if model_vram_needed <= 0:
+            return True
+        if model_vram_needed > self._get_vram_available(working_mem_bytes):
+            return False
+
+        self._move_model_to_vram(cache_entry, model_vram_needed + MB)
+        return True
+
     @synchronized
     def unlock(self, cache_entry: CacheRecord) -> None:
         """Unlock a model."""
@@ -359,6 +398,8 @@ class ModelCache:
             raise
 
     def _move_model_to_ram(self, cache_entry: CacheRecord, vram_bytes_to_free: int) -> int:
+        # Do not copy weights back while their host-to-device copies may still be running.
+        self._transfer.wait()
         try:
             if isinstance(cache_entry.cached_model, CachedModelWithPartialLoad):
                 return cache_entry.cached_model.partial_unload_from_vram(
@@ -658,4 +699,5 @@ class ModelCache:
     def _delete_cache_entry(self, cache_entry: CacheRecord) -> None:
         """Delete cache_entry from the cache if it exists. No exception is thrown if it doesn't exist."""
         self._cache_stack = [key for key in self._cache_stack if key != cache_entry.key]
-        self._cached_models.pop(cache_entry.key, None)
+        if self._cached_models.pop(cache_entry.key, None) is not None:
+            self._transfer.release(cache_entry.cached_model.pinned_bytes())
@@ -6,7 +6,6 @@ from typing import Optional
 
 import accelerate
 import torch
-from safetensors.torch import load_file
 from transformers import AutoConfig, AutoModelForTextEncoding, CLIPTextModel, CLIPTokenizer, T5EncoderModel, T5Tokenizer
 
 from backend.flux.controlnet.instantx_controlnet_flux import InstantXControlNetFlux
@@ -50,6 +49,7 @@ from backend.model_manager.load.load_default import ModelLoader
 from backend.model_manager.load.model_loader_registry import ModelLoaderRegistry
 from backend.model_manager.util.model_util import (
     convert_bundle_to_flux_transformer_checkpoint,
+    load_state_dict,
 )
 from backend.quantization.gguf.loaders import gguf_sd_loader
 from backend.quantization.gguf.utils import TORCH_COMPATIBLE_QTYPES
@@ -78,7 +78,7 @@ class FluxVAELoader(ModelLoader):
 
         with accelerate.init_empty_weights():
             model = AutoEncoder(ae_params[config.config_path])
-        sd = load_file(model_path)
+        sd = load_state_dict(model_path, mmap=self._app_config.mmap_checkpoints)
         model.load_state_dict(sd, assign=True)
         # VAE is broken in float16, which mps defaults to
         if self._torch_dtype == torch.float16:
@@ -142,7 +142,7 @@ class BnbQuantizedLlmInt8bCheckpointModel(ModelLoader):
                     model = quantize_model_llm_int8(model, modules_to_not_convert=set())
 
                 state_dict_path = te2_model_path / "bnb_llm_int8_model.safetensors"
-                state_dict = load_file(state_dict_path)
+                state_dict = load_state_dict(state_dict_path, mmap=self._app_config.mmap_checkpoints)
                 self._load_state_dict_into_t5(model, state_dict)
 
                 return model
@@ -218,7 +218,7 @@ class FluxCheckpointModel(ModelLoader):
         with accelerate.init_empty_weights():
             model = Flux(params[config.config_path])
 
-        sd = load_file(model_path)
+        sd = load_state_dict(model_path, mmap=self._app_config.mmap_checkpoints)
         if "model.diffusion_model.double_blocks.0.img_attn.norm.key_norm.scale" in sd:
             sd = convert_bundle_to_flux_transformer_checkpoint(sd)
         new_sd_size = sum([ten.nelement() * torch.bfloat16.itemsize for ten in sd.values()])
@@ -310,7 +310,7 @@ class FluxBnbQuantizednf4bCheckpointModel(ModelLoader):
         with accelerate.init_empty_weights():
             model = Flux(params[config.config_path])
             model = quantize_model_nf4(model, modules_to_not_convert=set(), compute_dtype=torch.bfloat16)
-        sd = load_file(model_path)
+        sd = load_state_dict(model_path, mmap=self._app_config.mmap_checkpoints)
         if "model.diffusion_model.double_blocks.0.img_attn.norm.key_norm.scale" in sd:
             sd = convert_bundle_to_flux_transformer_checkpoint(sd)
         model.load_state_dict(sd, assign=True)
@@ -335,7 +335,7 @@ class FluxControlnetModel(ModelLoader):
         else:
             raise ValueError(f"Unexpected ControlNet model config type: {type(config)}")
 
-        sd = load_file(model_path)
+        sd = load_state_dict(model_path, mmap=self._app_config.mmap_checkpoints)
 
         # Detect the FLUX ControlNet model type from the state dict.
         if is_state_dict_xlabs_controlnet(sd):
@@ -377,7 +377,7 @@ class FluxIpAdapterModel(ModelLoader):
         if not isinstance(config, IPAdapterCheckpointConfig):
             raise ValueError(f"Unexpected model config type: {type(config)}.")
 
-        sd = load_file(Path(config.path))
+        sd = load_state_dict(Path(config.path), mmap=self._app_config.mmap_checkpoints)
 
         params = infer_xlabs_ip_adapter_params_from_state_dict(sd)
 
@@ -5,9 +5,6 @@ from logging import Logger
 from pathlib import Path
 from typing import Optional
 
-import torch
-from safetensors.torch import load_file
-
 from backend.model_manager import (
     AnyModel,
     AnyModelConfig,
@@ -20,6 +17,7 @@ from backend.model_manager.load.load_base import ModelLoaderConfig
 from backend.model_manager.load.load_default import ModelLoader
 from backend.model_manager.load.model_cache.model_cache import ModelCache
 from backend.model_manager.load.model_loader_registry import ModelLoaderRegistry
+from backend.model_manager.util.model_util import load_state_dict
 from backend.patches.lora_conversions.flux_control_lora_utils import (
     is_state_dict_likely_flux_control,
     lora_model_from_flux_control_state_dict,
@@ -68,10 +66,7 @@ class LoRALoader(ModelLoader):
         assert self._model_base is not None
 
         # Load the state dict from the model file.
-        if model_path.suffix == ".safetensors":
-            state_dict = load_file(model_path.absolute().as_posix(), device="cpu")
-        else:
-            state_dict = torch.load(model_path, map_location="cpu")
+        state_dict = load_state_dict(model_path.absolute(), mmap=self._app_config.mmap_checkpoints)
 
         # Apply state_dict key conversions, if necessary.
         if self._model_base == BaseModelType.StableDiffusionXL:
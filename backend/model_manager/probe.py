@@ -3,7 +3,6 @@ import re
 from pathlib import Path
 from typing import Any, Callable, Dict, Literal, Optional, Union
 
-import safetensors.torch
 import spandrel
 import torch
 from picklescan.scanner import scan_file_path
@@ -48,7 +47,6 @@ from backend.patches.lora_conversions.flux_onetrainer_lora_conversion_utils impo
     is_state_dict_likely_in_flux_onetrainer_format,
 )
 from backend.quantization.gguf.ggml_tensor import GGMLTensor
-from backend.quantization.gguf.loaders import gguf_sd_loader
 from backend.spandrel_image_to_image_model import SpandrelImageToImageModel
 
 import uuid
@@ -59,6 +57,8 @@ def uuid_string() -> str:
 
 CkptType = Dict[str | int, Any]
 
+CHECKPOINT_SUFFIXES = (".bin", ".pt", ".ckpt", ".safetensors", ".pth", ".gguf")
+
 LEGACY_CONFIGS: Dict[BaseModelType, Dict[ModelVariantType, Union[str, Dict[SchedulerPredictionType, str]]]] = {
     BaseModelType.StableDiffusion1: {
         ModelVariantType.Normal: {
@@ -173,22 +173,28 @@ class ModelProbe(object):
         format_type = ModelFormat.Diffusers if model_path.is_dir() else ModelFormat.Checkpoint
         model_info = None
         model_type = ModelType(fields["type"]) if "type" in fields and fields["type"] else None
+        # Header-only view of the checkpoint, shared by type detection and the checkpoint probe.
+        checkpoint = None
+        if format_type is ModelFormat.Checkpoint and model_path.suffix in CHECKPOINT_SUFFIXES:
+            checkpoint = cls._scan_and_load_checkpoint(model_path)
         if not model_type:
             if format_type is ModelFormat.Diffusers:
                 model_type = cls.get_model_type_from_folder(model_path)
             else:
-                model_type = cls.get_model_type_from_checkpoint(model_path)
+                model_type = cls.get_model_type_from_checkpoint(model_path, checkpoint)
         format_type = ModelFormat.ONNX if model_type == ModelType.ONNX else format_type
 
         probe_class = cls.PROBES[format_type].get(model_type)
         if not probe_class:
             raise InvalidModelConfigException(f"Unhandled combination of {format_type} and {model_type}")
 
-        probe = probe_class(model_path)
+        if issubclass(probe_class, CheckpointProbeBase):
+            probe = probe_class(model_path, checkpoint=checkpoint)
+        else:
+            probe = probe_class(model_path)
 
         fields["source_type"] = fields.get("source_type") or ModelSourceType.Path
         fields["source"] = fields.get("source") or model_path.as_posix()
-        fields["key"] = fields.get("key", uuid_string())
         fields["path"] = model_path.as_posix()
         fields["type"] = fields.get("type") or model_type
         fields["base"] = fields.get("base") or probe.get_base_type()
@@ -204,6 +210,8 @@ class ModelProbe(object):
         )
         fields["format"] = ModelFormat(fields.get("format")) if "format" in fields else probe.get_format()
         fields["hash"] = fields.get("hash") or ModelHash(algorithm=hash_algo).hash(model_path)
+        # The key is content-addressed so that probing the same model twice yields the same ModelCache keys.
+        fields["key"] = fields.get("key") or fields["hash"]
 
         fields["default_settings"] = fields.get("default_settings")
 
@@ -258,7 +266,7 @@ class ModelProbe(object):
 
     @classmethod
     def get_model_type_from_checkpoint(cls, model_path: Path, checkpoint: Optional[CkptType] = None) -> ModelType:
-        if model_path.suffix not in (".bin", ".pt", ".ckpt", ".safetensors", ".pth", ".gguf"):
+        if model_path.suffix not in CHECKPOINT_SUFFIXES:
             raise InvalidModelConfigException(f"{model_path}: unrecognized suffix")
 
         if model_path.name == "learned_embeds.bin":
@@ -463,15 +471,14 @@ class ModelProbe(object):
 
     @classmethod
     def _scan_and_load_checkpoint(cls, model_path: Path) -> CkptType:
-        if model_path.suffix.endswith((".ckpt", ".pt", ".pth", ".bin")):
-            cls._scan_model(model_path.name, model_path)
-            model = torch.load(model_path, map_location="cpu")
-            assert isinstance(model, dict)
-            return model
-        elif model_path.suffix.endswith(".gguf"):
-            return gguf_sd_loader(model_path, compute_dtype=torch.float32)
-        else:
-            return safetensors.torch.load_file(model_path)
+        """Return the checkpoint's keys and tensor metadata for probing.
+
+        Tensors live on the meta device (GGUF tensors are memory-mapped), so probing only reads the file header and
+        pickled structure instead of materializing the weights.
+        """
+        model = read_checkpoint_meta(model_path, scan=True)
+        assert isinstance(model, dict)
+        return model
 
     @classmethod
     def _scan_model(cls, model_name: str, checkpoint: Path) -> None:
@@ -532,9 +539,9 @@ def get_default_settings_main(model_base: BaseModelType) -> Optional[MainModelDe
 
 
 class CheckpointProbeBase(ProbeBase):
-    def __init__(self, model_path: Path):
+    def __init__(self, model_path: Path, checkpoint: Optional[CkptType] = None):
         super().__init__(model_path)
-        self.checkpoint = ModelProbe._scan_and_load_checkpoint(model_path)
+        self.checkpoint = checkpoint if checkpoint is not None else ModelProbe._scan_and_load_checkpoint(model_path)
 
     def get_format(self) -> ModelFormat:
         state_dict = self.checkpoint.get("state_dict") or self.checkpoint
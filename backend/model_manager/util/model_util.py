@@ -1,6 +1,7 @@
 """Utilities for parsing model files, used mostly by probe.py"""
 
 import json
+import os
 from pathlib import Path
 from typing import Dict, Optional, Union
 
@@ -12,38 +13,103 @@ from backend.model_manager.config import ClipVariantType
 from backend.quantization.gguf.loaders import gguf_sd_loader
 
 
-def _fast_safetensors_reader(path: str) -> Dict[str, torch.Tensor]:
-    checkpoint = {}
-    device = torch.device("meta")
+SAFETENSORS_DTYPES = {
+    "I8": torch.int8,
+    "I16": torch.int16,
+    "I32": torch.int32,
+    "I64": torch.int64,
+    "F16": torch.float16,
+    "F32": torch.float32,
+    "F64": torch.float64,
+    "BF16": torch.bfloat16,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+    "F8_E4M3": torch.float8_e4m3fn,
+    "F8_E5M2": torch.float8_e5m2,
+}
+
+
+def _read_safetensors_header(path: str) -> tuple[int, dict]:
+    """Return the offset of the tensor data and the tensor definitions of a safetensors file."""
     with open(path, "rb") as f:
         definition_len = int.from_bytes(f.read(8), "little")
         definition_json = f.read(definition_len)
         definition = json.loads(definition_json)
 
-        if "__metadata__" in definition and definition["__metadata__"].get("format", "pt") not in {
-            "pt",
-            "torch",
-            "pytorch",
-        }:
-            raise Exception("Supported only pytorch safetensors files")
-        definition.pop("__metadata__", None)
-
-        for key, info in definition.items():
-            dtype = {
-                "I8": torch.int8,
-                "I16": torch.int16,
-                "I32": torch.int32,
-                "I64": torch.int64,
-                "F16": torch.float16,
-                "F32": torch.float32,
-                "F64": torch.float64,
-            }[info["dtype"]]
-
-            checkpoint[key] = torch.empty(info["shape"], dtype=dtype, device=device)
+    if "__metadata__" in definition and definition["__metadata__"].get("format", "pt") not in {
+        "pt",
+        "torch",
+        "pytorch",
+    }:
+        raise Exception("Supported only pytorch safetensors files")
+    definition.pop("__metadata__", None)
+    return 8 + definition_len, definition
+
+
+def _fast_safetensors_reader(path: str) -> Dict[str, torch.Tensor]:
+    checkpoint = {}
+    device = torch.device("meta")
+    _, definition = _read_safetensors_header(path)
+    for key, info in definition.items():
+        checkpoint[key] = torch.empty(info["shape"], dtype=SAFETENSORS_DTYPES[info["dtype"]], device=device)
+    return checkpoint
+
+
+def _mmap_safetensors_reader(path: str) -> Dict[str, torch.Tensor]:
+    """Load a safetensors file as views into a private memory map of the file.
+
+    The tensors are backed by the page cache, so processes mapping the same file share its pages and nothing is copied
+    until a tensor is written to, cast or moved to another device.
+    """
+    data_start, definition = _read_safetensors_header(path)
+    # shared=False maps the file copy-on-write: writes to the tensors never reach the file.
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    data = torch.empty(0, dtype=torch.uint8).set_(storage)
 
+    checkpoint = {}
+    for key, info in definition.items():
+        begin, end = info["data_offsets"]
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        raw = data[data_start + begin : data_start + end]
+        if (data_start + begin) % dtype.itemsize != 0:
+            # Files written before the header was padded may have unaligned tensors, which cannot be viewed in place.
+            raw = raw.clone()
+        checkpoint[key] = raw.view(dtype).reshape(info["shape"])
     return checkpoint
 
 
+def _torch_load_meta(path: Union[str, Path]) -> Dict[str, torch.Tensor]:
+    """Load a pickled checkpoint onto the meta device without reading its tensor data.
+
+    Zip-format checkpoints (the torch.save default) are memory-mapped, so only the pickled structure is read from disk.
+    Legacy checkpoints cannot be memory-mapped and fall back to a regular load onto the meta device.
+    """
+    try:
+        return torch.load(path, map_location=torch.device("meta"), mmap=True)
+    except (RuntimeError, TypeError):
+        return torch.load(path, map_location=torch.device("meta"))
+
+
+def load_state_dict(path: Union[str, Path], mmap: bool = True) -> Dict[str, torch.Tensor]:
+    """Load the tensors of a safetensors or pickle checkpoint onto the CPU.
+
+    With `mmap`, tensors are memory-mapped from the file instead of being read into private memory, so several executor
+    processes loading the same model share a single copy in the page cache. Legacy pickle checkpoints cannot be
+    memory-mapped and are always read into memory. GGUF files are always memory-mapped by `gguf_sd_loader`.
+    """
+    path_str = path.as_posix() if isinstance(path, Path) else path
+    if not path_str.endswith((".ckpt", ".pt", ".pth", ".bin")):
+        if mmap:
+            return _mmap_safetensors_reader(path_str)
+        return safetensors.torch.load_file(path_str, device="cpu")
+    if mmap:
+        try:
+            return torch.load(path_str, map_location="cpu", mmap=True)
+        except (RuntimeError, TypeError):
+            pass
+    return torch.load(path_str, map_location="cpu")
+
+
 def read_checkpoint_meta(path: Union[str, Path], scan: bool = True) -> Dict[str, torch.Tensor]:
     if str(path).endswith(".safetensors"):
         try:
@@ -60,7 +126,7 @@ def read_checkpoint_meta(path: Union[str, Path], scan: bool = True) -> Dict[str,
             scan_result = scan_file_path(path)
             if scan_result.infected_files != 0 or scan_result.scan_err:
                 raise Exception(f'The model file "{path}" is potentially infected by malware. Aborting import.')
-        checkpoint = torch.load(path, map_location=torch.device("meta"))
+        checkpoint = _torch_load_meta(path)
     return checkpoint
 
 
@@ -1,3 +1,4 @@
+import weakref
 from contextlib import contextmanager
 from typing import Dict, Iterable, Optional, Tuple
 
@@ -5,6 +6,9 @@ import torch
 
 from backend.patches.layers.base_layer_patch import BaseLayerPatch
 from backend.patches.layers.flux_control_lora_layer import FluxControlLoRALayer
+from backend.patches.layers.lora_layer import LoRALayer
+from backend.patches.layers.param_shape_utils import get_param_shape
+from backend.patches.lora_delta_cache import LoRADeltaCache, is_delta_cacheable
 from backend.patches.model_patch_raw import ModelPatchRaw
 from backend.patches.util.pad_with_zeros import pad_with_zeros
 from backend.util.devices import TorchDevice
@@ -12,6 +16,9 @@ from backend.util.original_weights_storage import OriginalWeightsStorage
 
 
 class LayerPatcher:
+    # model -> {(layer key, layer key is flattened): module key}, see `_resolve_submodule()`.
+    _module_keys: "weakref.WeakKeyDictionary[torch.nn.Module, dict[tuple[str, bool], str]]" = weakref.WeakKeyDictionary()
+
     @staticmethod
     @torch.no_grad()
     @contextmanager
@@ -23,9 +30,13 @@ class LayerPatcher:
         cached_weights: Optional[Dict[str, torch.Tensor]] = None,
         force_direct_patching: bool = False,
         force_sidecar_patching: bool = False,
+        delta_cache: Optional[LoRADeltaCache] = None,
     ):
         """Apply 'smart' model patching that chooses whether to use direct patching or a sidecar wrapper for each
         module.
+
+        All patches are applied together, so each directly patched parameter receives a single fused delta. If
+        `delta_cache` is set, fused deltas are reused across calls with the same patches and weights.
         """
 
         # original_weights are stored for unpatching layers that are directly patched.
@@ -33,18 +44,17 @@ class LayerPatcher:
         # original_modules are stored for unpatching layers that are wrapped.
         original_modules: dict[str, torch.nn.Module] = {}
         try:
-            for patch, patch_weight in patches:
-                LayerPatcher.apply_smart_model_patch(
-                    model=model,
-                    prefix=prefix,
-                    patch=patch,
-                    patch_weight=patch_weight,
-                    original_weights=original_weights,
-                    original_modules=original_modules,
-                    dtype=dtype,
-                    force_direct_patching=force_direct_patching,
-                    force_sidecar_patching=force_sidecar_patching,
-                )
+            LayerPatcher.apply_smart_model_patch_set(
+                model=model,
+                prefix=prefix,
+                patches=patches,
+                original_weights=original_weights,
+                original_modules=original_modules,
+                dtype=dtype,
+                force_direct_patching=force_direct_patching,
+                force_sidecar_patching=force_sidecar_patching,
+                delta_cache=delta_cache,
+            )
 
             yield
         finally:
@@ -70,121 +80,307 @@ class LayerPatcher:
         dtype: torch.dtype,
         force_direct_patching: bool,
         force_sidecar_patching: bool,
+        delta_cache: Optional[LoRADeltaCache] = None,
     ):
         """Apply a single LoRA patch to a model using the 'smart' patching strategy that chooses whether to use direct
         patching or a sidecar wrapper for each module.
         """
-        if patch_weight == 0:
-            return
+        LayerPatcher.apply_smart_model_patch_set(
+            model=model,
+            prefix=prefix,
+            patches=[(patch, patch_weight)],
+            original_weights=original_weights,
+            original_modules=original_modules,
+            dtype=dtype,
+            force_direct_patching=force_direct_patching,
+            force_sidecar_patching=force_sidecar_patching,
+            delta_cache=delta_cache,
+        )
 
-        # If the layer keys contain a dot, then they are not flattened, and can be directly used to access model
-        # submodules. If the layer keys do not contain a dot, then they are flattened, meaning that all '.' have been
-        # replaced with '_'. Non-flattened keys are preferred, because they allow submodules to be accessed directly
-        # without searching, but some legacy code still uses flattened keys.
-        layer_keys_are_flattened = "." not in next(iter(patch.layers.keys()))
+    @staticmethod
+    @torch.no_grad()
+    def apply_smart_model_patch_set(
+        model: torch.nn.Module,
+        prefix: str,
+        patches: Iterable[Tuple[ModelPatchRaw, float]],
+        original_weights: OriginalWeightsStorage,
+        original_modules: dict[str, torch.nn.Module],
+        dtype: torch.dtype,
+        force_direct_patching: bool,
+        force_sidecar_patching: bool,
+        delta_cache: Optional[LoRADeltaCache] = None,
+    ):
+        """Apply several LoRA patches to a model using the 'smart' patching strategy.
 
-        prefix_len = len(prefix)
+        Layers are first grouped by the module they patch. The deltas of all layers that directly patch the same module
+        are summed, so each parameter is updated (and saved to original_weights) once per call, regardless of how many
+        patches touch it. Modules patched by a layer that depends on the current weight are patched one layer at a time.
+        """
+        if force_direct_patching and force_sidecar_patching:
+            raise ValueError("Cannot force both direct and sidecar patching.")
 
-        for layer_key, layer in patch.layers.items():
-            if not layer_key.startswith(prefix):
+        # module_key -> (module, [(layer, patch_weight)]) for the modules that are patched directly.
+        direct_patches: dict[str, tuple[torch.nn.Module, list[tuple[BaseLayerPatch, float]]]] = {}
+        for patch, patch_weight in patches:
+            if patch_weight == 0:
                 continue
 
-            module_key, module = LayerPatcher._get_submodule(
-                model, layer_key[prefix_len:], layer_key_is_flattened=layer_keys_are_flattened
-            )
+            # If the layer keys contain a dot, then they are not flattened, and can be directly used to access model
+            # submodules. If the layer keys do not contain a dot, then they are flattened, meaning that all '.' have
+            # been replaced with '_'. Non-flattened keys are preferred, because they allow submodules to be accessed
+            # directly without searching, but some legacy code still uses flattened keys.
+            layer_keys_are_flattened = "." not in next(iter(patch.layers.keys()))
 
-            # Decide whether to use direct patching or a sidecar patch.
-            # Direct patching is preferred, because it results in better runtime speed.
-            # Reasons to use sidecar patching:
-            # - The module is quantized, so the caller passed force_sidecar_patching=True.
-            # - The module already has sidecar patches.
-            # - The module is on the CPU (and we don't want to store a second full copy of the original weights on the
-            #   CPU, since this would double the RAM usage)
-            # NOTE: For now, we don't check if the layer is quantized here. We assume that this is checked in the caller
-            # and that the caller will set force_sidecar_patching=True if the layer is quantized.
-            # TODO(ryand): Handle the case where we are running without a GPU. Should we set a config flag that allows
-            # forcing full patching even on the CPU?
-            use_sidecar_patching = False
-            if force_direct_patching and force_sidecar_patching:
-                raise ValueError("Cannot force both direct and sidecar patching.")
-            elif force_direct_patching:
-                use_sidecar_patching = False
-            elif force_sidecar_patching:
-                use_sidecar_patching = True
-            elif module.get_num_patches() > 0:
-                use_sidecar_patching = True
-            elif LayerPatcher._is_any_part_of_layer_on_cpu(module):
-                use_sidecar_patching = True
-
-            if use_sidecar_patching:
-                LayerPatcher._apply_model_layer_wrapper_patch(
-                    module_to_patch=module,
-                    module_to_patch_key=module_key,
-                    patch=layer,
-                    patch_weight=patch_weight,
-                    original_modules=original_modules,
-                    dtype=dtype,
-                )
-            else:
-                LayerPatcher._apply_model_layer_patch(
-                    module_to_patch=module,
-                    module_to_patch_key=module_key,
-                    patch=layer,
-                    patch_weight=patch_weight,
-                    original_weights=original_weights,
+            prefix_len = len(prefix)
+
+            for layer_key, layer in patch.layers.items():
+                if not layer_key.startswith(prefix):
+                    continue
+
+                module_key, module = LayerPatcher._resolve_submodule(
+                    model, layer_key[prefix_len:], layer_key_is_flattened=layer_keys_are_flattened
                 )
 
+                if module_key in direct_patches:
+                    direct_patches[module_key][1].append((layer, patch_weight))
+                elif LayerPatcher._use_sidecar_patching(module, force_direct_patching, force_sidecar_patching):
+                    LayerPatcher._apply_model_layer_wrapper_patch(
+                        module_to_patch=module,
+                        module_to_patch_key=module_key,
+                        patch=layer,
+                        patch_weight=patch_weight,
+                        original_modules=original_modules,
+                        dtype=dtype,
+                    )
+                else:
+                    direct_patches[module_key] = (module, [(layer, patch_weight)])
+
+        LayerPatcher._apply_model_layer_patches(direct_patches, original_weights, delta_cache)
+
+    @staticmethod
+    def _use_sidecar_patching(module: torch.nn.Module, force_direct_patching: bool, force_sidecar_patching: bool) -> bool:
+        """Decide whether to use direct patching or a sidecar patch.
+
+        Direct patching is preferred, because it results in better runtime speed.
+        Reasons to use sidecar patching:
+        - The module is quantized, so the caller passed force_sidecar_patching=True.
+        - The module already has sidecar patches.
+        - The module is on the CPU (and we don't want to store a second full copy of the original weights on the
+          CPU, since this would double the RAM usage)
+        NOTE: For now, we don't check if the layer is quantized here. We assume that this is checked in the caller
+        and that the caller will set force_sidecar_patching=True if the layer is quantized.
+        TODO(ryand): Handle the case where we are running without a GPU. Should we set a config flag that allows
+        forcing full patching even on the CPU?
+        """
+        if force_direct_patching:
+            return False
+        elif force_sidecar_patching:
+            return True
+        elif module.get_num_patches() > 0:
+            return True
+        elif LayerPatcher._is_any_part_of_layer_on_cpu(module):
+            return True
+        return False
+
     @staticmethod
     def _is_any_part_of_layer_on_cpu(layer: torch.nn.Module) -> bool:
         return any(p.device.type == "cpu" for p in layer.parameters())
 
     @staticmethod
     @torch.no_grad()
-    def _apply_model_layer_patch(
+    def _apply_model_layer_patches(
+        direct_patches: dict[str, tuple[torch.nn.Module, list[tuple[BaseLayerPatch, float]]]],
+        original_weights: OriginalWeightsStorage,
+        delta_cache: Optional[LoRADeltaCache] = None,
+    ):
+        """Add the summed deltas of the layers grouped under each module to the module's parameters.
+
+        Summing is only valid for layers whose delta doesn't depend on the patched weight. If any layer of a module
+        computes its delta from the current weight (e.g. DoRA or SetParameterLayer), all layers of that module are
+        applied one at a time in patch order instead, each to the running weight.
+        """
+        deltas_by_module: dict[str, dict[str, torch.Tensor]] = {}
+        # Cache keys of the modules whose deltas should be stored after they are computed.
+        cache_keys: dict[str, tuple] = {}
+        low_rank_modules: dict[str, tuple[torch.nn.Module, list[tuple[BaseLayerPatch, float]]]] = {}
+        sequential_modules: dict[str, tuple[torch.nn.Module, list[tuple[BaseLayerPatch, float]]]] = {}
+        for module_key, (module, layers) in direct_patches.items():
+            if not all(is_delta_cacheable(patch) for patch, _ in layers):
+                sequential_modules[module_key] = (module, layers)
+                continue
+
+            if delta_cache is not None:
+                first_param = next(module.parameters())
+                key = (module_key, tuple((id(patch), w) for patch, w in layers), first_param.device, first_param.dtype)
+                deltas = delta_cache.get(key, [patch for patch, _ in layers])
+                if deltas is not None:
+                    deltas_by_module[module_key] = deltas
+                    continue
+                cache_keys[module_key] = key
+
+            if LayerPatcher._is_low_rank_group(layers):
+                low_rank_modules[module_key] = (module, layers)
+            else:
+                deltas_by_module[module_key] = LayerPatcher._compute_layer_deltas(module, layers)
+
+        deltas_by_module.update(LayerPatcher._compute_low_rank_deltas(low_rank_modules))
+        for module_key, key in cache_keys.items():
+            delta_cache.put(key, [patch for patch, _ in direct_patches[module_key][1]], deltas_by_module[module_key])
+
+        for module_key, deltas in deltas_by_module.items():
+            module_to_patch, layers = direct_patches[module_key]
+            for param_name, param_weight in deltas.items():
+                LayerPatcher._add_param_delta(
+                    module_to_patch, module_key, param_name, param_weight, original_weights, layers
+                )
+
+        for module_key, (module_to_patch, layers) in sequential_modules.items():
+            for layer in layers:
+                deltas = LayerPatcher._compute_layer_deltas(module_to_patch, [layer])
+                for param_name, param_weight in deltas.items():
+                    LayerPatcher._add_param_delta(
+                        module_to_patch, module_key, param_name, param_weight, original_weights, [layer]
+                    )
+
+    @staticmethod
+    @torch.no_grad()
+    def _add_param_delta(
         module_to_patch: torch.nn.Module,
-        module_to_patch_key: str,
-        patch: BaseLayerPatch,
-        patch_weight: float,
+        module_key: str,
+        param_name: str,
+        param_weight: torch.Tensor,
         original_weights: OriginalWeightsStorage,
+        layers: list[tuple[BaseLayerPatch, float]],
     ):
+        param_key = module_key + "." + param_name
+        module_param = module_to_patch.get_parameter(param_name)
+
+        # Save original weight
+        original_weights.save(param_key, module_param)
+
+        # HACK(ryand): This condition is only necessary to handle layers in FLUX control LoRAs that change the shape of
+        # the original layer.
+        if module_param.nelement() != param_weight.nelement():
+            assert any(isinstance(patch, FluxControlLoRALayer) for patch, _ in layers)
+            expanded_weight = pad_with_zeros(module_param, param_weight.shape)
+            setattr(
+                module_to_patch,
+                param_name,
+                torch.nn.Parameter(expanded_weight, requires_grad=module_param.requires_grad),
+            )
+            module_param = expanded_weight
+
+        module_param += param_weight
+
+    @staticmethod
+    @torch.no_grad()
+    def _compute_layer_deltas(
+        module_to_patch: torch.nn.Module, layers: list[tuple[BaseLayerPatch, float]]
+    ) -> dict[str, torch.Tensor]:
+        """Sum the parameter deltas of `layers`, in the dtype and on the device of the module.
+
+        All deltas are computed from the current parameters, so the layers must not depend on the patched weight unless
+        a single layer is passed.
+        """
         # All of the LoRA weight calculations will be done on the same device as the module weight.
         # (Performance will be best if this is a CUDA device.)
         first_param = next(module_to_patch.parameters())
         device = first_param.device
         dtype = first_param.dtype
 
-        # We intentionally move to the target device first, then cast. Experimentally, this was found to
-        # be significantly faster for 16-bit CPU tensors being moved to a CUDA device than doing the
-        # same thing in a single call to '.to(...)'.
-        patch.to(device=device)
-        patch.to(dtype=torch.float32)
-
-        # TODO(ryand): Using torch.autocast(...) over explicit casting may offer a speed benefit on CUDA
-        # devices here. Experimentally, it was found to be very slow on CPU. More investigation needed.
-        for param_name, param_weight in patch.get_parameters(
-            dict(module_to_patch.named_parameters(recurse=False)), weight=patch_weight
-        ).items():
-            param_key = module_to_patch_key + "." + param_name
-            module_param = module_to_patch.get_parameter(param_name)
-
-            # Save original weight
-            original_weights.save(param_key, module_param)
-
-            # HACK(ryand): This condition is only necessary to handle layers in FLUX control LoRAs that change the
-            # shape of the original layer.
-            if module_param.nelement() != param_weight.nelement():
-                assert isinstance(patch, FluxControlLoRALayer)
-                expanded_weight = pad_with_zeros(module_param, param_weight.shape)
-                setattr(
-                    module_to_patch,
-                    param_name,
-                    torch.nn.Parameter(expanded_weight, requires_grad=module_param.requires_grad),
-                )
-                module_param = expanded_weight
+        # The deltas are computed from the same parameters, so they don't depend on the order of the layers.
+        orig_parameters = dict(module_to_patch.named_parameters(recurse=False))
+        deltas: dict[str, torch.Tensor] = {}
+        for patch, patch_weight in layers:
+            # We intentionally move to the target device first, then cast. Experimentally, this was found to
+            # be significantly faster for 16-bit CPU tensors being moved to a CUDA device than doing the
+            # same thing in a single call to '.to(...)'.
+            patch.to(device=device)
+            patch.to(dtype=torch.float32)
+
+            # TODO(ryand): Using torch.autocast(...) over explicit casting may offer a speed benefit on CUDA
+            # devices here. Experimentally, it was found to be very slow on CPU. More investigation needed.
+            for param_name, param_weight in patch.get_parameters(orig_parameters, weight=patch_weight).items():
+                if param_name not in deltas:
+                    deltas[param_name] = param_weight
+                    continue
+                deltas[param_name] = deltas[param_name] + param_weight.reshape(deltas[param_name].shape)
+
+            patch.to(device=TorchDevice.CPU_DEVICE)
+        return {param_name: delta.to(dtype=dtype) for param_name, delta in deltas.items()}
+
+    @staticmethod
+    def _is_low_rank_group(layers: list[tuple[BaseLayerPatch, float]]) -> bool:
+        """Whether the summed delta of `layers` is a single product of concatenated up and down factors."""
+        return all(
+            type(patch) is LoRALayer and patch.mid is None and patch.bias is None for patch, _ in layers
+        )
 
-            module_param += param_weight.to(dtype=dtype)
+    @staticmethod
+    @torch.no_grad()
+    def _compute_low_rank_deltas(
+        modules: dict[str, tuple[torch.nn.Module, list[tuple[BaseLayerPatch, float]]]],
+    ) -> dict[str, dict[str, torch.Tensor]]:
+        """Compute the weight deltas of modules that are only patched by plain LoRA layers.
+
+        The factors of all layers are copied to each device in one bulk transfer, instead of moving every layer to the
+        device and back. The sum of the LoRAs patching a module, sum_i(c_i * up_i @ down_i), is computed as a single
+        matmul of the concatenated factors [c_1 * up_1, ..., c_n * up_n] @ [down_1; ...; down_n].
+        """
+        by_device: dict[torch.device, list[str]] = {}
+        for module_key, (module, _) in modules.items():
+            by_device.setdefault(next(module.parameters()).device, []).append(module_key)
+
+        deltas_by_module: dict[str, dict[str, torch.Tensor]] = {}
+        for device, module_keys in by_device.items():
+            factors = [
+                factor
+                for module_key in module_keys
+                for patch, _ in modules[module_key][1]
+                for factor in (patch.up, patch.down)
+            ]
+            device_factors = iter(LayerPatcher._bulk_to_device(factors, device))
+
+            for module_key in module_keys:
+                module, layers = modules[module_key]
+                orig_weight = module.get_parameter("weight")
+                ups = []
+                downs = []
+                for patch, patch_weight in layers:
+                    up = next(device_factors)
+                    down = next(device_factors)
+                    ups.append(up.reshape(up.shape[0], -1).float() * (patch_weight * patch.scale()))
+                    downs.append(down.reshape(down.shape[0], -1).float())
+                delta = torch.cat(ups, dim=1) @ torch.cat(downs, dim=0)
+                deltas_by_module[module_key] = {
+                    "weight": delta.reshape(get_param_shape(orig_weight)).to(dtype=orig_weight.dtype)
+                }
+        return deltas_by_module
 
-        patch.to(device=TorchDevice.CPU_DEVICE)
+    @staticmethod
+    def _bulk_to_device(tensors: list[torch.Tensor], device: torch.device) -> list[torch.Tensor]:
+        """Copy tensors to a device with one transfer per dtype, by packing them into a flat buffer."""
+        result: list[Optional[torch.Tensor]] = [None] * len(tensors)
+        by_dtype: dict[torch.dtype, list[int]] = {}
+        for i, tensor in enumerate(tensors):
+            if tensor.device == device:
+                result[i] = tensor
+            else:
+                by_dtype.setdefault(tensor.dtype, []).append(i)
+
+        for dtype, indices in by_dtype.items():
+            numel = sum(tensors[i].numel() for i in indices)
+            # Copies from pinned memory don't need a staging copy in the driver.
+            pin_memory = device.type == "cuda"
+            buffer = torch.empty(numel, dtype=dtype, pin_memory=pin_memory)
+            torch.cat([tensors[i].reshape(-1) for i in indices], out=buffer)
+            buffer = buffer.to(device=device, non_blocking=pin_memory)
+            offset = 0
+            for i in indices:
+                numel = tensors[i].numel()
+                result[i] = buffer[offset : offset + numel].view(tensors[i].shape)
+                offset += numel
+        return result  # type: ignore
 
     @staticmethod
     @torch.no_grad()
@@ -235,6 +431,26 @@ class LayerPatcher:
             # If the module name is not an integer, then we use the setattr method to set the submodule.
             setattr(parent_module, module_name, submodule)
 
+    @staticmethod
+    def _resolve_submodule(
+        model: torch.nn.Module, layer_key: str, layer_key_is_flattened: bool
+    ) -> tuple[str, torch.nn.Module]:
+        """Like `_get_submodule()`, but remembers the module key of each layer key per model.
+
+        Resolving flattened keys searches the module tree. The models stay in the model cache between runs, so a LoRA
+        stack is usually applied to the same model many times.
+        """
+        module_keys = LayerPatcher._module_keys.get(model)
+        if module_keys is None:
+            module_keys = LayerPatcher._module_keys[model] = {}
+        module_key = module_keys.get((layer_key, layer_key_is_flattened))
+        if module_key is not None:
+            return module_key, model.get_submodule(module_key)
+
+        module_key, module = LayerPatcher._get_submodule(model, layer_key, layer_key_is_flattened)
+        module_keys[(layer_key, layer_key_is_flattened)] = module_key
+        return module_key, module
+
     @staticmethod
     def _get_submodule(
         model: torch.nn.Module, layer_key: str, layer_key_is_flattened: bool
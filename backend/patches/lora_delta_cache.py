@@ -0,0 +1,101 @@
+from typing import Callable, Hashable, Optional, Sequence
+
+import torch
+
+from backend.patches.layers.base_layer_patch import BaseLayerPatch
+from backend.patches.layers.full_layer import FullLayer
+from backend.patches.layers.loha_layer import LoHALayer
+from backend.patches.layers.lokr_layer import LoKRLayer
+from backend.patches.layers.lora_layer import LoRALayer
+from backend.patches.layers.merged_layer_patch import MergedLayerPatch
+from backend.patches.layers.norm_layer import NormLayer
+from backend.util.byte_lru_cache import ByteLRUCache
+from backend.util.calc_tensor_size import calc_tensor_size
+
+# Layer types whose parameter deltas only depend on the patch itself. Other types (e.g. DoRA, IA3, SetParameterLayer)
+# compute their delta from the current value of the patched weight, so their deltas can't be reused.
+_CACHEABLE_LAYER_TYPES = (LoRALayer, LoHALayer, LoKRLayer, FullLayer, NormLayer)
+
+
+def is_delta_cacheable(layer: BaseLayerPatch) -> bool:
+    if isinstance(layer, MergedLayerPatch):
+        return all(is_delta_cacheable(sub_layer) for sub_layer in layer.lora_layers)
+    # Exact type check, because subclasses (e.g. FluxControlLoRALayer) may depend on the patched weight.
+    return type(layer) in _CACHEABLE_LAYER_TYPES
+
+
+class LoRADeltaCache:
+    """Reuses the fused parameter deltas of a LoRA stack across runs.
+
+    An entry holds the summed deltas of every patch layer applied to one module, already cast to the module dtype and
+    on the module device. Running the same LoRA stack again skips computing the deltas, and switching stacks only
+    recomputes the modules whose set of (layer, weight) pairs changed. Disabled while max_bytes is 0;
+    create_model_cache sets the budget from the lora_delta_cache_gb setting.
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        # key -> (patch layers the deltas were computed from, deltas by parameter name)
+        self._cache: ByteLRUCache[Hashable, tuple[tuple[BaseLayerPatch, ...], dict[str, torch.Tensor]]] = (
+            ByteLRUCache(max_bytes)
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_bytes(self) -> int:
+        return self._cache.max_bytes
+
+    @property
+    def cur_bytes(self) -> int:
+        return self._cache.cur_bytes
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        self._cache.set_max_bytes(max_bytes)
+
+    def get(self, key: Hashable, layers: Sequence[BaseLayerPatch]) -> Optional[dict[str, torch.Tensor]]:
+        """Return the cached deltas for `key`, or None.
+
+        The entry keeps references to the layers it was computed from and is only a hit if `layers` are the same
+        objects, so a key built from `id()`s can't match a layer that was garbage collected and had its id reused.
+        Callers must not modify the returned tensors.
+        """
+        if not self._cache.enabled:
+            return None
+        with self._cache.lock:
+            entry = self._cache.peek(key)
+            if entry is None or len(entry[0]) != len(layers) or not all(a is b for a, b in zip(entry[0], layers)):
+                return None
+            self._cache.get(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, layers: Sequence[BaseLayerPatch], deltas: dict[str, torch.Tensor]) -> None:
+        if not self._cache.enabled:
+            return
+        size = sum(calc_tensor_size(delta) for delta in deltas.values())
+        with self._cache.lock:
+            self.misses += 1
+            self._cache.put(key, (tuple(layers), deltas), size)
+
+    def get_or_create(
+        self,
+        key: Hashable,
+        layers: Sequence[BaseLayerPatch],
+        compute_fn: Callable[[], dict[str, torch.Tensor]],
+    ) -> dict[str, torch.Tensor]:
+        """Return the cached deltas for `key`, calling `compute_fn` on a miss."""
+        deltas = self.get(key, layers)
+        if deltas is None:
+            deltas = compute_fn()
+            self.put(key, layers, deltas)
+        return deltas
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+# Shared by all LoRA patching. Opt-in: disabled until a budget is set with `set_max_bytes()`.
+lora_delta_cache = LoRADeltaCache()
@@ -1,8 +1,12 @@
-from typing import overload
+import weakref
+from typing import Callable, overload
 
 import gguf
 import torch
 
+from backend.util.byte_lru_cache import ByteLRUCache
+from backend.util.calc_tensor_size import calc_tensor_size
+
 from .utils import (
     DEQUANTIZE_FUNCTIONS,
     TORCH_COMPATIBLE_QTYPES,
@@ -10,6 +14,68 @@ from .utils import (
 )
 
 
+class DequantizedTensorCache:
+    """Keeps the dequantized values of recently used GGML weights on their device.
+
+    Without the cache, every op on a GGMLTensor dequantizes it again, so each denoise step re-dequantizes the whole
+    transformer. Entries are dropped as soon as their GGMLTensor is garbage collected, e.g. when the model cache moves
+    the layer back to the CPU. Disabled while max_bytes is 0; create_model_cache sets the budget from the
+    gguf_dequant_cache_gb setting.
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        # id(GGMLTensor) -> (weak reference to the GGMLTensor, dequantized tensor)
+        self._cache: ByteLRUCache[int, tuple[weakref.ref, torch.Tensor]] = ByteLRUCache(max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_bytes(self) -> int:
+        return self._cache.max_bytes
+
+    @property
+    def cur_bytes(self) -> int:
+        return self._cache.cur_bytes
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        self._cache.set_max_bytes(max_bytes)
+
+    def get_or_create(self, tensor: torch.Tensor, dequantize_fn: Callable[[], torch.Tensor]) -> torch.Tensor:
+        """Return the cached dequantized value of `tensor`, calling `dequantize_fn` on a miss."""
+        if not self._cache.enabled:
+            return dequantize_fn()
+
+        key = id(tensor)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0]() is tensor:
+            self.hits += 1
+            return entry[1]
+
+        value = dequantize_fn()
+        with self._cache.lock:
+            self.misses += 1
+            ref = weakref.ref(tensor, lambda ref, key=key: self._remove(key, ref))
+            self._cache.put(key, (ref, value), calc_tensor_size(value))
+        return value
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _remove(self, key: int, ref: weakref.ref) -> None:
+        with self._cache.lock:
+            entry = self._cache.peek(key)
+            # The id may have been reused by a newer tensor since `ref` died.
+            if entry is not None and entry[0] is ref:
+                self._cache.pop(key)
+
+
+# Shared by every GGMLTensor. Opt-in: disabled until a budget is set with `set_max_bytes()`.
+dequantized_tensor_cache = DequantizedTensorCache()
+
+
 def dequantize_and_run(func, args, kwargs):
     """A helper function for running math ops on GGMLTensor inputs.
 
@@ -136,11 +202,14 @@ class GGMLTensor(torch.Tensor):
         return self
 
     def get_dequantized_tensor(self):
-        """Return the dequantized tensor.
+        """Return the dequantized tensor, from the dequantized tensor cache when it is enabled."""
+        if self._ggml_quantization_type in TORCH_COMPATIBLE_QTYPES:
+            # Only a dtype cast, not worth spending the cache budget on.
+            return self._dequantize()
+        return dequantized_tensor_cache.get_or_create(self, self._dequantize)
 
-        Args:
-            dtype: The dtype of the dequantized tensor.
-        """
+    def _dequantize(self):
+        """Dequantize the tensor to its compute dtype."""
         if self._ggml_quantization_type in TORCH_COMPATIBLE_QTYPES:
             return self.quantized_data.to(self.compute_dtype)
         elif self._ggml_quantization_type in DEQUANTIZE_FUNCTIONS:
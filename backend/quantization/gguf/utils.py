@@ -25,6 +25,10 @@ def get_scale_min(scales: torch.Tensor):
     return (sc.reshape((n_blocks, 8)), min.reshape((n_blocks, 8)))
 
 
+# Non-linear 4-bit quants: each nibble indexes this table instead of encoding an integer directly.
+IQ4_NL_KVALUES = (-127, -104, -83, -65, -49, -35, -22, -10, 1, 13, 25, 38, 53, 69, 89, 113)
+
+
 # Legacy Quants #
 def dequantize_blocks_Q8_0(
     blocks: torch.Tensor, block_size: int, type_size: int, dtype: Optional[torch.dtype] = None
@@ -35,6 +39,16 @@ def dequantize_blocks_Q8_0(
     return d * x
 
 
+def dequantize_blocks_Q8_1(
+    blocks: torch.Tensor, block_size: int, type_size: int, dtype: Optional[torch.dtype] = None
+) -> torch.Tensor:
+    # The second half is the precomputed block sum, which is only needed for dot products.
+    d, _s, x = split_block_dims(blocks, 2, 2)
+    d = d.view(torch.float16).to(dtype)
+    x = x.view(torch.int8)
+    return d * x
+
+
 def dequantize_blocks_Q5_1(
     blocks: torch.Tensor, block_size: int, type_size: int, dtype: Optional[torch.dtype] = None
 ) -> torch.Tensor:
@@ -195,6 +209,15 @@ def dequantize_blocks_Q4_K(
     return (d * qs - dm).reshape((n_blocks, QK_K))
 
 
+def dequantize_blocks_Q8_K(
+    blocks: torch.Tensor, block_size: int, type_size: int, dtype: Optional[torch.dtype] = None
+) -> torch.Tensor:
+    # The trailing block sums are only needed for dot products.
+    d, qs, _bsums = split_block_dims(blocks, 4, QK_K)
+    d = d.view(torch.float32).to(dtype)
+    return d * qs.view(torch.int8)
+
+
 def dequantize_blocks_Q3_K(
     blocks: torch.Tensor, block_size: int, type_size: int, dtype: Optional[torch.dtype] = None
 ) -> torch.Tensor:
@@ -252,11 +275,57 @@ def dequantize_blocks_Q2_K(
     return qs.reshape((n_blocks, -1))
 
 
+def dequantize_blocks_IQ4_NL(
+    blocks: torch.Tensor, block_size: int, type_size: int, dtype: Optional[torch.dtype] = None
+) -> torch.Tensor:
+    n_blocks = blocks.shape[0]
+
+    d, qs = split_block_dims(blocks, 2)
+    d = d.view(torch.float16).to(dtype)
+
+    qs = qs.reshape((n_blocks, -1, 1, block_size // 2)) >> torch.tensor(
+        [0, 4], device=d.device, dtype=torch.uint8
+    ).reshape((1, 1, 2, 1))
+    qs = (qs & 0x0F).reshape((n_blocks, -1))
+    kvalues = torch.tensor(IQ4_NL_KVALUES, device=d.device, dtype=torch.int8)
+    return d * kvalues[qs.long()]
+
+
+def dequantize_blocks_IQ4_XS(
+    blocks: torch.Tensor, block_size: int, type_size: int, dtype: Optional[torch.dtype] = None
+) -> torch.Tensor:
+    n_blocks = blocks.shape[0]
+
+    d, scales_h, scales_l, qs = split_block_dims(blocks, 2, 2, QK_K // 64)
+    d = d.view(torch.float16).to(dtype)
+    # torch has limited uint16 support, so widen the high scale bits before shifting.
+    scales_h = scales_h.view(torch.int16).to(torch.int32) & 0xFFFF
+
+    scales_l = scales_l.reshape((n_blocks, -1, 1)) >> torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape(
+        (1, 1, 2)
+    )
+    scales_h = scales_h.reshape((n_blocks, 1, -1)) >> torch.tensor(
+        [2 * i for i in range(QK_K // 32)], device=d.device, dtype=torch.int32
+    ).reshape((1, -1, 1))
+    scales_l = scales_l.reshape((n_blocks, -1)) & 0x0F
+    scales_h = (scales_h.reshape((n_blocks, -1)) & 0x03).to(torch.uint8)
+    scales = (scales_l | (scales_h << 4)).to(torch.int8) - 32
+    dl = (d * scales).reshape((n_blocks, -1, 1))
+
+    qs = qs.reshape((n_blocks, -1, 1, 16)) >> torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape(
+        (1, 1, 2, 1)
+    )
+    qs = (qs & 0x0F).reshape((n_blocks, -1, 32))
+    kvalues = torch.tensor(IQ4_NL_KVALUES, device=d.device, dtype=torch.int8)
+    return (dl * kvalues[qs.long()]).reshape((n_blocks, QK_K))
+
+
 DEQUANTIZE_FUNCTIONS: dict[
     gguf.GGMLQuantizationType, Callable[[torch.Tensor, int, int, Optional[torch.dtype]], torch.Tensor]
 ] = {
     gguf.GGMLQuantizationType.BF16: dequantize_blocks_BF16,
     gguf.GGMLQuantizationType.Q8_0: dequantize_blocks_Q8_0,
+    gguf.GGMLQuantizationType.Q8_1: dequantize_blocks_Q8_1,
     gguf.GGMLQuantizationType.Q5_1: dequantize_blocks_Q5_1,
     gguf.GGMLQuantizationType.Q5_0: dequantize_blocks_Q5_0,
     gguf.GGMLQuantizationType.Q4_1: dequantize_blocks_Q4_1,
@@ -266,6 +335,9 @@ DEQUANTIZE_FUNCTIONS: dict[
     gguf.GGMLQuantizationType.Q4_K: dequantize_blocks_Q4_K,
     gguf.GGMLQuantizationType.Q3_K: dequantize_blocks_Q3_K,
     gguf.GGMLQuantizationType.Q2_K: dequantize_blocks_Q2_K,
+    gguf.GGMLQuantizationType.Q8_K: dequantize_blocks_Q8_K,
+    gguf.GGMLQuantizationType.IQ4_NL: dequantize_blocks_IQ4_NL,
+    gguf.GGMLQuantizationType.IQ4_XS: dequantize_blocks_IQ4_XS,
 }
 
 
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from contextlib import contextmanager
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Optional, Sequence, Tuple
 
 from diffusers import UNet2DConditionModel
 
@@ -10,34 +10,44 @@ from backend.patches.model_patch_raw import ModelPatchRaw
 from backend.stable_diffusion.extensions.base import ExtensionBase
 
 if TYPE_CHECKING:
+    from backend.patches.lora_delta_cache import LoRADeltaCache
     from backend.util.original_weights_storage import OriginalWeightsStorage
 
 
 class LoRAExt(ExtensionBase):
+    """Applies a stack of LoRAs to the UNet.
+
+    The LoRAs are applied together, so each patched weight receives a single fused delta. With a `delta_cache`, the
+    fused deltas are reused by later runs with the same stack.
+    """
+
     def __init__(
         self,
-        lora_model,
-        weight: float,
+        loras: Sequence[Tuple[Any, float]],
+        delta_cache: Optional[LoRADeltaCache] = None,
     ):
         super().__init__()
-        self._lora_model = lora_model
-        self._weight = weight
+        self._loras = loras
+        self._delta_cache = delta_cache
 
     @contextmanager
     def patch_unet(self, unet: UNet2DConditionModel, original_weights: OriginalWeightsStorage):
-        lora_model = self._lora_model.lora.model
-        assert isinstance(lora_model, ModelPatchRaw)
-        LayerPatcher.apply_smart_model_patch(
+        patches = []
+        for lora_model, weight in self._loras:
+            patch = lora_model.lora.model
+            assert isinstance(patch, ModelPatchRaw)
+            patches.append((patch, weight))
+        LayerPatcher.apply_smart_model_patch_set(
             model=unet,
             prefix="lora_unet_",
-            patch=lora_model,
-            patch_weight=self._weight,
+            patches=patches,
             original_weights=original_weights,
             original_modules={},
             dtype=unet.dtype,
             force_direct_patching=True,
             force_sidecar_patching=False,
+            delta_cache=self._delta_cache,
         )
-        del lora_model
+        del patches
 
         yield
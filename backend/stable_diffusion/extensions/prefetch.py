@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Sequence
+
+from backend.stable_diffusion.extension_callback_type import ExtensionCallbackType
+from backend.stable_diffusion.extensions.base import ExtensionBase, callback
+
+if TYPE_CHECKING:
+    from backend.model_manager.load.load_base import LoadedModelWithoutConfig
+    from backend.stable_diffusion.denoise_context import DenoiseContext
+
+
+class PrefetchExt(ExtensionBase):
+    """Start loading the models used after denoising (e.g. the VAE) into VRAM while the last steps run."""
+
+    def __init__(self, models: Sequence[LoadedModelWithoutConfig], steps_before_end: int = 2):
+        super().__init__()
+        self._models = models
+        self._steps_before_end = steps_before_end
+        self._prefetched = False
+
+    @callback(ExtensionCallbackType.POST_STEP)
+    def prefetch(self, ctx: DenoiseContext):
+        if self._prefetched or ctx.step_index < len(ctx.inputs.timesteps) - 1 - self._steps_before_end:
+            return
+        self._prefetched = True
+        for model in self._models:
+            model.prefetch()
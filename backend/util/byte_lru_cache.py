@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class ByteLRUCache(Generic[K, V]):
+    """A thread-safe LRU map bounded by the total size of its entries.
+
+    Callers pass the size of each value when storing it. The least recently used entries are evicted once the total
+    exceeds max_bytes, or the number of entries exceeds max_entries when it is set. A single value larger than
+    max_bytes is never stored, and nothing is stored while max_bytes is 0.
+    """
+
+    def __init__(self, max_bytes: int = 0, max_entries: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        # key -> (value, size in bytes)
+        self._entries: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._cur_bytes = 0
+        # Re-entrant, so users can hold it across several calls and weakref callbacks can run while it is held.
+        self.lock = threading.RLock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def cur_bytes(self) -> int:
+        return self._cur_bytes
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key: K) -> Optional[V]:
+        """Return the value for `key` and mark it as most recently used, or None."""
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def peek(self, key: K) -> Optional[V]:
+        """Return the value for `key` without changing the eviction order, or None."""
+        with self.lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def put(self, key: K, value: V, size: int) -> bool:
+        """Store `value`, replacing any entry for `key`, and return whether it fit in the budget."""
+        with self.lock:
+            self.pop(key)
+            if size > self.max_bytes:
+                return False
+            self._entries[key] = (value, size)
+            self._cur_bytes += size
+            self._evict()
+            return True
+
+    def pop(self, key: K) -> Optional[V]:
+        with self.lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._cur_bytes -= entry[1]
+            return entry[0]
+
+    def clear(self) -> None:
+        with self.lock:
+            self._entries.clear()
+            self._cur_bytes = 0
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self) -> None:
+        while self._entries and (
+            self._cur_bytes > self.max_bytes or (self.max_entries is not None and len(self._entries) > self.max_entries)
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._cur_bytes -= size
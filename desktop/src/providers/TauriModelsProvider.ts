@@ -60,6 +60,9 @@ export class TauriModelsProvider implements ModelsProvider {
           }
         }
       },
+      "model_unrecognized": (data: any) => {
+        console.warn("无法识别的模型文件: ", data);
+      },
     });
 
     return models;
@@ -1,6 +1,6 @@
 
 from ssui import workflow, Prompt, Image, Noise
-from ssui_image.SD1 import SD1Model, SD1Clip, SD1Latent, SD1Lora, SD1Denoise, SD1LatentDecode,SD1MergeLora, SD1IPAdapter
+from ssui_image.SD1 import SD1Model, SD1Clip, SD1Latent, SD1Lora, SD1Denoise, SD1LatentDecode, SD1LatentDecodeBatch,SD1MergeLora, SD1IPAdapter
 from ssui.config import SSUIConfig
 from typing import List, Tuple
 
@@ -14,6 +14,14 @@ def txt2img(model: SD1Model, positive: Prompt, negative: Prompt) -> Image:
     return SD1LatentDecode(config("Latent to Image"), model, latent)
 
 
+@workflow
+def txt2imgBatch(model: SD1Model, positive: Prompt, negative: Prompt) -> List[Image]:
+    positive, negative = SD1Clip(config("Prompt To Condition"), model, positive, negative)
+    latent = SD1Latent(config("Create Empty Latent"))
+    latent = SD1Denoise(config("Denoise"), model, latent, positive, negative)
+    return SD1LatentDecodeBatch(config("Latent to Image"), model, latent)
+
+
 @workflow
 def txt2imgWithRef(model: SD1Model, positive: Prompt, negative: Prompt, reference: Image) -> Tuple[Image, Image]:
     positive, negative = SD1Clip(config("Prompt To Condition"), model, positive, negative)
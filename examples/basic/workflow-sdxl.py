@@ -1,5 +1,5 @@
 from ssui import workflow, Prompt, Image, Noise
-from ssui_image.SDXL import SDXLModel, SDXLClip, SDXLLatent, SDXLLora, SDXLDenoise, SDXLLatentDecode,SDXLMergeLora
+from ssui_image.SDXL import SDXLModel, SDXLClip, SDXLLatent, SDXLLora, SDXLDenoise, SDXLLatentDecode, SDXLLatentDecodeBatch,SDXLMergeLora
 from ssui.config import SSUIConfig
 from typing import List, Tuple
 
@@ -13,6 +13,14 @@ def txt2img(model: SDXLModel, positive: Prompt, negative: Prompt) -> Image:
     return SDXLLatentDecode(config("Latent to Image"), model, latent)
 
 
+@workflow
+def txt2imgBatch(model: SDXLModel, positive: Prompt, negative: Prompt) -> List[Image]:
+    positive, negative = SDXLClip(config("Prompt To Condition"), model, positive, negative)
+    latent = SDXLLatent(config("Create Empty Latent"))
+    latent = SDXLDenoise(config("Denoise"), model, latent, positive, negative)
+    return SDXLLatentDecodeBatch(config("Latent to Image"), model, latent)
+
+
 @workflow
 def txt2imgWithLora(model: SDXLModel, loras: List[SDXLLora], positive: Prompt, negative: Prompt) -> Image:
     model_w_lora = model    
@@ -6,7 +6,7 @@ from ssui.config import SSUIConfig
 from .api.conditioning import BasicConditioningInfo, create_flux_conditioning
 from .api.denoise import flux_decode_latents, flux_denoise_image, FLuxLatents
 from .api.model import (
-    ModelLoaderService,
+    getModelLoader,
     FluxModel as ApiFluxModel,
     T5EncoderModel,
     ClipModel,
@@ -16,19 +16,9 @@ from .api.model import (
     load_lora
 )
 from ssui.base import Prompt, Image
-from ssui.annotation import param
+from ssui.annotation import memoize, param, uses
 from ssui.controller import Random, Select, Switch, Slider
 
-_loader_instance = None
-
-
-def getModelLoader():
-    global _loader_instance
-    if _loader_instance is None:
-        _loader_instance = ModelLoaderService()
-    return _loader_instance
-
-
 class FluxModel:
     def __init__(
         self,
@@ -52,8 +42,8 @@ class FluxModel:
 
     @staticmethod
     def load(model_path: str, t5_encoder_path: str, clip_path: str, vae_path: str):
-        transformer, t5_model, clip_model, vae = load_flux_model(
-            getModelLoader(), model_path, t5_encoder_path, clip_path, vae_path
+        transformer, t5_model, clip_model, vae = getModelLoader().load_resident(
+            load_flux_model, model_path, t5_encoder_path, clip_path, vae_path
         )
         return FluxModel(model_path, t5_encoder_path, clip_path, vae_path, transformer, t5_model, clip_model, vae)
 
@@ -63,6 +53,8 @@ class FluxCondition:
         self.condition_info = condition_info
 
 
+@uses("model.t5_model", "model.clip_model")
+@memoize
 @param("ignoreLastLayer", Switch(), default=False)
 def FluxClip(config: SSUIConfig, model: FluxModel, positive: Prompt, negative: Prompt):
     if config.is_prepare():
@@ -131,6 +123,8 @@ class FluxLora:
 
         return fluxlora
 
+@uses("model.transformer")
+@memoize
 @param(
     "steps",
     Slider(1, 100, 1, labels=[1, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]),
@@ -184,6 +178,8 @@ def FluxDenoise(
     return FluxLatent(config("DenoiseToLatents"), tensor.tensor)
 
 
+@uses("model.vae")
+@memoize
 def FluxLatentDecode(config, model: FluxModel, latent: FluxLatent):
     if config.is_prepare():
         return Image()
@@ -2,9 +2,9 @@ from typing import Optional,List
 from pathlib import Path
 from ssui.config import SSUIConfig
 from .api.conditioning import BasicConditioningInfo, create_conditioning
-from .api.denoise import decode_latents, denoise_image
+from .api.denoise import decode_latents_batch, denoise_image, encode_image
 from .api.model import (
-    ModelLoaderService,
+    getModelLoader,
     UNetModel,
     ClipModel,
     VAEModel,
@@ -13,20 +13,10 @@ from .api.model import (
     load_lora
 )
 from ssui.base import Prompt, Image
-from ssui.annotation import param
+from ssui.annotation import memoize, param, uses
 from ssui.controller import Random, Select, Switch, Slider
 
 
-_loader_instance = None
-
-
-def getModelLoader():
-    global _loader_instance
-    if _loader_instance is None:
-        _loader_instance = ModelLoaderService()
-    return _loader_instance
-
-
 class SD1Model:
     def __init__(
         self,
@@ -42,7 +32,7 @@ class SD1Model:
 
     @staticmethod
     def load(path: str) -> "SD1Model":
-        unet, clip, vae = load_model(getModelLoader(), path)
+        unet, clip, vae = getModelLoader().load_resident(load_model, path)
         return SD1Model(path, unet, clip, vae)
 
 
@@ -51,6 +41,8 @@ class SD1Condition:
         self.condition_info = condition_info
 
 
+@uses("model.clip")
+@memoize
 @param("ignoreLastLayer", Switch(), default=False)
 def SD1Clip(config: SSUIConfig, model: SD1Model, positive: Prompt, negative: Prompt):
     if config.is_prepare():
@@ -91,8 +83,12 @@ class SD1Latent:
         print("height:", self.height)
 
     @staticmethod
-    def from_image(image: Image) -> "SD1Latent":
-        pass
+    def from_image(image: Image, model: SD1Model) -> "SD1Latent":
+        # 不经过config，尺寸直接取自图片
+        latent = SD1Latent.__new__(SD1Latent)
+        latent.width, latent.height = image._image.size
+        latent.tensor = encode_image(model.vae, image._image)
+        return latent
 
 
 class SD1Lora:
@@ -131,6 +127,8 @@ def SD1MergeLora(
     return model
 
 
+@uses("model.unet")
+@memoize
 @param(
     "steps",
     Slider(1, 100, 1, labels=[1, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]),
@@ -174,6 +172,9 @@ def SD1MergeLora(
 )
 @param("CFG", Slider(0, 15, 0.1), default=7.5)
 @param("seed", Random(), default=123454321)
+@param("batch_size", Slider(1, 16, 1), default=1)
+# 只在latent带有图片编码结果时生效（图生图），1表示完全重绘
+@param("strength", Slider(0, 1, 0.01), default=0.75)
 def SD1Denoise(
     config,
     model: SD1Model,
@@ -188,29 +189,51 @@ def SD1Denoise(
     print("scheduler:", config["scheduler"])
     print("steps:", config["steps"])
     print("CFG:", config["CFG"])
+    print("batch_size:", config["batch_size"])
 
+    # 每个样本使用连续的种子，整批在一次去噪循环中完成
+    seeds = [config["seed"] + i for i in range(config["batch_size"])]
     tensor = denoise_image(
         model=model.unet,
         positive=positive.condition_info,
         negative=negative.condition_info,
-        seed=config["seed"],
+        seeds=seeds,
         width=latent.width,
         height=latent.height,
+        latents=latent.tensor,
+        strength=config["strength"],
         scheduler_name=config["scheduler"],
         steps=config["steps"],
         cfg_scale=config["CFG"],
+        # 最后几步去噪时提前把VAE加载到显存
+        prefetch=[model.vae.vae],
     )
     return SD1Latent(config("Create Empty Latent"), tensor)
 
 
+@uses("model.vae")
+@memoize
 def SD1LatentDecode(config, model: SD1Model, latent: SD1Latent):
     if config.is_prepare():
         return Image()
 
     print("SD1LatentDecode executed")
 
-    image = decode_latents(model.vae, latent.tensor)
-    return Image(image)
+    if latent.tensor.tensor.shape[0] != 1:
+        raise ValueError("SD1LatentDecode只能解码单个样本，批量生成请使用SD1LatentDecodeBatch")
+    return Image(decode_latents_batch(model.vae, latent.tensor)[0])
+
+
+@uses("model.vae")
+@memoize
+def SD1LatentDecodeBatch(config, model: SD1Model, latent: SD1Latent):
+    if config.is_prepare():
+        return [Image()]
+
+    print("SD1LatentDecodeBatch executed")
+
+    # 批量生成时每个样本输出一张图片，batch_size为1时也返回列表
+    return [Image(image) for image in decode_latents_batch(model.vae, latent.tensor)]
 
 
 class SD1IPAdapter:
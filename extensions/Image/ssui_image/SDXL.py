@@ -4,9 +4,9 @@ import torch
 from backend.stable_diffusion.diffusion.conditioning_data import SDXLConditioningInfo
 from ssui.config import SSUIConfig
 from .api.conditioning import BasicConditioningInfo, create_sdxl_conditioning
-from .api.denoise import decode_latents, denoise_image
+from .api.denoise import decode_latents_batch, denoise_image, encode_image
 from .api.model import (
-    ModelLoaderService,
+    getModelLoader,
     UNetModel,
     ClipModel,
     VAEModel,
@@ -16,18 +16,8 @@ from .api.model import (
     load_lora
 )
 from ssui.base import Prompt, Image
-from ssui.annotation import param
-from ssui.controller import Select, Switch, Slider
-
-
-_loader_instance = None
-
-
-def getModelLoader():
-    global _loader_instance
-    if _loader_instance is None:
-        _loader_instance = ModelLoaderService()
-    return _loader_instance
+from ssui.annotation import memoize, param, uses
+from ssui.controller import Random, Select, Switch, Slider
 
 
 class SDXLModel:
@@ -47,7 +37,7 @@ class SDXLModel:
 
     @staticmethod
     def load(path: str) -> "SDXLModel":
-        unet, clip, clip2, vae = load_sdxl_model(getModelLoader(), path)
+        unet, clip, clip2, vae = getModelLoader().load_resident(load_sdxl_model, path)
         return SDXLModel(path, unet, clip, clip2, vae)
 
 
@@ -56,6 +46,8 @@ class SDXLCondition:
         self.condition_info = condition_info
 
 
+@uses("model.clip", "model.clip2")
+@memoize
 @param("ignoreLastLayer", Switch(), default=False)
 def SDXLClip(config: SSUIConfig, model: SDXLModel, positive: Prompt, negative: Prompt):
     if config.is_prepare():
@@ -97,8 +89,12 @@ class SDXLLatent:
         print("height:", self.height)
 
     @staticmethod
-    def from_image(image: Image) -> "SDXLLatent":
-        pass
+    def from_image(image: Image, model: SDXLModel) -> "SDXLLatent":
+        # 不经过config，尺寸直接取自图片
+        latent = SDXLLatent.__new__(SDXLLatent)
+        latent.width, latent.height = image._image.size
+        latent.tensor = encode_image(model.vae, image._image)
+        return latent
 
 
 class SDXLLora:
@@ -121,6 +117,8 @@ class SDXLLora:
 
         return sdxlLora
     
+@uses("model.unet")
+@memoize
 @param(
     "steps",
     Slider(1, 100, 1, labels=[1, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]),
@@ -163,6 +161,10 @@ class SDXLLora:
     default="euler_a",
 )
 @param("CFG", Slider(0, 15, 0.1), default=7.5)
+@param("seed", Random(), default=123454321)
+@param("batch_size", Slider(1, 16, 1), default=1)
+# 只在latent带有图片编码结果时生效（图生图），1表示完全重绘
+@param("strength", Slider(0, 1, 0.01), default=0.75)
 def SDXLDenoise(
     config: SSUIConfig,
     model: SDXLModel,
@@ -177,29 +179,51 @@ def SDXLDenoise(
     print("scheduler:", config["scheduler"])
     print("steps:", config["steps"])
     print("CFG:", config["CFG"])
+    print("batch_size:", config["batch_size"])
 
+    # 每个样本使用连续的种子，整批在一次去噪循环中完成
+    seeds = [config["seed"] + i for i in range(config["batch_size"])]
     tensor = denoise_image(
         model=model.unet,
         positive=positive.condition_info,
         negative=negative.condition_info,
-        seed=123454321,
+        seeds=seeds,
         width=latent.width,
         height=latent.height,
+        latents=latent.tensor,
+        strength=config["strength"],
         scheduler_name=config["scheduler"],
         steps=config["steps"],
         cfg_scale=config["CFG"],
+        # 最后几步去噪时提前把VAE加载到显存
+        prefetch=[model.vae.vae],
     )
     return SDXLLatent(config("DenoiseToLatents"), tensor)
 
 
+@uses("model.vae")
+@memoize
 def SDXLLatentDecode(config: SSUIConfig, model: SDXLModel, latent: SDXLLatent):
     if config.is_prepare():
         return Image()
 
     print("SDXLLatentDecode executed")
 
-    image = decode_latents(model.vae, latent.tensor)
-    return Image(image)
+    if latent.tensor.tensor.shape[0] != 1:
+        raise ValueError("SDXLLatentDecode只能解码单个样本，批量生成请使用SDXLLatentDecodeBatch")
+    return Image(decode_latents_batch(model.vae, latent.tensor)[0])
+
+
+@uses("model.vae")
+@memoize
+def SDXLLatentDecodeBatch(config: SSUIConfig, model: SDXLModel, latent: SDXLLatent):
+    if config.is_prepare():
+        return [Image()]
+
+    print("SDXLLatentDecodeBatch executed")
+
+    # 批量生成时每个样本输出一张图片，batch_size为1时也返回列表
+    return [Image(image) for image in decode_latents_batch(model.vae, latent.tensor)]
 
 def SDXLMergeLora(
     config,
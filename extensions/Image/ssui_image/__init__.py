@@ -8,6 +8,7 @@ from .SD1 import (
     SD1Lora,
     SD1Denoise,
     SD1LatentDecode,
+    SD1LatentDecodeBatch,
     SD1IPAdapter
 )
 
@@ -19,7 +20,8 @@ from .SDXL import (
     SDXLLatent,
     SDXLLora,
     SDXLDenoise,
-    SDXLLatentDecode
+    SDXLLatentDecode,
+    SDXLLatentDecodeBatch
 )
 
 # 定义__all__列表，明确指定导出的符号
@@ -33,6 +35,7 @@ __all__ = [
     "SD1Lora",
     "SD1Denoise",
     "SD1LatentDecode",
+    "SD1LatentDecodeBatch",
     "SD1IPAdapter",
     
     # SDXL模块中的类和函数
@@ -42,5 +45,6 @@ __all__ = [
     "SDXLLatent",
     "SDXLLora",
     "SDXLDenoise",
-    "SDXLLatentDecode"
+    "SDXLLatentDecode",
+    "SDXLLatentDecodeBatch"
 ]
@@ -21,15 +21,27 @@ from typing import Optional, Tuple, Union, cast
 import torch
 
 from compel import Compel, ReturnedEmbeddingsType
+from compel.prompt_parser import Conjunction, FlattenedPrompt
 
 
 from backend.util.devices import TorchDevice
 from backend.util.mask import to_standard_float_mask
 
+from .embedding_cache import conditioning_cache, encoder_cache_key
 from .model import ClipModel, T5EncoderModel as ModelT5Encoder
 
 
 def create_conditioning(prompt: str, clip_model: ClipModel):
+    key = (
+        "sd1",
+        encoder_cache_key(clip_model.text_encoder),
+        prompt,
+    )
+    c = conditioning_cache.get_or_create(key, lambda: _encode_sd1_prompt(prompt, clip_model))
+    return BasicConditioningInfo(embeds=c)
+
+
+def _encode_sd1_prompt(prompt: str, clip_model: ClipModel) -> torch.Tensor:
     text_encoder = clip_model.text_encoder
     tokenizer = clip_model.tokenizer
 
@@ -50,8 +62,25 @@ def create_conditioning(prompt: str, clip_model: ClipModel):
 
         conjunction = Compel.parse_prompt_string(prompt)
         c, _options = compel.build_conditioning_tensor_for_conjunction(conjunction)
-        c = c.detach().to("cpu")
-        return BasicConditioningInfo(embeds=c)
+        return c.detach().to("cpu")
+
+
+def _plain_prompt_text(conjunction: Conjunction, tokenizer: CLIPTokenizer) -> Optional[str]:
+    """Return the prompt text if it has no weighting syntax and fits in a single CLIP window, otherwise None.
+
+    Such prompts encode to exactly the same tokens in Compel's conditioning path and in its pooled path.
+    """
+    if len(conjunction.prompts) != 1 or conjunction.weights[0] != 1.0:
+        return None
+    prompt = conjunction.prompts[0]
+    if not isinstance(prompt, FlattenedPrompt) or len(prompt.children) != 1:
+        return None
+    fragment = prompt.children[0]
+    if fragment.weight != 1.0:
+        return None
+    if len(tokenizer(fragment.text).input_ids) > tokenizer.model_max_length:
+        return None
+    return fragment.text
 
 
 def run_clip_compel(
@@ -59,6 +88,25 @@ def run_clip_compel(
     prompt: str,
     get_pooled: bool,
     zero_on_empty: bool,
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    key = (
+        "clip",
+        encoder_cache_key(clip_model.text_encoder),
+        prompt,
+        get_pooled,
+        zero_on_empty,
+    )
+    return conditioning_cache.get_or_create(
+        key, lambda: _run_clip_compel_uncached(clip_model, prompt, get_pooled, zero_on_empty)
+    )
+
+
+@torch.no_grad()
+def _run_clip_compel_uncached(
+    clip_model: ClipModel,
+    prompt: str,
+    get_pooled: bool,
+    zero_on_empty: bool,
 ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
     text_encoder_info = clip_model.text_encoder
     tokenizer = clip_model.tokenizer
@@ -103,12 +151,25 @@ def run_clip_compel(
 
         conjunction = Compel.parse_prompt_string(prompt)
 
-        # TODO: ask for optimizations? to not run text_encoder twice
-        c, _options = compel.build_conditioning_tensor_for_conjunction(conjunction)
-        if get_pooled:
-            c_pooled = compel.conditioning_provider.get_pooled_embeddings([prompt])
+        plain_text = _plain_prompt_text(conjunction, tokenizer.model) if get_pooled else None
+        if plain_text is not None:
+            # A single text encoder pass yields both the penultimate hidden states and the pooled output.
+            token_ids = tokenizer.model(
+                plain_text,
+                padding="max_length",
+                max_length=tokenizer.model.model_max_length,
+                truncation=True,
+                return_tensors="pt",
+            ).input_ids.to(TorchDevice.choose_torch_device())
+            output = text_encoder(token_ids, output_hidden_states=True, return_dict=True)
+            c = output.hidden_states[-2]
+            c_pooled = output.text_embeds
         else:
-            c_pooled = None
+            c, _options = compel.build_conditioning_tensor_for_conjunction(conjunction)
+            if get_pooled:
+                c_pooled = compel.conditioning_provider.get_pooled_embeddings([prompt])
+            else:
+                c_pooled = None
 
     del tokenizer
     del text_encoder
@@ -184,6 +245,18 @@ def create_sdxl_conditioning(
     )
 
 
+def _repeat_for_batch(
+    conditioning: Union[BasicConditioningInfo, SDXLConditioningInfo], batch_size: int
+) -> Union[BasicConditioningInfo, SDXLConditioningInfo]:
+    if isinstance(conditioning, SDXLConditioningInfo):
+        return SDXLConditioningInfo(
+            embeds=conditioning.embeds.repeat(batch_size, 1, 1),
+            pooled_embeds=conditioning.pooled_embeds.repeat(batch_size, 1),
+            add_time_ids=conditioning.add_time_ids.repeat(batch_size, 1),
+        )
+    return BasicConditioningInfo(embeds=conditioning.embeds.repeat(batch_size, 1, 1))
+
+
 def get_conditioning_data(
     positive_conditioning_field: Union[
         BasicConditioningInfo, list[BasicConditioningInfo]
@@ -198,6 +271,7 @@ def get_conditioning_data(
     cfg_scale: float | list[float],
     steps: int,
     cfg_rescale_multiplier: float,
+    batch_size: int = 1,
 ) -> TextConditioningData:
 
     def _get_text_embeddings_and_masks(
@@ -364,6 +438,11 @@ def get_conditioning_data(
         dtype=dtype,
     )
 
+    # Repeat the embeddings along the batch dimension so every latent in the batch shares the same prompt.
+    if batch_size > 1:
+        cond_text_embedding = _repeat_for_batch(cond_text_embedding, batch_size)
+        uncond_text_embedding = _repeat_for_batch(uncond_text_embedding, batch_size)
+
     if isinstance(cfg_scale, list):
         assert (
             len(cfg_scale) == steps
@@ -438,8 +517,10 @@ def create_flux_conditioning(prompt: str, t5_encoder: ModelT5Encoder, clip_model
         assert isinstance(pooled_prompt_embeds, torch.Tensor)
         return pooled_prompt_embeds
 
-    t5_embeddings = _t5_encode(prompt)
-    clip_embeddings = _clip_encode(prompt)
+    t5_key = ("t5", encoder_cache_key(t5_encoder.text_encoder), t5_encoder.max_seq_length, prompt)
+    clip_key = ("flux_clip", encoder_cache_key(clip_model.text_encoder), prompt)
+    t5_embeddings = conditioning_cache.get_or_create(t5_key, lambda: _t5_encode(prompt).detach().to("cpu"))
+    clip_embeddings = conditioning_cache.get_or_create(clip_key, lambda: _clip_encode(prompt).detach().to("cpu"))
     return FLUXConditioningInfo(clip_embeds=clip_embeddings, t5_embeds=t5_embeddings)
 
 def _load_text_conditioning(
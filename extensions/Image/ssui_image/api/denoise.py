@@ -21,6 +21,7 @@ from backend.model_manager.config import BaseModelType, ModelFormat, ModelVarian
 from backend.model_patcher import ModelPatcher
 from backend.patches.layer_patcher import LayerPatcher
 from backend.patches.lora_conversions.flux_lora_constants import FLUX_LORA_TRANSFORMER_PREFIX
+from backend.patches.lora_delta_cache import lora_delta_cache
 from backend.patches.model_patch_raw import ModelPatchRaw
 from backend.stable_diffusion.denoise_context import DenoiseContext, DenoiseInputs
 from backend.stable_diffusion.diffusion.conditioning_data import (
@@ -34,14 +35,18 @@ from backend.stable_diffusion.extensions.freeu import FreeUExt
 from backend.stable_diffusion.extensions.inpaint import InpaintExt
 from backend.stable_diffusion.extensions.inpaint_model import InpaintModelExt
 from backend.stable_diffusion.extensions.lora import LoRAExt
+from backend.stable_diffusion.extensions.prefetch import PrefetchExt
+from backend.stable_diffusion.extensions.preview import PreviewExt
 from backend.stable_diffusion.extensions.rescale_cfg import RescaleCFGExt
 from backend.stable_diffusion.extensions.seamless import SeamlessExt
 from backend.stable_diffusion.extensions.t2i_adapter import T2IAdapterExt
 from backend.stable_diffusion.extensions_manager import ExtensionsManager
+from backend.stable_diffusion.vae_tiling import patch_vae_tiling_params
+from backend.image_util.composition import image_resized_to_grid_as_tensor
 from backend.stable_diffusion.util.controlnet_utils import CONTROLNET_RESIZE_VALUES, CONTROLNET_MODE_VALUES
 from backend.util.devices import TorchDevice
 import inspect
-from contextlib import ExitStack
+from contextlib import ExitStack, contextmanager
 from torchvision.transforms.functional import resize as tv_resize
 import torchvision.transforms as tv_transforms
 from transformers import CLIPImageProcessor, CLIPVisionModelWithProjection
@@ -53,6 +58,7 @@ import torch
 from backend.model_manager import AnyModelConfig
 from backend.model_manager.load import (
     LoadedModel,
+    LoadedModelWithoutConfig,
 )
 
 from backend.util.devices import TorchDevice
@@ -77,7 +83,9 @@ from diffusers.models.autoencoders.autoencoder_tiny import AutoencoderTiny
 from diffusers.image_processor import VaeImageProcessor
 
 from .conditioning import _load_text_conditioning, get_conditioning_data
-from .model import ControlLoRAModel, FluxModel, LoRAModel, UNetModel, VAEModel
+from .preview import flux_step_callback, sd_step_callback
+from ssui.progress import TaskCanceledError, is_canceled
+from .model import ControlLoRAModel, FluxModel, LoRAModel, UNetModel, VAEModel, getModelLoader
 from backend.flux.sampling_utils import (
     clip_timestep_schedule_fractional,
     generate_img_ids,
@@ -120,6 +128,34 @@ def get_noise(
     return noise_tensor
 
 
+def get_batch_noise(
+    width: int,
+    height: int,
+    device: torch.device,
+    seeds: List[int],
+    latent_channels: int = 4,
+    downsampling_factor: int = 8,
+    use_cpu: bool = True,
+) -> torch.Tensor:
+    """Generate a batch of noise with one seed per sample.
+
+    Each sample is generated from its own generator, so sample i matches get_noise(seed=seeds[i]) exactly.
+    """
+    return torch.cat(
+        [
+            get_noise(
+                width=width,
+                height=height,
+                device=device,
+                seed=seed,
+                latent_channels=latent_channels,
+                downsampling_factor=downsampling_factor,
+                use_cpu=use_cpu,
+            )
+            for seed in seeds
+        ]
+    )
+
 
 class Latents(BaseModel):
     tensor: torch.Tensor = Field(description="The latents to be denoised", validate=False)
@@ -230,20 +266,23 @@ def denoise_image(
     width: int = 1024,
     height: int = 1024,
     scheduler_name: str = "ddim",
+    seeds: Optional[List[int]] = None,
     cfg_scale: float = 7.5,
     cfg_rescale_multiplier: float = 1.0,
     steps: int = 20,
     latents: Optional[Latents] = None,
+    strength: float = 1.0,
     denoise_mask: Optional[DenoiseMask] = None,
     control: Optional[ControlNet] = None,
     ip_adapter: Optional[IPAdapter] = None,
     t2i_adapter: Optional[T2IAdapter] = None,
+    prefetch: Optional[List[LoadedModelWithoutConfig]] = None,
 ) -> Latents:
     
     def get_scheduler(
         scheduler_info: LoadedModel,
         scheduler_name: str,
-        seed: int,
+        seeds: List[int],
         unet_config: AnyModelConfig,
     ) -> Scheduler:
         """Load a scheduler and apply some scheduler-specific overrides."""
@@ -269,8 +308,10 @@ def denoise_image(
             scheduler_config["prediction_type"] = unet_config.prediction_type
 
         # make dpmpp_sde reproducable(seed can be passed only in initializer)
+        # With a list of seeds the Brownian tree noise sampler keeps one tree per sample, so sample i matches a single
+        # run with seeds[i].
         if scheduler_class is DPMSolverSDEScheduler:
-            scheduler_config["noise_sampler_seed"] = seed
+            scheduler_config["noise_sampler_seed"] = seeds[0] if len(seeds) == 1 else list(seeds)
 
         if (
             scheduler_class is DPMSolverMultistepScheduler
@@ -296,7 +337,7 @@ def denoise_image(
         steps: int,
         denoising_start: float,
         denoising_end: float,
-        seed: int,
+        seeds: List[int],
     ) -> Tuple[torch.Tensor, torch.Tensor, Dict[str, Any]]:
         assert isinstance(scheduler, ConfigMixin)
         if scheduler.config.get("cpu_only", False):
@@ -346,13 +387,11 @@ def denoise_image(
             #   - KDPM2AncestralDiscreteScheduler
             #   - LCMScheduler
             #   - TCDScheduler
-            scheduler_step_kwargs.update(
-                {
-                    "generator": torch.Generator(device=device).manual_seed(
-                        seed ^ 0xFFFFFFFF
-                    )
-                }
-            )
+            #
+            # In a batch every sample gets its own generator, so the noise that ancestral and SDE samplers add at each
+            # step for sample i matches a single run with seeds[i].
+            generators = [torch.Generator(device=device).manual_seed(seed ^ 0xFFFFFFFF) for seed in seeds]
+            scheduler_step_kwargs.update({"generator": generators[0] if len(generators) == 1 else generators})
         if isinstance(scheduler, TCDScheduler):
             scheduler_step_kwargs.update({"eta": 1.0})
 
@@ -450,16 +489,22 @@ def denoise_image(
     device = TorchDevice.choose_torch_device()
     dtype = TorchDevice.choose_torch_dtype()
     unet_config = model.scheduler.config
-    noise = get_noise(width=width, height=height, device=device, seed=seed)
+    # One sample per seed, all denoised together in a single batched loop.
+    seeds = seeds or [seed]
+    seed = seeds[0]
+    noise = get_batch_noise(width=width, height=height, device=device, seeds=seeds)
 
     if latents is not None:
+        # img2img: every sample starts from the encoded image, noised according to strength
         latents = latents.tensor
+        if latents.shape[0] == 1 and len(seeds) > 1:
+            latents = latents.repeat(len(seeds), 1, 1, 1)
+        denoising_start = 1.0 - strength
     else:
         latents = torch.zeros_like(noise)
+        denoising_start = 0.0
 
     print("conditioning created: ", positive, negative)
-    
-    latents = torch.zeros_like(noise)
     print("noise created: ", noise)
     _, _, latent_height, latent_width = latents.shape
 
@@ -473,26 +518,33 @@ def denoise_image(
         cfg_scale=cfg_scale,
         steps=steps,
         cfg_rescale_multiplier=0,
+        batch_size=len(seeds),
     )
     print("conditioning data created: ", conditioning_data)
 
     scheduler = get_scheduler(
         scheduler_info=scheduler,
         scheduler_name=scheduler_name,
-        seed=seed,
+        seeds=seeds,
         unet_config=unet_config,
     )
 
     timesteps, init_timestep, scheduler_step_kwargs = init_scheduler(
         scheduler,
-        seed=seed,
+        seeds=seeds,
         device=device,
         steps=steps,
-        denoising_start=0,
+        denoising_start=denoising_start,
         denoising_end=1,
     )
 
-    ext_manager = ExtensionsManager()
+    # Checked before every extension callback, i.e. at least once per denoise step.
+    ext_manager = ExtensionsManager(is_canceled=(is_canceled, TaskCanceledError))
+
+    ### preview
+    ext_manager.add_extension(PreviewExt(sd_step_callback(unet_config.base)))
+    if prefetch:
+        ext_manager.add_extension(PrefetchExt(prefetch))
 
     ### cfg rescale
     if cfg_rescale_multiplier > 0:
@@ -504,13 +556,12 @@ def denoise_image(
 
     ### lora
     if model.loras:
-        for lora_field in model.loras:
-            ext_manager.add_extension(
-                LoRAExt(
-                    lora_model=lora_field.lora,
-                    weight=lora_field.weight,
-                )
+        ext_manager.add_extension(
+            LoRAExt(
+                loras=[(lora_field.lora, lora_field.weight) for lora_field in model.loras],
+                delta_cache=lora_delta_cache,
             )
+        )
     ### seamless
     if model.seamless_axes:
         ext_manager.add_extension(SeamlessExt(model.seamless_axes))
@@ -581,27 +632,171 @@ def denoise_image(
 
 @torch.no_grad()
 def decode_latents(model: VAEModel, result_latents: Latents) -> PIL.Image.Image | None:
+    return decode_latents_batch(model, result_latents)[0]
+
+
+LATENT_SCALE_FACTOR = 8
+# Peak working memory per pixel per byte of precision. The decode constant matches the one measured for the FLUX VAE
+# in flux_decode_latents, which shares the SD decoder architecture; encoding peaks at roughly half of that.
+VAE_DECODE_SCALING_CONSTANT = 1100
+VAE_ENCODE_SCALING_CONSTANT = 550
+
+
+def estimate_vae_working_memory(
+    height: int, width: int, batch_size: int, element_size: int, scaling_constant: int
+) -> int:
+    """Estimate the working memory of a VAE pass over a batch of height x width pixel images, with a 20% buffer."""
+    return int(height * width * batch_size * element_size * scaling_constant * 1.2)
+
+
+def vae_working_memory_budget() -> int:
+    """The working memory a VAE pass may use, from the device_working_mem_gb setting of the shared model cache."""
+    return int(getModelLoader().ram_cache.execution_device_working_mem_gb * 2**30)
+
+
+def choose_vae_tile_size(
+    height: int,
+    width: int,
+    batch_size: int,
+    element_size: int,
+    scaling_constant: int,
+    budget: int,
+) -> int:
+    """Pick the largest square pixel tile (a multiple of 64, at least 512) that keeps a VAE pass within budget.
+
+    Returns 0 when the whole image fits and no tiling is needed.
+    """
+    if estimate_vae_working_memory(height, width, batch_size, element_size, scaling_constant) <= budget:
+        return 0
+    tile_size = max(height, width) // 64 * 64
+    while tile_size > 512 and estimate_vae_working_memory(
+        tile_size, tile_size, batch_size, element_size, scaling_constant
+    ) > budget:
+        tile_size -= 64
+    return max(tile_size, 512)
+
+
+def choose_vae_chunk_size(
+    height: int,
+    width: int,
+    batch_size: int,
+    element_size: int,
+    scaling_constant: int,
+    budget: int,
+) -> int:
+    """Pick how many samples a VAE pass may take so that tiles of the minimum size (512) still fit within budget.
+
+    Tiling only splits the image, so a large batch is decoded in chunks of samples instead, down to one per pass.
+    """
+    min_height, min_width = min(height, 512), min(width, 512)
+    chunk_size = batch_size
+    while chunk_size > 1 and estimate_vae_working_memory(
+        min_height, min_width, chunk_size, element_size, scaling_constant
+    ) > budget:
+        chunk_size -= 1
+    return chunk_size
+
+
+@contextmanager
+def vae_tiling(vae: AutoencoderKL | AutoencoderTiny, tile_size: int):
+    """Enable tiled VAE passes with the given pixel tile size, or disable tiling when tile_size is 0.
+
+    Adjacent tiles overlap by a quarter of a tile and are linearly blended across the overlap to hide seams.
+    """
+    if tile_size == 0:
+        vae.disable_tiling()
+        yield
+        return
+
+    vae.enable_tiling()
+    try:
+        with patch_vae_tiling_params(
+            vae,
+            tile_sample_min_size=tile_size,
+            tile_latent_min_size=tile_size // LATENT_SCALE_FACTOR,
+            tile_overlap_factor=0.25,
+        ):
+            yield
+    finally:
+        vae.disable_tiling()
+
+
+@torch.no_grad()
+def decode_latents_batch(model: VAEModel, result_latents: Latents) -> List[PIL.Image.Image]:
+    """Decode every sample of a batched latent tensor, tiling and chunking the VAE passes to fit the memory budget."""
+    latents = result_latents.tensor
+    batch_size, _, latent_height, latent_width = latents.shape
+    height, width = latent_height * LATENT_SCALE_FACTOR, latent_width * LATENT_SCALE_FACTOR
+    budget = vae_working_memory_budget()
+    # The VAE always runs in fp16 here.
+    chunk_size = choose_vae_chunk_size(
+        height, width, batch_size, element_size=2, scaling_constant=VAE_DECODE_SCALING_CONSTANT, budget=budget
+    )
+    tile_size = choose_vae_tile_size(
+        height, width, chunk_size, element_size=2, scaling_constant=VAE_DECODE_SCALING_CONSTANT, budget=budget
+    )
+    working_memory = estimate_vae_working_memory(
+        tile_size or height,
+        tile_size or width,
+        chunk_size,
+        element_size=2,
+        scaling_constant=VAE_DECODE_SCALING_CONSTANT,
+    )
+
     vae = model.vae
     assert isinstance(vae.model, (AutoencoderKL, AutoencoderTiny))
-    with (vae.model_on_device() as (_, vae),):
-        result_latents = result_latents.tensor.to(
-            device=TorchDevice.choose_torch_device()
-        )
+    images: List[PIL.Image.Image] = []
+    with (vae.model_on_device(working_mem_bytes=working_memory) as (_, vae),):
         vae.to(dtype=torch.float16)
-        result_latents = result_latents.half()
-        vae.disable_tiling()
         TorchDevice.empty_cache()
 
-        with torch.inference_mode():
-            # copied from diffusers pipeline
-            result_latents = result_latents / vae.config.scaling_factor
-            image = vae.decode(result_latents, return_dict=False)[0]
-            image = (image / 2 + 0.5).clamp(0, 1)  # denormalize
-            # we always cast to float32 as this does not cause significant overhead and is compatible with bfloat16
-            np_image = image.cpu().permute(0, 2, 3, 1).float().numpy()
+        with torch.inference_mode(), vae_tiling(vae, tile_size):
+            for chunk in latents.split(chunk_size):
+                chunk = chunk.to(device=TorchDevice.choose_torch_device()).half()
+                # copied from diffusers pipeline
+                chunk = chunk / vae.config.scaling_factor
+                image = vae.decode(chunk, return_dict=False)[0]
+                image = (image / 2 + 0.5).clamp(0, 1)  # denormalize
+                # we always cast to float32 as this does not cause significant overhead and is compatible with bfloat16
+                np_image = image.cpu().permute(0, 2, 3, 1).float().numpy()
+                images.extend(VaeImageProcessor.numpy_to_pil(np_image))
+
+    return images
+
+
+@torch.no_grad()
+def encode_image(model: VAEModel, image: PIL.Image.Image) -> Latents:
+    """Encode an image to latents, tiling the VAE pass when it exceeds the memory budget."""
+    image_tensor = image_resized_to_grid_as_tensor(image.convert("RGB"))
+    if image_tensor.dim() == 3:
+        image_tensor = image_tensor.unsqueeze(0)
+    _, _, height, width = image_tensor.shape
+    tile_size = choose_vae_tile_size(
+        height,
+        width,
+        1,
+        element_size=2,
+        scaling_constant=VAE_ENCODE_SCALING_CONSTANT,
+        budget=vae_working_memory_budget(),
+    )
+    working_memory = estimate_vae_working_memory(
+        tile_size or height, tile_size or width, 1, element_size=2, scaling_constant=VAE_ENCODE_SCALING_CONSTANT
+    )
+
+    vae = model.vae
+    assert isinstance(vae.model, (AutoencoderKL, AutoencoderTiny))
+    with (vae.model_on_device(working_mem_bytes=working_memory) as (_, vae),):
+        vae.to(dtype=torch.float16)
+        image_tensor = image_tensor.to(device=TorchDevice.choose_torch_device(), dtype=torch.float16)
+
+        with torch.inference_mode(), vae_tiling(vae, tile_size):
+            if isinstance(vae, AutoencoderTiny):
+                latents = vae.encode(image_tensor).latents
+            else:
+                latents = vae.encode(image_tensor).latent_dist.sample()
+            latents = vae.config.scaling_factor * latents
 
-            image = VaeImageProcessor.numpy_to_pil(np_image)[0]
-            return image
+    return Latents(tensor=latents.detach().float().to("cpu"))
 
 
 class FLuxLatents(BaseModel):
@@ -1132,6 +1327,7 @@ def flux_denoise_image(
                 dtype=inference_dtype,
                 cached_weights=cached_weights,
                 force_sidecar_patching=model_is_quantized,
+                delta_cache=lora_delta_cache,
             )
         )
 
@@ -1160,7 +1356,7 @@ def flux_denoise_image(
             controlnet_extensions=controlnet_extensions,
             pos_ip_adapter_extensions=pos_ip_adapter_extensions,
             neg_ip_adapter_extensions=neg_ip_adapter_extensions,
-            step_callback=None,
+            step_callback=flux_step_callback(height, width),
         )
 
     result_latents = unpack(x.float(), height, width)
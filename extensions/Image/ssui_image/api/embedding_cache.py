@@ -0,0 +1,100 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+import torch
+
+from backend.model_manager.load import LoadedModelWithoutConfig
+
+
+def encoder_cache_key(text_encoder: LoadedModelWithoutConfig) -> Tuple:
+    """Identify a text encoder by the inputs the encode call actually uses.
+
+    The RAM cache key is derived from the model content hash, so it stays the same across processes and restarts.
+    The encoders run without clip skip or LoRA patches, so those are left out of the key; whoever starts applying them
+    to the text encoder has to add them here.
+    """
+    return (text_encoder._cache_record.key,)
+
+
+class ConditioningCache:
+    """LRU cache of text encoder outputs, keyed by (encoder, prompt, options).
+
+    Values are tensors or tuples of tensors that live on the CPU. When `cache_dir` is set, entries evicted from RAM are
+    written there and read back on the next miss, so repeated prompts skip text encoding across restarts too.
+    Callers must treat returned tensors as read-only.
+    """
+
+    def __init__(self, max_entries: int = 64, cache_dir: Optional[str] = None):
+        self._max_entries = max_entries
+        self._cache_dir = cache_dir
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        value = self._load_from_disk(key)
+        if value is None:
+            value = factory()
+            with self._lock:
+                self.misses += 1
+        else:
+            with self._lock:
+                self.hits += 1
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                evicted_key, evicted_value = self._entries.popitem(last=False)
+                self._save_to_disk(evicted_key, evicted_value)
+        return value
+
+    def set_cache_dir(self, cache_dir: Optional[str]) -> None:
+        """Set the directory evicted entries are spilled to, None keeps entries in RAM only."""
+        with self._lock:
+            self._cache_dir = cache_dir
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _disk_path(self, key: Hashable) -> Optional[str]:
+        if self._cache_dir is None:
+            return None
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self._cache_dir, f"{digest}.pt")
+
+    def _load_from_disk(self, key: Hashable) -> Any:
+        path = self._disk_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            return torch.load(path, map_location="cpu", weights_only=True)
+        except Exception:
+            return None
+
+    def _save_to_disk(self, key: Hashable, value: Any) -> None:
+        path = self._disk_path(key)
+        if path is None or os.path.exists(path):
+            return
+        os.makedirs(self._cache_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        torch.save(value, tmp_path)
+        os.replace(tmp_path, path)
+
+
+# Shared by the SD1, SDXL and Flux conditioning nodes.
+conditioning_cache = ConditioningCache()
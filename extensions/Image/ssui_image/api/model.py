@@ -4,27 +4,33 @@ from backend.model_manager.load.load_base import ModelLoaderConfig
 from backend.model_manager.probe import ModelProbe
 from backend.util.devices import TorchDevice
 
-from typing import Callable, List, Optional, Tuple
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from enum import Enum
 from pathlib import Path
 from typing import Callable, Optional
 
-from safetensors.torch import load_file as safetensors_load_file
-from torch import load as torch_load
-
 from backend.model_manager import AnyModel, AnyModelConfig, SubModelType
 from backend.model_manager.load import (
     LoadedModel,
     LoadedModelWithoutConfig,
     ModelLoaderRegistry,
 )
+from backend.model_manager.load.model_cache.cache_stats import CacheStats
 from backend.model_manager.load.model_cache.model_cache import ModelCache
+from backend.model_hash.model_hash import model_fingerprint
+from backend.model_manager.util.model_util import load_state_dict
+from backend.patches.lora_delta_cache import lora_delta_cache
+from backend.quantization.gguf.ggml_tensor import dequantized_tensor_cache
 from backend.model_manager.load.model_loaders.generic_diffusers import (
     GenericDiffusersLoader,
 )
 from backend.util.devices import TorchDevice
 from backend.util.freeu import FreeUConfig
 
+from .embedding_cache import conditioning_cache
+
 
 class BaseModelType(str, Enum):
     """Base model type."""
@@ -75,18 +81,69 @@ class SubModelType(str, Enum):
     SafetyChecker = "safety_checker"
 
 
-def load_model_from_path(
-    model_path: Path, loader: Optional[Callable[[Path], AnyModel]] = None
-) -> LoadedModelWithoutConfig:
+class ModelCacheSettings(BaseModel):
+    """The model cache fields of the SSUI settings file. Other fields in the file are ignored."""
+
+    enable_partial_loading: bool = True
+    device_working_mem_gb: float = 3
+    max_ram_cache_gb: Optional[float] = None
+    max_vram_cache_gb: Optional[float] = None
+    pinned_memory_gb: float = 0
+    gguf_dequant_cache_gb: float = 0
+    lora_delta_cache_gb: float = 0
+    conditioning_cache_dir: Optional[str] = None
+
+
+def load_settings() -> ModelCacheSettings:
+    """Read the model cache settings from the file named by SSUI_SETTINGS_PATH.
+
+    The server sets the variable for the executors it starts. Without it, or before the file is first written, the
+    defaults are used.
+    """
+    settings_path = os.environ.get("SSUI_SETTINGS_PATH")
+    if not settings_path or not os.path.exists(settings_path):
+        return ModelCacheSettings()
+    with open(settings_path, "r", encoding="utf-8") as f:
+        return ModelCacheSettings.model_validate_json(f.read())
+
+
+def create_model_cache(settings: Optional[ModelCacheSettings] = None) -> ModelCache:
+    """Create a ModelCache with the partial loading switch and memory budgets from the settings.
+
+    With partial loading enabled, models that do not fit in the VRAM budget are streamed layer by layer instead of
+    failing to load, so Flux and SDXL can run on cards smaller than the model.
+    """
+    settings = settings or load_settings()
+    # Dequantized GGUF weights and fused LoRA deltas live in the execution device working memory without being tracked
+    # by the model cache, so their budgets are taken out of the working memory it reserves for activations.
+    working_mem_gb = settings.device_working_mem_gb - settings.gguf_dequant_cache_gb - settings.lora_delta_cache_gb
+    if working_mem_gb <= 0:
+        raise ValueError(
+            f"gguf_dequant_cache_gb ({settings.gguf_dequant_cache_gb}) + lora_delta_cache_gb "
+            f"({settings.lora_delta_cache_gb}) must be less than device_working_mem_gb ({settings.device_working_mem_gb})"
+        )
     ram_cache = ModelCache(
-        execution_device_working_mem_gb=3,
-        enable_partial_loading=False,
+        execution_device_working_mem_gb=working_mem_gb,
+        enable_partial_loading=settings.enable_partial_loading,
         keep_ram_copy_of_weights=True,
-        max_ram_cache_size_gb=None,
-        max_vram_cache_size_gb=None,
+        max_ram_cache_size_gb=settings.max_ram_cache_gb,
+        max_vram_cache_size_gb=settings.max_vram_cache_gb,
         execution_device=TorchDevice.choose_torch_device(),
         logger=None,
+        pinned_memory_gb=settings.pinned_memory_gb,
     )
+    ram_cache.stats = CacheStats()
+    dequantized_tensor_cache.set_max_bytes(int(settings.gguf_dequant_cache_gb * 2**30))
+    lora_delta_cache.set_max_bytes(int(settings.lora_delta_cache_gb * 2**30))
+    # Prompt embeddings evicted from RAM are kept on disk, so repeated prompts skip text encoding across restarts.
+    conditioning_cache.set_cache_dir(settings.conditioning_cache_dir)
+    return ram_cache
+
+
+def load_model_from_path(
+    model_path: Path, loader: Optional[Callable[[Path], AnyModel]] = None
+) -> LoadedModelWithoutConfig:
+    ram_cache = getModelLoader().ram_cache
 
     cache_key = str(model_path)
     try:
@@ -96,9 +153,9 @@ def load_model_from_path(
     except IndexError:
         pass
 
-    def torch_load_file(checkpoint: Path) -> AnyModel:
-        result = torch_load(checkpoint, map_location="cpu")
-        return result
+    def checkpoint_load_file(checkpoint: Path) -> AnyModel:
+        # Memory-mapped, so executors loading the same file share its pages.
+        return load_state_dict(checkpoint, mmap=True)
 
     def diffusers_load_directory(directory: Path) -> AnyModel:
         load_class = GenericDiffusersLoader(
@@ -111,13 +168,7 @@ def load_model_from_path(
         )
 
     loader = loader or (
-        diffusers_load_directory
-        if model_path.is_dir()
-        else (
-            torch_load_file
-            if model_path.suffix.endswith((".ckpt", ".pt", ".pth", ".bin"))
-            else lambda path: safetensors_load_file(path, device="cpu")
-        )
+        diffusers_load_directory if model_path.is_dir() else checkpoint_load_file
     )
     assert loader is not None
     raw_model = loader(model_path)
@@ -128,17 +179,58 @@ def load_model_from_path(
 
 
 class ModelLoaderService:
-    def __init__(self):
+    def __init__(self, ram_cache: Optional[ModelCache] = None):
         self._app_config = ModelLoaderConfig()
-        self._ram_cache = ModelCache(
-            execution_device_working_mem_gb=3,
-            enable_partial_loading=False,
-            keep_ram_copy_of_weights=True,
-            max_ram_cache_size_gb=None,
-            max_vram_cache_size_gb=None,
-            execution_device=TorchDevice.choose_torch_device(),
-            logger=None,
-        )
+        self._ram_cache = ram_cache or create_model_cache()
+        # model fingerprint (path + size + mtime) -> probed config
+        self._probed_configs: Dict[str, AnyModelConfig] = {}
+        # (loader function, model fingerprints) -> the api models it returned
+        self._resident_models: Dict[Tuple[str, ...], Tuple[BaseModel, ...]] = {}
+        self._resident_lock = threading.Lock()
+
+    @property
+    def ram_cache(self) -> ModelCache:
+        return self._ram_cache
+
+    @property
+    def stats(self) -> CacheStats:
+        """Hit/miss statistics of the RAM cache shared by every model loaded through this service."""
+        return self._ram_cache.stats
+
+    def probe(self, model_path: Path) -> AnyModelConfig:
+        """Probe the model at model_path, reusing the previous result while the file is unchanged.
+
+        Because the probed key is content-addressed, the returned config always maps onto the same cache records.
+        """
+        fingerprint = model_fingerprint(model_path)
+        model_config = self._probed_configs.get(fingerprint)
+        if model_config is None:
+            model_config = ModelProbe.probe(Path(model_path))
+            self._probed_configs[fingerprint] = model_config
+        return model_config
+
+    def load_resident(self, load_fn: Callable[..., Tuple[BaseModel, ...]], *model_paths: Any) -> Tuple[BaseModel, ...]:
+        """Call load_fn(self, *model_paths) once and keep its result resident between tasks.
+
+        The result is reused while the model files are unchanged and all of their submodels are still in the RAM
+        cache. Shallow copies are returned, so per-task changes such as assigning `loras` do not leak into later tasks.
+        """
+        key = (load_fn.__name__,) + tuple(model_fingerprint(Path(p)) for p in model_paths)
+        with self._resident_lock:
+            models = self._resident_models.get(key)
+            if models is None or not self._is_resident(models):
+                models = load_fn(self, *model_paths)
+                self._resident_models[key] = models
+        return tuple(model.model_copy() for model in models)
+
+    def _is_resident(self, models: Tuple[BaseModel, ...]) -> bool:
+        for model in models:
+            for value in vars(model).values():
+                if not isinstance(value, LoadedModelWithoutConfig):
+                    continue
+                if self._ram_cache._cached_models.get(value._cache_record.key) is not value._cache_record:
+                    return False
+        return True
 
     def load_model(
         self, model_config: AnyModelConfig, submodel_type: Optional[SubModelType] = None
@@ -154,6 +246,19 @@ class ModelLoaderService:
         return loaded_model
 
 
+_loader_instance: Optional[ModelLoaderService] = None
+_loader_lock = threading.Lock()
+
+
+def getModelLoader() -> ModelLoaderService:
+    """The ModelLoaderService shared by SD1, SDXL and Flux, so they draw from one cache and one memory budget."""
+    global _loader_instance
+    with _loader_lock:
+        if _loader_instance is None:
+            _loader_instance = ModelLoaderService()
+        return _loader_instance
+
+
 class LoRAModel(BaseModel):
     lora: "LoadedModel" = Field(description="The lora model", validate=False)
     weight: float = Field(default=1, description="Weight to apply to lora model")
@@ -213,7 +318,7 @@ def _load_model_service(
 def load_model(
     model_loader_service: ModelLoaderService, model_path: Path
 ) -> Tuple[UNetModel, ClipModel, VAEModel]:
-    model_config = ModelProbe.probe(Path(model_path))
+    model_config = model_loader_service.probe(Path(model_path))
     unet = _load_model_service(model_loader_service, model_config, SubModelType.UNet)
     scheduler = _load_model_service(
         model_loader_service, model_config, SubModelType.Scheduler
@@ -235,7 +340,7 @@ def load_model(
 def load_sdxl_model(
     model_loader_service: ModelLoaderService, model_path: Path
 ) -> Tuple[UNetModel, ClipModel, VAEModel]:
-    model_config = ModelProbe.probe(Path(model_path))
+    model_config = model_loader_service.probe(Path(model_path))
     unet = _load_model_service(model_loader_service, model_config, SubModelType.UNet)
     scheduler = _load_model_service(
         model_loader_service, model_config, SubModelType.Scheduler
@@ -264,7 +369,7 @@ def load_sdxl_model(
 def load_sdxl_refiner_model(
     model_loader_service: ModelLoaderService, model_path: Path
 ) -> Tuple[UNetModel, ClipModel, VAEModel]:
-    model_config = ModelProbe.probe(Path(model_path))
+    model_config = model_loader_service.probe(Path(model_path))
     unet = _load_model_service(model_loader_service, model_config, SubModelType.UNet)
     scheduler = _load_model_service(
         model_loader_service, model_config, SubModelType.Scheduler
@@ -308,10 +413,10 @@ def load_flux_model(
     clip_path: Path,
     vae_path: Path,
 ) -> Tuple[LoadedModel, LoadedModel, LoadedModel, LoadedModel]:
-    model_config = ModelProbe.probe(Path(model_path))
-    t5_config = ModelProbe.probe(Path(t5_encoder_path))
-    clip_config = ModelProbe.probe(Path(clip_path))
-    vae_config = ModelProbe.probe(Path(vae_path))
+    model_config = model_loader_service.probe(Path(model_path))
+    t5_config = model_loader_service.probe(Path(t5_encoder_path))
+    clip_config = model_loader_service.probe(Path(clip_path))
+    vae_config = model_loader_service.probe(Path(vae_path))
 
     transformer = _load_model_service(
         model_loader_service, model_config, SubModelType.Transformer
@@ -394,7 +499,7 @@ def load_lora(
         lora_weight = 1.0   
 
     # Probe LoRA model configuration
-    lora_config = ModelProbe.probe(Path(lora_path))
+    lora_config = model_loader_service.probe(Path(lora_path))
     # Load LoRA model
     lora = _load_model_service(model_loader_service, lora_config, None)
     
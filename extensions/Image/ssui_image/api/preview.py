@@ -0,0 +1,80 @@
+from typing import Callable, List
+
+import PIL.Image
+import torch
+
+from backend.flux.sampling_utils import unpack
+from backend.model_manager.config import BaseModelType
+from backend.stable_diffusion.extensions.preview import PipelineIntermediateState
+from ssui.progress import check_canceled, report_progress
+
+# Linear projections from latent channels to approximate RGB, so previews never need a VAE pass.
+SD1_5_LATENT_RGB_FACTORS = [
+    [0.3444, 0.1385, 0.0670],
+    [0.1247, 0.4027, 0.1494],
+    [-0.3192, 0.2513, 0.2103],
+    [-0.1307, -0.1874, -0.7445],
+]
+
+SDXL_LATENT_RGB_FACTORS = [
+    [0.3816, 0.4930, 0.5320],
+    [-0.3753, 0.1631, 0.1739],
+    [0.1770, 0.3588, -0.2048],
+    [-0.4350, -0.2644, -0.4289],
+]
+
+FLUX_LATENT_RGB_FACTORS = [
+    [-0.0412, 0.0149, 0.0521],
+    [0.0056, 0.0291, 0.0768],
+    [0.0342, -0.0681, -0.0427],
+    [-0.0258, 0.0092, 0.0463],
+    [0.0863, 0.0784, 0.0547],
+    [-0.0017, 0.0402, 0.0158],
+    [0.0501, 0.1058, 0.1152],
+    [-0.0209, -0.0218, -0.0329],
+    [-0.0314, 0.0083, 0.0896],
+    [0.0851, 0.0665, -0.0472],
+    [-0.0534, 0.0238, -0.0024],
+    [0.0452, -0.0026, 0.0048],
+    [0.0892, 0.0831, 0.0881],
+    [-0.1117, -0.0304, -0.0789],
+    [0.0027, -0.0479, -0.0043],
+    [-0.1146, -0.0827, -0.0598],
+]
+
+
+def latents_to_preview(latents: torch.Tensor, latent_rgb_factors: List[List[float]]) -> PIL.Image.Image:
+    """Approximate the first sample of a latent batch as a low resolution RGB image."""
+    sample = latents[0].detach().float()
+    factors = torch.tensor(latent_rgb_factors, dtype=sample.dtype, device=sample.device)
+    latent_image = sample.permute(1, 2, 0) @ factors
+    latents_ubyte = ((latent_image + 1) / 2).clamp(0, 1).mul(0xFF).byte().cpu()
+    return PIL.Image.fromarray(latents_ubyte.numpy())
+
+
+def sd_step_callback(base: BaseModelType) -> Callable[[PipelineIntermediateState], None]:
+    """Build a PreviewExt callback that reports SD1/SDXL denoise progress."""
+    factors = SDXL_LATENT_RGB_FACTORS if base == BaseModelType.StableDiffusionXL else SD1_5_LATENT_RGB_FACTORS
+
+    def callback(state: PipelineIntermediateState) -> None:
+        # The initial preview carries no prediction; step previews are 0-based.
+        step = 0 if state.predicted_original is None else state.step + 1
+        latents = state.predicted_original if state.predicted_original is not None else state.latents
+        report_progress(step, state.total_steps, lambda: latents_to_preview(latents, factors))
+
+    return callback
+
+
+def flux_step_callback(height: int, width: int) -> Callable[[PipelineIntermediateState], None]:
+    """Build a step_callback for flux denoise, unpacking the packed latents before projecting them."""
+
+    def callback(state: PipelineIntermediateState) -> None:
+        # The flux loop has no extension manager, so the per-step callback is its cancellation point.
+        check_canceled()
+        report_progress(
+            state.step,
+            state.total_steps,
+            lambda: latents_to_preview(unpack(state.latents.float(), height, width), FLUX_LATENT_RGB_FACTORS),
+        )
+
+    return callback
@@ -0,0 +1,279 @@
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import torch
+from torch.nn import functional as F
+
+from cosyvoice.cli.model import CosyVoice2Model
+from cosyvoice.utils.file_utils import logging
+
+
+class _Sequence:
+    """Decode state of one request."""
+
+    def __init__(self, model_input: Dict[str, torch.Tensor], speed: float, future: Future):
+        self.model_input = model_input
+        self.speed = speed
+        self.future = future
+        self.lm_input: Optional[torch.Tensor] = None
+        self.out_tokens: List[int] = []
+        self.step = 0
+        self.min_len = 0
+        self.max_len = 0
+        # set once the sequence is handed to the flow thread, which then owns the future
+        self.queued = False
+
+
+class _KVBatch:
+    """Left padded kv cache of the sequences decoded together.
+
+    Every row of `valid` marks the cache positions that belong to that sequence, `positions` holds the position id of
+    the next token of each sequence, so padding doesn't shift the rotary embedding.
+    """
+
+    def __init__(self):
+        self.cache = None
+        self.valid: Optional[torch.Tensor] = None
+        self.positions: Optional[torch.Tensor] = None
+
+    def add(self, cache, length: int):
+        device = cache[0][0].device
+        valid = torch.ones(1, length, dtype=torch.bool, device=device)
+        position = torch.tensor([length], dtype=torch.long, device=device)
+        if self.cache is None:
+            self.cache, self.valid, self.positions = cache, valid, position
+            return
+        width = max(self.valid.shape[1], length)
+        old, new = self._pad(self.cache, self.valid, width), self._pad(cache, valid, width)
+        self.cache = tuple((torch.concat([k0, k1], dim=0), torch.concat([v0, v1], dim=0))
+                           for (k0, v0), (k1, v1) in zip(old[0], new[0]))
+        self.valid = torch.concat([old[1], new[1]], dim=0)
+        self.positions = torch.concat([self.positions, position], dim=0)
+
+    @staticmethod
+    def _pad(cache, valid, width):
+        pad = width - valid.shape[1]
+        if pad == 0:
+            return cache, valid
+        cache = tuple((F.pad(k, (0, 0, pad, 0)), F.pad(v, (0, 0, pad, 0))) for k, v in cache)
+        return cache, F.pad(valid, (pad, 0), value=False)
+
+    def step_inputs(self):
+        attention_mask = F.pad(self.valid, (0, 1), value=True).long()
+        return attention_mask, self.positions.unsqueeze(dim=1)
+
+    def update(self, cache, attention_mask):
+        self.cache = cache
+        self.valid = attention_mask.bool()
+        self.positions = self.positions + 1
+
+    def keep(self, rows: List[int]):
+        if len(rows) == 0:
+            self.cache = self.valid = self.positions = None
+            return
+        index = torch.tensor(rows, dtype=torch.long, device=self.valid.device)
+        valid = self.valid.index_select(0, index)
+        # drop the leading columns that are padding in every remaining row
+        lead = int((~valid).all(dim=0).long().cumprod(dim=0).sum())
+        self.cache = tuple((k.index_select(0, index)[:, :, lead:], v.index_select(0, index)[:, :, lead:]) for k, v in self.cache)
+        self.valid = valid[:, lead:]
+        self.positions = self.positions.index_select(0, index)
+
+
+def _as_legacy_cache(cache):
+    return cache.to_legacy_cache() if hasattr(cache, 'to_legacy_cache') else cache
+
+
+class BatchTTSEngine:
+    """Continuous batching inference for CosyVoice2.
+
+    Requests wait in a queue and join the running batch between decode steps, so one llm forward produces the next
+    speech token of every active request. A request leaves the batch as soon as it samples eos or reaches its max
+    length. Finished token sequences are turned into speech by a second thread, which runs the flow matching decoder
+    on all waiting requests in one padded batch, then hift on each of them.
+
+    Only non-streaming synthesis of already split text is supported; streaming and bistream inputs still go through
+    `CosyVoice2Model.tts`.
+    """
+
+    def __init__(self, model: CosyVoice2Model, max_batch_size: int = 16, max_flow_batch_size: int = 8, sampling: int = 25):
+        assert isinstance(model, CosyVoice2Model), 'BatchTTSEngine is only implemented for CosyVoice2!'
+        self.model = model
+        self.max_batch_size = max_batch_size
+        # the trt estimator is built for a fixed batch of one utterance
+        self.max_flow_batch_size = max_flow_batch_size if isinstance(model.flow.decoder.estimator, torch.nn.Module) else 1
+        self.sampling = sampling
+        self.requests: "queue.Queue[_Sequence]" = queue.Queue()
+        self.flow_requests: "queue.Queue[_Sequence]" = queue.Queue()
+        self.active: List[_Sequence] = []
+        self.kv = _KVBatch()
+        self.is_running = True
+        self._llm_thread = threading.Thread(target=self._llm_loop, name='tts-llm', daemon=True)
+        self._flow_thread = threading.Thread(target=self._flow_loop, name='tts-flow', daemon=True)
+        self._llm_thread.start()
+        self._flow_thread.start()
+
+    def submit(self, model_input: Dict[str, torch.Tensor], speed: float = 1.0) -> Future:
+        """Queue one frontend output, the future resolves to the (1, T) speech tensor on cpu."""
+        future = Future()
+        self.requests.put(_Sequence(model_input, speed, future))
+        return future
+
+    def stats(self) -> Dict[str, int]:
+        return {'waiting': self.requests.qsize(), 'decoding': len(self.active), 'vocoding': self.flow_requests.qsize()}
+
+    def shutdown(self):
+        self.is_running = False
+        self._llm_thread.join()
+        self._flow_thread.join()
+
+    def _llm_loop(self):
+        with self.model.llm_context, torch.cuda.amp.autocast(self.model.fp16), torch.inference_mode():
+            while self.is_running:
+                self._admit()
+                if len(self.active) != 0:
+                    self._decode_or_fail()
+
+    def _decode_or_fail(self):
+        """Run one decode step, on error fail the sequences that are still decoding and reset the batch."""
+        try:
+            self._decode_step()
+        except Exception as e:
+            logging.exception('batched llm decode failed')
+            for seq in self.active:
+                # sequences that finished earlier in the same step are already queued for the flow thread
+                if not seq.queued and not seq.future.done():
+                    seq.future.set_exception(e)
+            self.active = []
+            self.kv = _KVBatch()
+
+    def _admit(self):
+        while len(self.active) < self.max_batch_size:
+            try:
+                # block only while there is nothing to decode
+                seq = self.requests.get(timeout=0.1) if len(self.active) == 0 else self.requests.get_nowait()
+            except queue.Empty:
+                return
+            if not seq.future.set_running_or_notify_cancel():
+                continue
+            try:
+                self._prefill(seq)
+            except Exception as e:
+                logging.exception('llm prefill failed')
+                if not seq.queued and not seq.future.done():
+                    seq.future.set_exception(e)
+
+    def _prefill(self, seq: _Sequence):
+        model_input, device, llm = seq.model_input, self.model.device, self.model.llm
+        source_speech_token = model_input.get('source_speech_token', torch.zeros(1, 0, dtype=torch.int32))
+        if source_speech_token.shape[1] != 0:
+            seq.out_tokens = source_speech_token.flatten().tolist()
+            self._to_flow(seq)
+            return
+
+        text = model_input['text'].to(device)
+        prompt_text = model_input.get('prompt_text', torch.zeros(1, 0, dtype=torch.int32)).to(device)
+        prompt_speech_token = model_input.get('llm_prompt_speech_token', torch.zeros(1, 0, dtype=torch.int32)).to(device)
+        lm_input, seq.min_len, seq.max_len = llm.prepare_inference_input(
+            text=text,
+            text_len=torch.tensor([text.shape[1]], dtype=torch.int32).to(device),
+            prompt_text=prompt_text,
+            prompt_text_len=torch.tensor([prompt_text.shape[1]], dtype=torch.int32).to(device),
+            prompt_speech_token=prompt_speech_token,
+            prompt_speech_token_len=torch.tensor([prompt_speech_token.shape[1]], dtype=torch.int32).to(device))
+        if seq.max_len <= 0:
+            self._to_flow(seq)
+            return
+        y_pred, cache = llm.llm.forward_one_step(lm_input,
+                                                 masks=torch.tril(torch.ones((1, lm_input.shape[1], lm_input.shape[1]), device=device)).to(torch.bool),
+                                                 cache=None)
+        seq.lm_input = lm_input
+        logp = llm.llm_decoder(y_pred[:, -1]).log_softmax(dim=-1)
+        if self._sample(seq, logp[0]):
+            # extend the kv batch first, so a failure never leaves a sequence without its cache row
+            self.kv.add(_as_legacy_cache(cache), lm_input.shape[1])
+            self.active.append(seq)
+
+    def _decode_step(self):
+        llm = self.model.llm
+        xs = torch.concat([seq.lm_input for seq in self.active], dim=0)
+        attention_mask, position_ids = self.kv.step_inputs()
+        y_pred, cache = llm.llm.forward_batch_step(xs, attention_mask, position_ids, self.kv.cache)
+        self.kv.update(cache, attention_mask)
+        logp = llm.llm_decoder(y_pred[:, -1]).log_softmax(dim=-1)
+        keep = [i for i, seq in enumerate(self.active) if self._sample(seq, logp[i])]
+        if len(keep) != len(self.active):
+            self.active = [self.active[i] for i in keep]
+            self.kv.keep(keep)
+
+    def _sample(self, seq: _Sequence, logp: torch.Tensor) -> bool:
+        """Sample the next token of `seq` the same way as Qwen2LM.inference, return False when it is finished."""
+        llm = self.model.llm
+        # Qwen2LM.inference skips special tokens and feeds the same input again, which only works without a
+        # kv batch: right after prefill lm_input is still the whole prompt. Never sample them instead.
+        if logp.shape[-1] > llm.speech_token_size + 1:
+            logp = logp.clone()
+            logp[llm.speech_token_size + 1:] = -float('inf')
+        top_ids = llm.sampling_ids(logp, seq.out_tokens, self.sampling, ignore_eos=True if seq.step < seq.min_len else False).item()
+        seq.step += 1
+        if top_ids == llm.speech_token_size:
+            self._to_flow(seq)
+            return False
+        seq.out_tokens.append(top_ids)
+        seq.lm_input = llm.speech_embedding.weight[top_ids].reshape(1, 1, -1)
+        if seq.step >= seq.max_len:
+            self._to_flow(seq)
+            return False
+        return True
+
+    def _to_flow(self, seq: _Sequence):
+        seq.queued = True
+        self.flow_requests.put(seq)
+
+    def _flow_loop(self):
+        while self.is_running:
+            try:
+                batch = [self.flow_requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.max_flow_batch_size:
+                try:
+                    batch.append(self.flow_requests.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                speeches = self._token2wav(batch)
+            except Exception as e:
+                logging.exception('batched token2wav failed')
+                for seq in batch:
+                    if not seq.future.done():
+                        seq.future.set_exception(e)
+                continue
+            for seq, speech in zip(batch, speeches):
+                if not seq.future.done():
+                    seq.future.set_result(speech)
+
+    @torch.inference_mode()
+    def _token2wav(self, batch: List[_Sequence]) -> List[torch.Tensor]:
+        device = self.model.device
+        inputs = [seq.model_input for seq in batch]
+        trt_context = self.model.trt_context_pool.get()
+        try:
+            with torch.cuda.amp.autocast(self.model.fp16), trt_context:
+                mels = self.model.flow.inference_batch(
+                    tokens=[torch.tensor(seq.out_tokens, dtype=torch.int32).unsqueeze(dim=0).to(device) for seq in batch],
+                    prompt_tokens=[i.get('flow_prompt_speech_token', torch.zeros(1, 0, dtype=torch.int32)).to(device) for i in inputs],
+                    prompt_feats=[i.get('prompt_speech_feat', torch.zeros(1, 0, 80)).to(device) for i in inputs],
+                    embeddings=[i['flow_embedding'].to(device) for i in inputs])
+        finally:
+            self.model.trt_context_pool.put(trt_context)
+
+        speeches = []
+        for seq, tts_mel in zip(batch, mels):
+            if seq.speed != 1.0:
+                tts_mel = F.interpolate(tts_mel, size=int(tts_mel.shape[2] / seq.speed), mode='linear')
+            tts_speech, _ = self.model.hift.inference(speech_feat=tts_mel, cache_source=torch.zeros(1, 1, 0))
+            speeches.append(tts_speech.cpu())
+        return speeches
@@ -13,10 +13,11 @@
 # limitations under the License.
 import logging
 import random
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 import torch
 import torch.nn as nn
 from torch.nn import functional as F
+from torch.nn.utils.rnn import pad_sequence
 from omegaconf import DictConfig
 from cosyvoice.utils.mask import make_pad_mask
 
@@ -277,3 +278,46 @@ class CausalMaskedDiffWithXvec(torch.nn.Module):
         feat = feat[:, :, mel_len1:]
         assert feat.shape[2] == mel_len2
         return feat.float(), None
+
+    @torch.inference_mode()
+    def inference_batch(self,
+                        tokens: List[torch.Tensor],
+                        prompt_tokens: List[torch.Tensor],
+                        prompt_feats: List[torch.Tensor],
+                        embeddings: List[torch.Tensor]) -> List[torch.Tensor]:
+        """Non-streaming (finalize) inference of several utterances in one padded batch.
+
+        Every argument holds one (1, ...) tensor per utterance, returns one (1, 80, T) mel per utterance.
+        """
+        device = embeddings[0].device
+        # xvec projection
+        embedding = F.normalize(torch.concat(embeddings, dim=0), dim=1)
+        embedding = self.spk_embed_affine_layer(embedding)
+
+        # concat text and prompt_text of every utterance, then pad to the longest one
+        token = [torch.concat([p, t], dim=1).squeeze(dim=0) for p, t in zip(prompt_tokens, tokens)]
+        token_len = torch.tensor([t.shape[0] for t in token], dtype=torch.int32, device=device)
+        token = pad_sequence(token, batch_first=True, padding_value=0)
+        mask = (~make_pad_mask(token_len)).unsqueeze(-1).to(embedding)
+        token = self.input_embedding(torch.clamp(token, min=0)) * mask
+
+        # text encode
+        h, h_masks = self.encoder(token, token_len)
+        h_lengths = h_masks.sum(dim=-1).squeeze(dim=1)
+        h = self.encoder_proj(h)
+
+        # get conditions
+        conds = torch.zeros([h.shape[0], h.shape[1], self.output_size], device=device).to(h.dtype)
+        for i, prompt_feat in enumerate(prompt_feats):
+            conds[i, :prompt_feat.shape[1]] = prompt_feat[0]
+        conds = conds.transpose(1, 2)
+
+        mask = (~make_pad_mask(h_lengths, h.shape[1])).to(h)
+        feat, _ = self.decoder(
+            mu=h.transpose(1, 2).contiguous(),
+            mask=mask.unsqueeze(1),
+            spks=embedding,
+            cond=conds,
+            n_timesteps=10,
+        )
+        return [feat[i:i + 1, :, prompt_feat.shape[1]:int(h_lengths[i])].float() for i, prompt_feat in enumerate(prompt_feats)]
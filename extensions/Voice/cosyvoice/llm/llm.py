@@ -16,7 +16,7 @@ from typing import Dict, Optional, Callable, List, Generator
 import torch
 from torch import nn
 import torch.nn.functional as F
-from transformers import Qwen2ForCausalLM
+from transformers import DynamicCache, Qwen2ForCausalLM
 from torch.nn.utils.rnn import pad_sequence, unpad_sequence
 from cosyvoice.utils.common import IGNORE_ID
 from cosyvoice.transformer.label_smoothing_loss import LabelSmoothingLoss
@@ -253,6 +253,29 @@ class Qwen2Encoder(torch.nn.Module):
         new_cache = outs.past_key_values
         return xs, new_cache
 
+    def forward_batch_step(self, xs, attention_mask, position_ids, cache):
+        """Decode one step for a batch of sequences sharing a left padded kv cache.
+
+        Args:
+            xs: (B, 1, D) input embedding of each sequence
+            attention_mask: (B, T + 1) 1 for valid cache positions and the new token, 0 for left padding
+            position_ids: (B, 1) position of the new token in each sequence, padding excluded
+            cache: per layer (key, value) tuples of shape (B, H, T, D_h)
+        """
+        outs = self.model(
+            inputs_embeds=xs,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            output_hidden_states=True,
+            return_dict=True,
+            use_cache=True,
+            past_key_values=DynamicCache.from_legacy_cache(cache),
+        )
+        new_cache = outs.past_key_values
+        if isinstance(new_cache, DynamicCache):
+            new_cache = new_cache.to_legacy_cache()
+        return outs.hidden_states[-1], new_cache
+
 
 class Qwen2LM(TransformerLM):
     def __init__(
@@ -369,8 +392,7 @@ class Qwen2LM(TransformerLM):
         acc = th_accuracy(logits.view(-1, self.speech_token_size + 3), lm_target, ignore_label=IGNORE_ID)
         return {'loss': loss, 'acc': acc}
 
-    @torch.inference_mode()
-    def inference(
+    def prepare_inference_input(
             self,
             text: torch.Tensor,
             text_len: torch.Tensor,
@@ -378,14 +400,13 @@ class Qwen2LM(TransformerLM):
             prompt_text_len: torch.Tensor,
             prompt_speech_token: torch.Tensor,
             prompt_speech_token_len: torch.Tensor,
-            embedding: torch.Tensor,
-            sampling: int = 25,
             max_token_text_ratio: float = 20,
             min_token_text_ratio: float = 2,
-    ) -> Generator[torch.Tensor, None, None]:
+    ):
+        """Build the prefill input of one sequence, return (lm_input, min_len, max_len)."""
         device = text.device
         text = torch.concat([prompt_text, text], dim=1)
-        text_len += prompt_text_len
+        text_len = text_len + prompt_text_len
         text = self.llm.model.model.embed_tokens(text)
 
         # 3. concat llm_input
@@ -400,6 +421,25 @@ class Qwen2LM(TransformerLM):
         # 4. cal min/max_length
         min_len = int((text_len - prompt_text_len) * min_token_text_ratio)
         max_len = int((text_len - prompt_text_len) * max_token_text_ratio)
+        return lm_input, min_len, max_len
+
+    @torch.inference_mode()
+    def inference(
+            self,
+            text: torch.Tensor,
+            text_len: torch.Tensor,
+            prompt_text: torch.Tensor,
+            prompt_text_len: torch.Tensor,
+            prompt_speech_token: torch.Tensor,
+            prompt_speech_token_len: torch.Tensor,
+            embedding: torch.Tensor,
+            sampling: int = 25,
+            max_token_text_ratio: float = 20,
+            min_token_text_ratio: float = 2,
+    ) -> Generator[torch.Tensor, None, None]:
+        lm_input, min_len, max_len = self.prepare_inference_input(text, text_len, prompt_text, prompt_text_len,
+                                                                  prompt_speech_token, prompt_speech_token_len,
+                                                                  max_token_text_ratio, min_token_text_ratio)
 
         # 5. step by step decode
         out_tokens = []
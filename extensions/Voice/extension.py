@@ -0,0 +1,121 @@
+import asyncio
+import io
+import os
+import threading
+
+from fastapi import APIRouter, File, Form, HTTPException, Response, UploadFile
+from pydantic import BaseModel
+
+app = APIRouter()
+
+# 默认的语音模型，可以是本地目录或modelscope上的模型ID。
+# CosyVoice2没有内置说话人，需要先通过POST /speakers用一段提示音频注册，注册的说话人保存在模型目录的spk2info.pt中，启动时自动加载
+MODEL_DIR = os.environ.get("SSUI_COSYVOICE_MODEL", "iic/CosyVoice2-0.5B")
+# 同时解码的最大请求数，以及一次流匹配解码的最大请求数
+MAX_BATCH_SIZE = int(os.environ.get("SSUI_TTS_BATCH_SIZE", "16"))
+MAX_FLOW_BATCH_SIZE = int(os.environ.get("SSUI_TTS_FLOW_BATCH_SIZE", "8"))
+
+_voice = None
+_engine = None
+_load_lock = threading.Lock()
+
+
+def get_engine():
+    """第一次请求时加载模型并启动批处理引擎，之后的请求共用"""
+    global _voice, _engine
+    with _load_lock:
+        if _engine is None:
+            from cosyvoice.cli.batch_engine import BatchTTSEngine
+            from cosyvoice.cli.cosyvoice import CosyVoice2
+
+            _voice = CosyVoice2(MODEL_DIR, load_jit=False, load_trt=False, fp16=False)
+            _engine = BatchTTSEngine(_voice.model, max_batch_size=MAX_BATCH_SIZE, max_flow_batch_size=MAX_FLOW_BATCH_SIZE)
+        return _voice, _engine
+
+
+class TTSRequest(BaseModel):
+    text: str
+    spk_id: str
+    speed: float = 1.0
+    text_frontend: bool = True
+
+
+def build_inputs(voice, request: TTSRequest):
+    """把文本切分成句子，每句生成一个模型输入"""
+    frontend = voice.frontend
+    # 通过add_zero_shot_spk保存的说话人带有提示音频，按zero-shot方式合成
+    zero_shot = "llm_prompt_speech_token" in frontend.spk2info[request.spk_id]
+    inputs = []
+    for text in frontend.text_normalize(request.text, split=True, text_frontend=request.text_frontend):
+        if zero_shot:
+            inputs.append(frontend.frontend_zero_shot(text, "", None, voice.sample_rate, request.spk_id))
+        else:
+            inputs.append(frontend.frontend_sft(text, request.spk_id))
+    return inputs
+
+
+def encode_wav(speeches, sample_rate: int) -> bytes:
+    """按顺序拼接各句的语音并编码为wav"""
+    import torch
+    import torchaudio
+
+    buffer = io.BytesIO()
+    torchaudio.save(buffer, torch.concat(speeches, dim=1), sample_rate, format="wav")
+    return buffer.getvalue()
+
+
+@app.get("/speakers")
+async def speakers():
+    voice, _ = await asyncio.to_thread(get_engine)
+    return voice.list_available_spks()
+
+
+def register_speaker(spk_id: str, prompt_text: str, prompt_wav: bytes):
+    """用提示音频和它的文本注册zero-shot说话人，并保存到模型目录"""
+    from cosyvoice.utils.file_utils import load_wav
+
+    voice, _ = get_engine()
+    prompt_speech_16k = load_wav(io.BytesIO(prompt_wav), 16000)
+    voice.add_zero_shot_spk(prompt_text, prompt_speech_16k, spk_id)
+    voice.save_spkinfo()
+
+
+@app.post("/speakers")
+async def add_speaker(
+    spk_id: str = Form(...),
+    prompt_text: str = Form(...),
+    prompt_wav: UploadFile = File(...),
+):
+    """注册说话人，prompt_wav为不短于16k采样率的参考音频，prompt_text为音频中说的内容"""
+    if spk_id == "":
+        raise HTTPException(status_code=400, detail="说话人ID不能为空")
+    data = await prompt_wav.read()
+    await asyncio.to_thread(register_speaker, spk_id, prompt_text, data)
+    return {"spk_id": spk_id}
+
+
+@app.get("/tts/status")
+async def tts_status():
+    if _engine is None:
+        return {"loaded": False}
+    return {"loaded": True, **_engine.stats()}
+
+
+@app.post("/tts")
+async def tts(request: TTSRequest):
+    """合成语音，返回wav
+
+    所有请求的句子进入同一个批处理引擎，并发请求在同一次解码中生成，吞吐量随并发数增长。
+    """
+    voice, engine = await asyncio.to_thread(get_engine)
+    if request.spk_id not in voice.frontend.spk2info:
+        raise HTTPException(status_code=404, detail=f"未知的说话人: {request.spk_id}")
+
+    inputs = await asyncio.to_thread(build_inputs, voice, request)
+    if not inputs:
+        raise HTTPException(status_code=400, detail="没有可以合成的文本")
+    # 同一个请求的各个句子也一起进入批处理，按原顺序拼接
+    futures = [engine.submit(model_input, request.speed) for model_input in inputs]
+    speeches = [await asyncio.wrap_future(future) for future in futures]
+    data = await asyncio.to_thread(encode_wav, speeches, voice.sample_rate)
+    return Response(content=data, media_type="audio/wav")
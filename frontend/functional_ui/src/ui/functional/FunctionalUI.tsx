@@ -1,8 +1,8 @@
 import React, { Component } from 'react';
-import { Label, Button, Card, Elevation, Collapse } from "@blueprintjs/core";
+import { Label, Button, Card, Elevation, Collapse, ProgressBar, Intent } from "@blueprintjs/core";
 import { ItemPredicate, ItemRenderer, Select } from "@blueprintjs/select";
 import { MenuItem } from "@blueprintjs/core";
-import { ComponentTabRef } from "ssui_components";
+import { ComponentTabRef, Message } from "ssui_components";
 import { DetailsPanel } from "./Details";
 import { registerUIProvider, UIProvider } from '../UIProvider';
 import './FunctionalUI.css';
@@ -32,6 +32,14 @@ interface ScriptMeta {
     functions: FunctionMeta;
 }
 
+// 执行过程中服务端推送的进度，见ss_executor.model.TaskProgress
+interface TaskProgress {
+    task_id: string;
+    step: number;
+    total_steps: number;
+    preview?: string | null;
+}
+
 interface FunctionalUIProps {
     path: string;
 }
@@ -43,6 +51,11 @@ interface FunctionalUIState {
     selectedFunc: Callable | undefined;
     isOpen: boolean;
     root_path: string;
+    running: boolean;
+    taskId: string | null;
+    progress: TaskProgress | null;
+    preview: string | null;
+    runError: string | null;
 }
 
 export class FunctionalUI extends Component<FunctionalUIProps, FunctionalUIState> {
@@ -55,12 +68,18 @@ export class FunctionalUI extends Component<FunctionalUIProps, FunctionalUIState
             selectedFunc: undefined,
             isOpen: false,
             root_path: '',
+            running: false,
+            taskId: null,
+            progress: null,
+            preview: null,
+            runError: null,
         };
     }
 
     refInputs: Map<string, React.RefObject<ComponentTabRef>> = new Map();
     refOutputs: Map<string, React.RefObject<ComponentTabRef>> = new Map();
     details: React.RefObject<DetailsPanel> = React.createRef();
+    message: Message = new Message();
 
     componentDidMount() {
         this.queryScriptMeta();
@@ -110,11 +129,11 @@ export class FunctionalUI extends Component<FunctionalUIProps, FunctionalUIState
         this.setState(prevState => ({ isOpen: !prevState.isOpen }));
     }
 
-    handleRun = (): void => {
-        const { functions, selectedFunc, isOpen } = this.state;
+    handleRun = async (): Promise<void> => {
+        const { functions, selectedFunc, running } = this.state;
         const { path } = this.props;
 
-        if (!functions) return;
+        if (!functions || running) return;
 
         const selected = selectedFunc?.name ?? Object.keys(functions)[0];
         const meta = functions[selected];
@@ -131,30 +150,71 @@ export class FunctionalUI extends Component<FunctionalUIProps, FunctionalUIState
         const details = this.details.current?.onExecute();
         console.log('details', details);
 
-        // 执行API调用
-        fetch('/api/execute?' + new URLSearchParams({
-            script_path: path,
-            callable: selected,
-        }), {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ params, details }),
-        }).then(res => {
-            if (res.ok) {
-                res.json().then(data => {
-                    // 更新输出组件
-                    for (let i = 0; i < data.length; i++) {
-                        const item = data[i];
-                        const outputComponent = this.getRef(i.toString(), this.refOutputs).current;
-                        if (outputComponent) {
-                            outputComponent.onUpdate(item);
-                        }
+        this.setState({ running: true, taskId: null, progress: null, preview: null, runError: null });
+        try {
+            // 通过带进度推送的接口执行，执行中显示进度和预览图，返回的task_id用于取消
+            const finish: any = await this.message.post('api/execute?' + new URLSearchParams({
+                script_path: path,
+                callable: selected,
+            }), { params, details }, {
+                progress: (progress: TaskProgress) => {
+                    this.setState(prevState => ({
+                        progress,
+                        preview: progress.preview ?? prevState.preview,
+                    }));
+                },
+            }, (start) => {
+                this.setState({ taskId: start.task_id });
+            });
+
+            const data = finish.result;
+            if (Array.isArray(data)) {
+                // 更新输出组件
+                for (let i = 0; i < data.length; i++) {
+                    const item = data[i];
+                    const outputComponent = this.getRef(i.toString(), this.refOutputs).current;
+                    if (outputComponent) {
+                        outputComponent.onUpdate(item);
                     }
-                });
+                }
+            } else if (data?.cancelled) {
+                this.setState({ runError: 'Cancelled' });
+            } else if (data?.error) {
+                this.setState({ runError: data.error });
             }
-        });
+        } catch (error) {
+            this.setState({ runError: error instanceof Error ? error.message : 'Unknown error' });
+        } finally {
+            this.setState({ running: false, taskId: null });
+        }
+    }
+
+    handleCancel = async (): Promise<void> => {
+        const { taskId } = this.state;
+        if (!taskId) return;
+
+        // 执行中的任务在下一个节点或去噪步骤时停止，结果在execute的finish中返回
+        const result = await this.message.post(`api/cancel/${taskId}`);
+        if (result?.error) {
+            console.warn('cancel failed', result.error);
+        }
+    }
+
+    renderProgress = (): JSX.Element | null => {
+        const { running, progress, preview, runError } = this.state;
+
+        if (!running) {
+            return runError ? <p>{runError}</p> : null;
+        }
+
+        const value = progress && progress.total_steps > 0 ? progress.step / progress.total_steps : undefined;
+        return (
+            <div>
+                <ProgressBar intent={Intent.PRIMARY} value={value} />
+                {progress && <p>{progress.step} / {progress.total_steps}</p>}
+                {preview && <img className="functional-ui-preview" src={preview} />}
+            </div>
+        );
     }
 
     renderSelect = (meta: FunctionMeta): JSX.Element => {
@@ -261,7 +321,11 @@ export class FunctionalUI extends Component<FunctionalUIProps, FunctionalUIState
                         {this.renderInputs(meta[selected])}
                     </div>
                     <div className="functional-ui-button">
-                        <Button intent="primary" text="Run" onClick={this.handleRun} />
+                        <Button intent="primary" text="Run" loading={this.state.running} onClick={this.handleRun} />
+                        {this.state.running && (
+                            <Button intent="danger" text="Cancel" disabled={!this.state.taskId} onClick={this.handleCancel} />
+                        )}
+                        {this.renderProgress()}
                     </div>
                     <div className="functional-ui-output">
                         Output
@@ -93,9 +93,10 @@ export class Message {
 
     
 
+    // onStart在服务端接受请求后、任务结束前调用，参数是服务端的start响应（包含request_uuid等）
     async post(api_path: string, data?: any, callbacks?: {
         [key: string]: (data: any) => void;
-    }) {
+    }, onStart?: (result: any) => void) {
         if (!this.uuid) {
             await new Promise(resolve => setTimeout(resolve, 1000));
         }
@@ -103,7 +104,9 @@ export class Message {
         let address = `http://${this.host}:${this.port}/${api_path}`;
         if (callbacks) {
             await this.connect();
-            address += `/${this.uuid}`;
+            // client id是路径的一部分，要放在查询参数之前
+            const [path, query] = api_path.split('?', 2);
+            address = `http://${this.host}:${this.port}/${path}/${this.uuid}` + (query !== undefined ? `?${query}` : '');
         }
         const response = await fetch(address, {
             method: 'POST',
@@ -124,6 +127,7 @@ export class Message {
 
         let result = await response.json();
         console.log("result: ", result);
+        onStart?.(result);
         return await new Promise((resolve, reject) => {
             let finish_callback = (data: any) => {
                 resolve(data);
@@ -10,7 +10,9 @@ def main():
     parser.add_argument("--dev", action="store_true", help="Enable development mode with auto-reload")
     parser.add_argument('--host', type=str, default='localhost')
     parser.add_argument('--port', type=int, default=7422)
+    parser.add_argument('--executors', type=str, default='0', help="由服务器启动的执行器进程数，auto表示每张GPU一个")
     args = parser.parse_args()
+    os.environ["SSUI_EXECUTORS"] = args.executors
     uvicorn.run(app, host=args.host, port=args.port, reload=args.dev)
 
 if __name__ == "__main__":
@@ -12,6 +12,7 @@ class ExtensionServerConfig(BaseModel):
     venv: str = Field(default="shared", description="The virtual environment to use for the extension")
     dependencies: list[str] = Field(default=[], description="The dependencies to install for the extension")
     main: str = Field(default="extension.py", description="The main file to run for the extension")
+    packages: list[str] = Field(default=[], description="The python packages the extension provides to scripts")
 
 class ExtensionWebUIConfig(BaseModel):
     dist: str = Field(default="dist", description="The dist directory for the extension")
@@ -83,6 +84,25 @@ class ExtensionManager:
                     
     def getExtensions(self, name: str) -> Extension:
         return self.extensions[name]
+
+    def packageCapabilities(self) -> Dict[str, str]:
+        """包名 -> 提供它的扩展对应的执行器能力名
+
+        能力名是扩展目录名的小写，与执行器detect_capabilities上报的一致。
+        没有声明packages的扩展使用目录下的Python包。
+        """
+        result = {}
+        for extension in self.extensions.values():
+            capability = os.path.basename(os.path.normpath(extension.path)).lower()
+            packages = extension.server.packages
+            if not packages and os.path.isdir(extension.path):
+                packages = [
+                    d for d in os.listdir(extension.path)
+                    if os.path.isfile(os.path.join(extension.path, d, "__init__.py"))
+                ]
+            for package in packages:
+                result[package] = capability
+        return result
     
     def loadPythonScripts(self, app: FastAPI):
         for name, extension in self.extensions.items():
@@ -0,0 +1,123 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+FILE_TYPES: Dict[str, Tuple[str, ...]] = {
+    "image": ("png", "jpg", "jpeg", "bmp", "webp"),
+    "video": ("mp4", "avi", "mov", "mkv"),
+    "audio": ("mp3", "wav", "m4a", "ogg"),
+    "3dmodel": ("obj", "fbx", "glb", "gltf"),
+    "script": ("py",),
+}
+
+
+class _DirEntry:
+    __slots__ = ("mtime_ns", "files", "subdirs")
+
+    def __init__(self, mtime_ns: int, files: Dict[str, List[Tuple[str, int]]], subdirs: List[str]):
+        self.mtime_ns = mtime_ns
+        # 文件类型 -> [(文件路径, mtime_ns)]
+        self.files = files
+        self.subdirs = subdirs
+
+
+class FileIndex:
+    """按文件类型索引项目目录下的文件
+
+    每个目录记录它的mtime、直接包含的各类型文件和子目录。刷新时只stat目录，
+    mtime没变的目录直接复用上次的结果，只有新增、删除或重命名过文件的目录才会重新列出，
+    所以列出文件的开销与目录数和结果数有关，而不是整棵目录树的文件数。
+    """
+
+    def __init__(self, file_types: Dict[str, Tuple[str, ...]] = FILE_TYPES):
+        self.file_types = file_types
+        self._ext_to_type = {"." + ext: file_type for file_type, exts in file_types.items() for ext in exts}
+        self._dirs: Dict[str, _DirEntry] = {}
+        self._lock = threading.Lock()
+
+    def list_files(
+        self,
+        root: str,
+        file_type: str,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        sort: str = "path",
+    ) -> Tuple[int, List[str]]:
+        """列出root下指定类型的文件，返回(总数, 当前页的路径)
+
+        sort为"path"时按路径排序，为"mtime"时最新的文件在前。
+        覆盖写入文件不会改变目录的mtime，所以按mtime排序时会重新stat结果中的文件。
+        """
+        if file_type not in self.file_types:
+            raise ValueError(f"未知的文件类型: {file_type}")
+        with self._lock:
+            files = []
+            for entry in self._refresh(root):
+                files.extend(entry.files.get(file_type, ()))
+
+        if sort == "mtime":
+            files = self._stat_files(files)
+            files.sort(key=lambda f: f[1], reverse=True)
+        else:
+            files.sort()
+        end = None if limit is None else offset + limit
+        return len(files), [path for path, _ in files[offset:end]]
+
+    @staticmethod
+    def _stat_files(files: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+        """读取文件当前的mtime，跳过已经不存在的文件"""
+        result = []
+        for path, _ in files:
+            try:
+                result.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                continue
+        return result
+
+    def _refresh(self, root: str) -> List[_DirEntry]:
+        """更新root下所有目录的索引，返回这些目录的记录"""
+        entries = []
+        visited = set()
+        stack = [root]
+        while stack:
+            dirpath = stack.pop()
+            visited.add(dirpath)
+            try:
+                mtime_ns = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+
+            entry = self._dirs.get(dirpath)
+            if entry is None or entry.mtime_ns != mtime_ns:
+                entry = self._scan_dir(dirpath, mtime_ns)
+                if entry is None:
+                    continue
+                self._dirs[dirpath] = entry
+            entries.append(entry)
+            # 子目录里的变化不会改变父目录的mtime，所以子目录总要检查
+            stack.extend(entry.subdirs)
+
+        # 删除已经不存在的目录
+        prefix = os.path.join(root, "")
+        for dirpath in [d for d in self._dirs if (d == root or d.startswith(prefix)) and d not in visited]:
+            del self._dirs[dirpath]
+        return entries
+
+    def _scan_dir(self, dirpath: str, mtime_ns: int) -> Optional[_DirEntry]:
+        files: Dict[str, List[Tuple[str, int]]] = {}
+        subdirs = []
+        try:
+            with os.scandir(dirpath) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            subdirs.append(item.path)
+                            continue
+                        file_type = self._ext_to_type.get(os.path.splitext(item.name)[1].lower())
+                        if file_type is not None:
+                            files.setdefault(file_type, []).append((item.path, item.stat().st_mtime_ns))
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return _DirEntry(mtime_ns, files, subdirs)
@@ -4,19 +4,64 @@ import asyncio
 import uuid
 import aioshutil
 import json
-from typing import List, Dict, Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
 from server.models import ModelScanResult, ModelInfo
 from server.resource_manager import ModelInfoCache
 from backend.model_manager.config import ModelType
+from backend.model_manager.probe import ModelProbe
+from backend.model_manager.util.model_util import _fast_safetensors_reader
 from server.config_service import ConfigService
 
 
+MODEL_FILE_SUFFIXES = (".safetensors", ".pt", ".ckpt")
+
+# 目录的增量扫描状态：(目录mtime_ns, 在该目录中直接找到的模型, 目录本身是否为模型, 无法识别的文件, 文件路径 -> (mtime_ns, size))
+DirScanState = Tuple[int, List[Dict[str, Any]], bool, List[Dict[str, Any]], Dict[str, Optional[Tuple[int, int]]]]
+
+
+def _file_stats(paths: Iterable[str]) -> Dict[str, Optional[Tuple[int, int]]]:
+    """读取文件的(mtime_ns, size)，文件不存在时为None"""
+    stats = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stats[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stats[path] = None
+    return stats
+
+
+def _is_model_dir(dirpath: str) -> bool:
+    """只读取目录中的配置文件判断是否为diffusers等目录形式的模型，不加载权重"""
+    try:
+        ModelProbe.get_model_type_from_folder(Path(dirpath))
+        return True
+    except Exception:
+        return False
+
+
+def _has_model_header(model_path: str) -> bool:
+    """safetensors文件只读取文件头，过滤掉无法解析或不包含张量的文件，其他格式交给完整探测"""
+    if not model_path.endswith(".safetensors"):
+        return True
+    try:
+        return len(_fast_safetensors_reader(model_path)) > 0
+    except Exception:
+        return False
+
+
 class ModelService:
     def __init__(self, resources_dir: str):
         self.resources_dir = resources_dir
         self.config_service = ConfigService(
             os.path.join(resources_dir, "ssui_config.json")
         )
+        self.scan_workers = min(8, os.cpu_count() or 1)
+        # 目录 -> 上次扫描的状态，用于增量扫描
+        self._scan_state: Dict[str, DirScanState] = {}
+        self._scan_state_lock = threading.Lock()
 
     async def scan_models(
         self,
@@ -25,16 +70,22 @@ class ModelService:
         request_uuid: str,
         callback: Callable[[str, str, Dict[str, Any]], None],
         finish_callback: Callable[[str, str, Dict[str, Any]], None],
+        incremental: bool = False,
     ) -> Dict[str, Any]:
         """
         扫描指定目录下的模型文件
 
+        目录遍历在单独的线程中进行，模型探测提交到线程池并行执行，每探测到一个模型立即通过callback返回。
+        探测失败的文件通过model_unrecognized回调报告，并在完成时的unrecognized中返回。
+        增量模式下，mtime与上次扫描相同、其中的文件也没有被覆盖写入的目录不会重新探测，直接返回上次在该目录中找到的模型。
+
         Args:
             scan_dir: 要扫描的目录路径
             client_id: 客户端ID
             request_uuid: 请求UUID
             callback: 回调函数，用于发送扫描进度
             finish_callback: 完成回调函数
+            incremental: 是否只重新扫描上次扫描后发生变化的目录
 
         Returns:
             Dict[str, Any]: 包含扫描结果的字典
@@ -45,64 +96,115 @@ class ModelService:
         def scan_target_dir():
             try:
                 scaned_models = []
+                unrecognized_models = []
+                scaned_models_lock = threading.Lock()
                 # 获取已安装的模型列表
                 installed_models = self.config_service.get_installed_models()
-                installed_paths = [model.path for model in installed_models]
+                installed_paths = {model.path for model in installed_models}
+
+                def report(callback_data: Dict[str, Any]):
+                    with scaned_models_lock:
+                        scaned_models.append(callback_data)
+                    loop.call_soon_threadsafe(
+                        callback,
+                        client_id,
+                        request_uuid,
+                        {"model_found": callback_data},
+                    )
+
+                def report_unrecognized(callback_data: Dict[str, Any]):
+                    print("无法识别的模型文件:", callback_data["path"], callback_data["reason"])
+                    with scaned_models_lock:
+                        unrecognized_models.append(callback_data)
+                    loop.call_soon_threadsafe(
+                        callback,
+                        client_id,
+                        request_uuid,
+                        {"model_unrecognized": callback_data},
+                    )
+
+                def unrecognized(model_path: str, name: str, reason: str, dir_state: Tuple[List, List]):
+                    callback_data = {"path": model_path, "name": name, "reason": reason}
+                    dir_state[1].append(callback_data)
+                    report_unrecognized(callback_data)
+
+                def probe_model(model_path: str, name: str, dir_state: Tuple[List, List]) -> bool:
+                    """探测模型，成功时返回True，失败的文件作为无法识别的模型报告"""
+                    try:
+                        installed = model_path in installed_paths
+                        if not installed and ModelInfoCache.get(model_path) is None:
+                            unrecognized(model_path, name, "无法识别的模型格式", dir_state)
+                            return False
+                        callback_data = {
+                            "path": model_path,
+                            "name": name,
+                            "installed": installed,
+                        }
+                        dir_state[0].append(callback_data)
+                        report(callback_data)
+                        return True
+                    except Exception as e:
+                        unrecognized(model_path, name, str(e), dir_state)
+                        return False
 
+                scan_state: Dict[str, DirScanState] = {}
                 if os.path.exists(scan_dir):
-                    for dirpath, dirnames, filenames in os.walk(scan_dir):
-                        # 首先检查当前目录是否是一个模型
-                        try:
-                            if dirpath in installed_paths or ModelInfoCache.get(
-                                dirpath
-                            ):
-                                # 如果当前目录是一个模型，则跳过扫描其子目录
-                                callback_data = {
-                                    "path": dirpath,
-                                    "name": os.path.basename(dirpath),
-                                    "installed": dirpath in installed_paths,
-                                }
-                                scaned_models.append(callback_data)
-                                loop.call_soon_threadsafe(
-                                    callback,
-                                    client_id,
-                                    request_uuid,
-                                    {"model_found": callback_data},
-                                )
-                                # 清空dirnames列表，这样os.walk就不会继续扫描子目录
+                    with ThreadPoolExecutor(max_workers=self.scan_workers) as pool:
+                        futures = []
+                        for dirpath, dirnames, filenames in os.walk(scan_dir):
+                            try:
+                                dir_mtime = os.stat(dirpath).st_mtime_ns
+                            except OSError:
                                 dirnames.clear()
                                 continue
-                        except Exception:
-                            # 如果当前目录不是模型，继续正常扫描
-                            pass
-
-                        for filename in filenames:
-                            if (
-                                filename.endswith(".safetensors")
-                                or filename.endswith(".pt")
-                                or filename.endswith(".ckpt")
-                            ):
-                                model_path = os.path.join(dirpath, filename)
-                                try:
-                                    if not model_path in installed_paths:
-                                        ModelInfoCache.get(model_path)
-                                    callback_data = {
-                                        "path": model_path,
-                                        "name": filename,
-                                        "installed": model_path in installed_paths,
-                                    }
-                                    scaned_models.append(callback_data)
-                                    loop.call_soon_threadsafe(
-                                        callback,
-                                        client_id,
-                                        request_uuid,
-                                        {"model_found": callback_data},
-                                    )
-                                except Exception as e:
+
+                            previous = self._scan_state.get(dirpath) if incremental else None
+                            # 覆盖写入文件不会改变目录的mtime，所以还要比较上次记录的各文件的mtime和大小
+                            if previous is not None and previous[0] == dir_mtime and _file_stats(previous[4]) == previous[4]:
+                                # 目录没有变化，直接返回上次的结果
+                                for callback_data in previous[1]:
+                                    report(dict(callback_data, installed=callback_data["path"] in installed_paths))
+                                for callback_data in previous[3]:
+                                    report_unrecognized(callback_data)
+                                scan_state[dirpath] = previous
+                                if previous[2]:
+                                    dirnames.clear()
+                                continue
+
+                            # (在该目录中找到的模型, 无法识别的文件)
+                            dir_state: Tuple[List[Dict[str, Any]], List[Dict[str, Any]]] = ([], [])
+                            # 首先检查当前目录是否是一个模型，目录模型在遍历线程中直接探测，
+                            # 只有探测成功后才跳过子目录，探测失败时继续按普通目录扫描
+                            if dirpath in installed_paths or _is_model_dir(dirpath):
+                                if probe_model(dirpath, os.path.basename(dirpath), dir_state):
+                                    # 目录模型记录顶层的配置和权重文件
+                                    file_stats = _file_stats(os.path.join(dirpath, filename) for filename in filenames)
+                                    scan_state[dirpath] = (dir_mtime, dir_state[0], True, dir_state[1], file_stats)
+                                    # 清空dirnames列表，这样os.walk就不会继续扫描子目录
+                                    dirnames.clear()
                                     continue
 
+                            model_paths = [
+                                os.path.join(dirpath, filename)
+                                for filename in filenames
+                                if filename.endswith(MODEL_FILE_SUFFIXES)
+                            ]
+                            scan_state[dirpath] = (dir_mtime, dir_state[0], False, dir_state[1], _file_stats(model_paths))
+                            for model_path in model_paths:
+                                filename = os.path.basename(model_path)
+                                if model_path in installed_paths or _has_model_header(model_path):
+                                    futures.append(pool.submit(probe_model, model_path, filename, dir_state))
+                                else:
+                                    unrecognized(model_path, filename, "无法读取safetensors文件头", dir_state)
+
+                        for future in futures:
+                            future.result()
+
+                with self._scan_state_lock:
+                    self._scan_state.update(scan_state)
+
                 # 发送完成回调
-                finish_data = {"models": scaned_models}
+                finish_data = {"models": scaned_models, "unrecognized": unrecognized_models}
                 loop.call_soon_threadsafe(
                     finish_callback, client_id, request_uuid, finish_data
                 )
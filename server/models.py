@@ -14,9 +14,21 @@ class Settings(BaseModel):
     additional_model_dirs: List[str] = []
     installed_models: List[ModelInfo] = []
     resources_dir: Optional[str] = None
+    # 模型缓存配置，执行器启动时读取
+    enable_partial_loading: bool = Field(default=True, description="显存不足时按层分批加载模型，而不是整体加载失败")
+    device_working_mem_gb: float = Field(default=3, description="推理时在显存中为中间结果预留的空间(GB)")
+    max_ram_cache_gb: Optional[float] = Field(default=None, description="模型内存缓存上限(GB)，为空时按系统内存自动计算")
+    max_vram_cache_gb: Optional[float] = Field(default=None, description="模型显存缓存上限(GB)，为空时按显卡显存自动计算")
+    pinned_memory_gb: float = Field(default=0, description="用于锁页内存的模型权重上限(GB)，锁页后权重可异步传输到显存")
+    gguf_dequant_cache_gb: float = Field(default=0, description="GGUF模型反量化权重缓存上限(GB)，占用device_working_mem_gb中的空间，0表示不缓存")
+    lora_delta_cache_gb: float = Field(default=0, description="LoRA合并后权重增量的缓存上限(GB)，相同的LoRA组合再次运行时不再重新计算，占用device_working_mem_gb中的空间，0表示不缓存")
+    conditioning_cache_dir: Optional[str] = Field(default=None, description="提示词编码结果的磁盘缓存目录，内存中淘汰的条目写入这里，重启后仍可复用，为空时只缓存在内存中")
+    result_cache_mb: float = Field(default=256, description="服务器内存中缓存的最近任务结果文件上限(MB)")
+    node_cache_mb: float = Field(default=1024, description="执行器跨任务缓存的节点结果大小上限(MB)，结果中的张量可能在显存上，0表示不缓存")
 
 class ScanModelsRequest(BaseModel):
     scan_dir: str = Field(description="The directory to scan for models")
+    incremental: bool = Field(default=False, description="Only rescan directories changed since the last scan")
 
 # 模型相关模型
 class ModelConfig(BaseModel):
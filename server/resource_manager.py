@@ -1,7 +1,10 @@
+import json
 import os
+import threading
 from pathlib import Path
+from typing import Dict, Optional, Tuple
 
-from backend.model_manager.config import AnyModelConfig
+from backend.model_manager.config import AnyModelConfig, ModelConfigFactory
 from backend.model_manager.probe import ModelProbe
 
 class IReadOnlyResourceProvider:
@@ -67,34 +70,139 @@ class FileResourceProvider(IResourceProvider):
         return "OK"
 
 
+# 模型探测结果的持久化索引，每行一个JSON记录，后出现的记录覆盖先前的记录
+MODEL_INDEX_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "resources", "model_index.jsonl")
+)
+
+
+def _stat_signature(model_path: str) -> Optional[Tuple[int, int, int]]:
+    """返回 (size, mtime_ns, inode)，文件不存在时返回 None"""
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
 class ModelInfoCache:
-    def __init__(self):
-        self.cache = {}
+    """
+    模型探测结果缓存。
+
+    以 path + size + mtime + inode 为键保存 ModelProbe.probe 的结果（包括模型哈希），并追加写入
+    index_path 指向的 JSON-lines 文件，重启后无需重新哈希和加载模型文件。文件发生变化时对应记录自动失效。
+    探测失败的路径只在本进程内记录，不写入索引，升级后新支持的模型类型在下次启动时会被重新探测。
+    """
+
+    def __init__(self, index_path: Optional[str] = MODEL_INDEX_PATH):
+        self.index_path = index_path
+        self.cache: Dict[str, Tuple[Tuple[int, int, int], Optional[AnyModelConfig]]] = {}
+        self._index_lines = 0
+        self._lock = threading.Lock()
+        if self.index_path is not None:
+            self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                self._index_lines += 1
+                try:
+                    record = json.loads(line)
+                    if record["config"] is None:
+                        # 旧版本写入的探测失败记录，重新探测
+                        self.cache.pop(record["path"], None)
+                        continue
+                    model_config = ModelConfigFactory.make_config(record["config"])
+                    self.cache[record["path"]] = (tuple(record["signature"]), model_config)
+                except Exception:
+                    # 忽略损坏的行或旧版本无法解析的配置，下次访问时会重新探测
+                    continue
+
+        # 被覆盖的记录过多时压缩索引文件
+        if self._index_lines > 2 * len(self.cache) + 16:
+            self._rewrite_index()
+
+    def _record_line(self, model_path: str, signature, model_config: AnyModelConfig) -> str:
+        return json.dumps(
+            {
+                "path": model_path,
+                "signature": list(signature),
+                "config": model_config.model_dump(mode="json"),
+            },
+            ensure_ascii=False,
+        ) + "\n"
+
+    def _append_index(self, model_path: str, signature, model_config: Optional[AnyModelConfig]):
+        if self.index_path is None or model_config is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(self._record_line(model_path, signature, model_config))
+            self._index_lines += 1
+        except OSError as e:
+            print(f"Failed to update model index {self.index_path}: {e}")
+
+    def _rewrite_index(self):
+        if self.index_path is None:
+            return
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                lines = 0
+                for model_path, (signature, model_config) in self.cache.items():
+                    if model_config is not None:
+                        f.write(self._record_line(model_path, signature, model_config))
+                        lines += 1
+            os.replace(tmp_path, self.index_path)
+            self._index_lines = lines
+        except OSError as e:
+            print(f"Failed to rewrite model index {self.index_path}: {e}")
 
     def _get(self, model_path: str):
-        if model_path in self.cache:
-            return self.cache[model_path]
-        else:
-            try:
-                model_config = ModelProbe.probe(Path(model_path))
-                self.cache[model_path] = model_config
-                return model_config
-            except Exception as e:
-                return None
+        model_path = os.path.abspath(model_path)
+        signature = _stat_signature(model_path)
+        if signature is None:
+            return None
+
+        with self._lock:
+            entry = self.cache.get(model_path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        try:
+            model_config = ModelProbe.probe(Path(model_path))
+        except Exception:
+            model_config = None
+
+        with self._lock:
+            self.cache[model_path] = (signature, model_config)
+            self._append_index(model_path, signature, model_config)
+        return model_config
     
     @classmethod
     def get(cls, model_path: str):
         return cls.instance()._get(model_path)
 
     def _set(self, model_path: str, model_config: AnyModelConfig):
-        self.cache[model_path] = model_config
+        model_path = os.path.abspath(model_path)
+        signature = _stat_signature(model_path)
+        if signature is None:
+            return
+        with self._lock:
+            self.cache[model_path] = (signature, model_config)
+            self._append_index(model_path, signature, model_config)
     
     @classmethod
     def set(cls, model_path: str, model_config: AnyModelConfig):
         cls.instance()._set(model_path, model_config)
 
     def _clear(self):
-        self.cache.clear()
+        with self._lock:
+            self.cache.clear()
+            self._rewrite_index()
 
     @classmethod
     def clear(cls):
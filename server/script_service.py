@@ -1,14 +1,19 @@
 import os
 import torch
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional
 from server.models import ScriptFunctionInfo
-from ss_executor import SSLoader, search_project_root
+from ss_executor import SSLoader, script_requirements, search_project_root
 from ss_executor.scheduler import TaskScheduler
-from ss_executor.model import Task
+from ss_executor.model import Task, TaskProgress
+from .extensions import ExtensionManager
 
 class ScriptService:
     def __init__(self, scheduler: TaskScheduler):
         self.scheduler = scheduler
+
+    def get_requirements(self, script_path: str) -> List[str]:
+        """脚本导入了哪些扩展的包，就只能由安装了这些扩展的执行器执行"""
+        return script_requirements(script_path, ExtensionManager.instance().packageCapabilities())
     
     def get_script_functions(self, script_path: str) -> Dict[str, Any]:
         try:
@@ -20,7 +25,8 @@ class ScriptService:
             if project_root is None:
                 return {"error": "Project root not found"}
             
-            loader = SSLoader()
+            # 脚本未修改时复用上次的执行结果，打开脚本时不需要重新编译和执行
+            loader = SSLoader(use_cache=True)
             loader.load(script_path)
             loader.Execute()
             
@@ -56,27 +62,66 @@ class ScriptService:
                 return {"error": "Path not found"}
             
             return await self.scheduler.run_task(
-                Task(script=script_path, callable=callable, is_prepare=True, use_sandbox=True)
+                Task(
+                    script=script_path,
+                    callable=callable,
+                    is_prepare=True,
+                    use_sandbox=True,
+                    requirements=self.get_requirements(script_path),
+                )
             )
         except Exception as e:
             return {"error": str(e)}
     
-    async def execute_script(self, script_path: str, callable: str, params: Dict[str, Any], details: Dict[str, Any]) -> Dict[str, Any]:
+    async def execute_script(
+        self,
+        script_path: str,
+        callable: str,
+        params: Dict[str, Any],
+        details: Dict[str, Any],
+        task_id: Optional[str] = None,
+        progress_callback: Optional[Callable[[TaskProgress], None]] = None,
+    ) -> Dict[str, Any]:
         try:
             script_path = os.path.normpath(script_path)
-            return await self.scheduler.run_task(
-                Task(
-                    script=script_path,
-                    callable=callable,
-                    params=params,
-                    details=details,
-                    is_prepare=False,
-                    use_sandbox=True,
-                )
+            task = Task(
+                script=script_path,
+                callable=callable,
+                params=params,
+                details=details,
+                is_prepare=False,
+                use_sandbox=True,
+                requirements=self.get_requirements(script_path),
             )
+            if task_id:
+                task.task_id = task_id
+            return await self.scheduler.run_task(task, progress_callback)
         except Exception as e:
             return {"error": str(e)}
+
+    async def execute_script_with_progress(
+        self,
+        script_path: str,
+        callable: str,
+        params: Dict[str, Any],
+        details: Dict[str, Any],
+        client_id: str,
+        request_uuid: str,
+        callback: Callable[[str, str, Dict[str, Any]], None],
+        finish_callback: Callable[[str, str, Dict[str, Any]], None],
+    ):
+        """执行脚本，执行过程中通过callback推送进度和预览图，完成后通过finish_callback返回结果"""
+        def on_progress(progress: TaskProgress):
+            callback(client_id, request_uuid, {"progress": progress.model_dump(exclude={"type"})})
+
+        result = await self.execute_script(script_path, callable, params, details, request_uuid, on_progress)
+        finish_callback(client_id, request_uuid, {"result": result})
     
+    async def cancel_script(self, task_id: str) -> Dict[str, Any]:
+        if await self.scheduler.cancel_task(task_id):
+            return {"success": True}
+        return {"error": "Task not found or already finished"}
+
     def get_torch_version(self) -> str:
         return torch.torch_version.__version__
     
@@ -15,6 +15,8 @@ import os
 import json
 from server.opener_service import FileOpenerManager
 from ss_executor.scheduler import TaskScheduler
+from ss_executor.transport import ResultCache
+from ss_executor.pool import ExecutorPool, detect_executor_count
 from contextlib import asynccontextmanager
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
@@ -23,6 +25,7 @@ from .extensions import ExtensionManager
 
 from server.models import ModelInfo, ScanModelsRequest
 from server.config_service import ConfigService
+from server.file_index import FileIndex
 from server.model_service import ModelService
 from server.script_service import ScriptService
 from server.websocket_service import WebSocketService
@@ -32,13 +35,16 @@ resources_dir: str = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "resources")
 )
 settings_path: str = os.path.join(resources_dir, "ssui_config.json")
+# 由服务器启动的执行器从同一个配置文件读取模型缓存配置
+os.environ.setdefault("SSUI_SETTINGS_PATH", settings_path)
 
 # 创建服务
 config_service = ConfigService(settings_path)
 model_service = ModelService(resources_dir)
-scheduler = TaskScheduler()
+scheduler = TaskScheduler(ResultCache(int(config_service.get_settings().result_cache_mb * 1024 * 1024)))
 script_service = ScriptService(scheduler)
 websocket_service = WebSocketService()
+file_index = FileIndex()
 
 
 @asynccontextmanager
@@ -47,10 +53,18 @@ async def lifespan(app: FastAPI):
     ExtensionManager.instance().detectExtensions(app)
     print("检测扩展完成")
     await scheduler.start()
+    # 按需启动执行器进程池，默认由桌面端单独启动执行器
+    executors = os.environ.get("SSUI_EXECUTORS", "0")
+    executor_count = detect_executor_count() if executors == "auto" else int(executors)
+    executor_pool = ExecutorPool(executor_count) if executor_count > 0 else None
+    if executor_pool:
+        await executor_pool.start()
     yield
     # 关闭所有连接
     print("closing scheduler and all websocket connections.")
     await scheduler.stop()
+    if executor_pool:
+        await executor_pool.stop()
     websocket_service.stop()
 
 
@@ -70,9 +84,6 @@ app.add_middleware(
 async def config(config: Dict[str, Any]):
     return config_service.update_config(config)
 
-class ScanModelsRequest(BaseModel):
-    scan_dir: str = Field(description="The directory to scan for models")
-
 # API Use: /desktop/src/providers/TauriModelsProvider.ts
 @app.post("/config/scan_models/{client_id}")
 async def scan_models(client_id: str, request: ScanModelsRequest):
@@ -85,13 +96,14 @@ async def scan_models(client_id: str, request: ScanModelsRequest):
     return JSONResponse(content=jsonable_encoder({
         "type": "start",
         "request_uuid": request_uuid,
-        "callbacks": ["model_found"],
+        "callbacks": ["model_found", "model_unrecognized"],
     }), background=BackgroundTask(model_service.scan_models, 
         scan_dir=scan_dir,
         client_id=client_id,
         request_uuid=request_uuid,
         callback=websocket_service.send_callback,
-        finish_callback=websocket_service.send_finish)
+        finish_callback=websocket_service.send_finish,
+        incremental=request.incremental)
     )
 
 
@@ -160,30 +172,57 @@ async def prepare(script_path: str, callable: str):
 async def execute(script_path: str, callable: str, params: Dict[str, Any], details: Dict[str, Any]):
     return await script_service.execute_script(script_path, callable, params, details)
 
+
+# 带进度推送的执行接口，request_uuid同时作为任务ID
+@app.post("/api/execute/{client_id}")
+async def execute_with_progress(client_id: str, script_path: str, callable: str, params: Dict[str, Any], details: Dict[str, Any]):
+    request_uuid = str(uuid.uuid4())
+
+    return JSONResponse(content=jsonable_encoder({
+        "type": "start",
+        "request_uuid": request_uuid,
+        "task_id": request_uuid,
+        "callbacks": ["progress"],
+    }), background=BackgroundTask(
+        script_service.execute_script_with_progress,
+        script_path=script_path,
+        callable=callable,
+        params=params,
+        details=details,
+        client_id=client_id,
+        request_uuid=request_uuid,
+        callback=websocket_service.send_callback,
+        finish_callback=websocket_service.send_finish,
+    ))
+
+@app.post("/api/cancel/{task_id}")
+async def cancel(task_id: str):
+    return await script_service.cancel_script(task_id)
+
 @app.get("/file/root_path")
 async def root_path(script_path: str):
     return search_project_root(script_path)
 
 @app.get("/files/{file_type}")
-async def files(file_type: str, script_path: str):
-    ext_name_map = {
-        "image": ("png", "jpg", "jpeg", "bmp"),
-        "video": ("mp4", "avi", "mov", "mkv"),
-        "audio": ("mp3", "wav", "m4a", "ogg"),
-        "3dmodel": ("obj", "fbx", "glb", "gltf"),
-        "script": ("py")
-    }
-
+async def files(
+    file_type: str,
+    script_path: str,
+    response: Response,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    sort: str = "path",
+):
     project_root = search_project_root(script_path)
     if project_root is None:
         return {"error": "Project root not found"}
+    if file_type not in file_index.file_types:
+        return {"error": f"Unknown file type: {file_type}"}
 
-    # TODO: 也许对于日后大目录来说，需要考虑性能问题，但我决定遇到了再说
-    result_files = []
-    for root, dirs, filenames in os.walk(project_root):
-        for filename in filenames:
-            if filename.endswith(ext_name_map[file_type]):
-                result_files.append(os.path.join(root, filename))
+    # 只重新列出有变化的目录，文件总数通过响应头返回用于分页
+    total, result_files = await asyncio.to_thread(
+        file_index.list_files, project_root, file_type, offset, limit, sort
+    )
+    response.headers["X-Total-Count"] = str(total)
     return result_files
 
 @app.post("/files/upload")
@@ -221,11 +260,18 @@ async def file_upload_json(path: str = Body(..., embed=True), content: str = Bod
 @app.get("/file")
 async def file(path: str):
     print("access file: ", path)
+    # 最近的任务结果由执行器直接发送过来，不需要再读磁盘
+    cached = scheduler.result_cache.get(path)
+    if cached is not None:
+        data, media_type = cached
+        return Response(content=data, media_type=media_type)
     if os.path.exists(path):
         if path.endswith(".png"):
             return FileResponse(path, media_type="image/png")
         elif path.endswith(".jpg") or path.endswith(".jpeg"):
             return FileResponse(path, media_type="image/jpeg")
+        elif path.endswith(".webp"):
+            return FileResponse(path, media_type="image/webp")
         elif path.endswith(".json"):
             return FileResponse(path, media_type="application/json")
         else:
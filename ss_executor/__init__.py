@@ -1,3 +1,3 @@
-from .loader import SSLoader, search_project_root
+from .loader import SSLoader, script_requirements, search_project_root
 from .venv import VenvManager
 
@@ -1,16 +1,23 @@
+import argparse
 import asyncio
-import datetime
+import base64
+from concurrent.futures import Future, ThreadPoolExecutor
+import io
 import os
+import threading
+import time
 from fastapi.encoders import jsonable_encoder
 import websockets
 import json
-from typing import Dict, Optional, Union
+from typing import Callable, Dict, List, Optional, Union
 import logging
 import sys
 
 # 添加项目根目录到sys.path
 project_root = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 sys.path.append(project_root)
+# 单独启动的执行器也读取服务器的配置文件，由服务器启动时沿用服务器设置的路径
+os.environ.setdefault("SSUI_SETTINGS_PATH", os.path.join(project_root, "resources", "ssui_config.json"))
 
 # 添加extensions目录到sys.path
 for dir in os.listdir(os.path.join(project_root, "extensions")):
@@ -21,18 +28,72 @@ for dir in os.listdir(os.path.join(project_root, "extensions")):
 
 from ss_executor.loader import SSLoader, search_project_root
 from ssui.base import Image
+from ssui.progress import TaskCanceledError, reset_cancel_check, reset_node_cache, reset_node_listener, reset_progress_reporter, set_cancel_check, set_node_cache, set_node_listener, set_progress_reporter
+from ss_executor.node_cache import NodeCache
+from ss_executor.output import OutputWriter, SavedOutput
+from ss_executor.prefetch import ModelPrefetcher
 from ss_executor.sandbox import Sandbox
-from ss_executor.model import KillMessage, TaskStatus, Task, ExecutorRegister, RegisterResponse, UpdateStatus, TaskResult, ExeMessage
+from ss_executor.transport import encode_file_frame
+from ss_executor.model import CancelTask, KillMessage, TaskProgress, TaskStatus, Task, ExecutorRegister, RegisterResponse, UpdateStatus, TaskResult, ExeMessage
 import traceback
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def detect_capabilities() -> List[str]:
+    """检测执行器的能力：计算设备类型以及已安装的扩展名"""
+    import torch
+
+    capabilities = []
+    if torch.cuda.is_available():
+        capabilities.append("cuda")
+    elif torch.backends.mps.is_available():
+        capabilities.append("mps")
+    else:
+        capabilities.append("cpu")
+
+    for dir in os.listdir(os.path.join(project_root, "extensions")):
+        if os.path.exists(os.path.join(project_root, "extensions", dir, "ssextension.yaml")):
+            capabilities.append(dir.lower())
+    return capabilities
+
+
 class Executor:
-    def __init__(self, scheduler_url: str = "ws://localhost:5000/"):
+    def __init__(
+        self,
+        scheduler_url: str = "ws://localhost:5000/",
+        max_tasks: int = 1,
+        capabilities: Optional[List[str]] = None,
+        preview_interval: float = 0.5,
+        preview_size: int = 256,
+        output_writer: Optional[OutputWriter] = None,
+        binary_results: bool = True,
+        node_cache_size: int = 32,
+        node_cache_mb: float = 1024,
+    ):
         self.scheduler_url = scheduler_url
-        self.current_task: Optional[Task] = None
+        self.max_tasks = max_tasks
+        # 进度预览的最小发送间隔（秒）和最大边长（像素）
+        self.preview_interval = preview_interval
+        self.preview_size = preview_size
+        self.capabilities = capabilities if capabilities is not None else detect_capabilities()
+        self.current_tasks: Dict[str, asyncio.Task] = {}
+        # 任务ID -> 取消原因，任务线程在安全点检查
+        self.cancel_reasons: Dict[str, str] = {}
         self.is_running = True
+        # 脚本的加载与执行会重置全局的callables列表，同一进程内的并发任务需要串行加载
+        self._load_lock = threading.Lock()
+        # 后台预取下一个节点要用的模型
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        # 结果图片在线程池中编码保存
+        self.output_writer = output_writer if output_writer is not None else OutputWriter()
+        # 结果文件的内容随结果一起发送给服务器，浏览器读取时不需要再读磁盘
+        self.binary_results = binary_results
+        # 节点结果跨任务缓存，只修改了下游参数时从第一个受影响的节点开始重新计算，为0时不缓存
+        if node_cache_size > 0 and node_cache_mb > 0:
+            self.node_cache = NodeCache(node_cache_size, int(node_cache_mb * 1024 * 1024))
+        else:
+            self.node_cache = None
         
     async def connect(self):
         """连接到调度器服务器"""
@@ -43,8 +104,8 @@ class Executor:
                     register_message = ExecutorRegister(
                         host="localhost",  # 这里应该使用实际的host
                         port=0,  # 这里应该使用实际的port
-                        max_tasks=1,
-                        capabilities=[]
+                        max_tasks=self.max_tasks,
+                        capabilities=self.capabilities
                     )
                     await websocket.send(register_message.model_dump_json())
                     logger.info("已连接到调度器服务器")
@@ -76,7 +137,13 @@ class Executor:
                     logger.info(f"收到消息: {message}")
                     exe_message = ExeMessage.validate_json(message, strict=True)
                     if isinstance(exe_message, Task):
-                        await self._handle_task(websocket, exe_message)
+                        # 任务在后台执行，保持消息循环可以继续接收任务
+                        self.current_tasks[exe_message.task_id] = asyncio.create_task(
+                            self._handle_task(websocket, exe_message)
+                        )
+                    elif isinstance(exe_message, CancelTask):
+                        logger.info(f"收到取消任务消息: {exe_message.task_id}")
+                        self._cancel_task(exe_message.task_id, "cancelled")
                     elif isinstance(exe_message, UpdateStatus):
                         logger.info(f"收到更新状态消息: {exe_message}")
                     elif isinstance(exe_message, KillMessage):
@@ -92,7 +159,6 @@ class Executor:
     async def _handle_task(self, websocket, task: Task):
         """处理单个任务"""
         logger.info(f"开始执行任务 {task.task_id}")
-        self.current_task = task
         try:
             # 发送任务开始状态
             status_update = UpdateStatus(
@@ -100,66 +166,29 @@ class Executor:
                 status=TaskStatus.RUNNING
             )
             await websocket.send(status_update.model_dump_json())
-            
-            # 执行任务
-            loader = SSLoader(use_sandbox=task.use_sandbox)
-            loader.load(task.script)
-            loader.Execute()
 
-            if task.is_prepare:
-                # 执行prepare pass
-                result = loader.GetConfig(task.callable)
-                print("执行器结果：")
-                print(result)
-            else:
-                # 执行execute pass
-                def convert_param(param: dict): 
-                    name = param['function']
-                    params = param['params']
-
-                    # 动态导入并获取属性,支持任意层级的包/模块/类/函数访问
-                    parts = name.split('.')
-                    current = __import__(parts[0])
-                    for part in parts[1:]:
-                        current = getattr(current, part)
-                    return current(**params)
-
-                def find_callable(loader: SSLoader, callable: str):
-                    for func, param_types, return_type in loader.callables:
-                        if func.__name__ == callable:
-                            return func, param_types, return_type
-                    raise ValueError(f"未找到可调用函数: {callable}")
-                
-                func, param_types, return_type = find_callable(loader, task.callable)
-                print(task.script, task.callable, task.params, task.details)
-                new_params = {}
-                for name, param in task.params.items():
-                    print(name, param)
-                    new_params[name] = convert_param(param)
-
-                def convert_return(result):
-                    if isinstance(result, tuple):
-                        return [convert_return(r) for r in result]
-                    
-                    if isinstance(result, Image):
-                        current_time = datetime.datetime.now()
-                        project_root = search_project_root(os.path.dirname(task.script))
-                        output_dir = os.path.join(project_root, "output")
-                        if not os.path.exists(output_dir):
-                            os.makedirs(output_dir)
-                        path = os.path.join(output_dir, "image_" + current_time.strftime("%Y%m%d%H%M%S") + ".png")
-                        result._image.save(path)
-                        return {"type": "image", "path": path}
-                # 注入配置
-                loader.config._update = task.details
-                # 执行
-                result = func(**new_params)
-
-                # 确保返回一个数组
-                if not isinstance(result, tuple):
-                    result = (result,)
-
-                result = convert_return(result)
+            # 超时后按取消处理，任务在下一个安全点停止
+            loop = asyncio.get_running_loop()
+            timeout_handles = []
+
+            def start_timeout():
+                # 在任务线程中拿到模块锁后调用，等待其他任务的时间不计入超时
+                if task.timeout:
+                    loop.call_soon_threadsafe(lambda: timeout_handles.append(
+                        loop.call_later(task.timeout, self._cancel_task, task.task_id, "timeout")
+                    ))
+
+            # 在线程中执行任务，避免阻塞消息循环；上报和取消检查函数通过上下文传入任务线程
+            token = set_progress_reporter(self._make_progress_reporter(websocket, task))
+            cancel_token = set_cancel_check(lambda: task.task_id in self.cancel_reasons)
+            try:
+                result = await asyncio.to_thread(self._run_task, task, start_timeout)
+                result = await self._send_outputs(websocket, result)
+            finally:
+                reset_cancel_check(cancel_token)
+                reset_progress_reporter(token)
+                for timeout_handle in timeout_handles:
+                    timeout_handle.cancel()
 
             # 发送任务完成状态和结果
             task_result = TaskResult(
@@ -168,6 +197,18 @@ class Executor:
                 result=jsonable_encoder(result)
             )
             await websocket.send(task_result.model_dump_json())
+
+        except TaskCanceledError:
+            if self.cancel_reasons.get(task.task_id) == "timeout":
+                task_result = TaskResult(
+                    task_id=task.task_id,
+                    status=TaskStatus.FAILED,
+                    error=f"任务执行超时（{task.timeout}秒）"
+                )
+            else:
+                task_result = TaskResult(task_id=task.task_id, status=TaskStatus.CANCELLED)
+            logger.info(f"任务 {task.task_id} 已停止: {self.cancel_reasons.get(task.task_id)}")
+            await websocket.send(task_result.model_dump_json())
             
         except Exception as e:
             # 发送任务失败状态
@@ -179,14 +220,182 @@ class Executor:
             await websocket.send(task_result.model_dump_json())
             
         finally:
-            self.current_task = None
+            self.current_tasks.pop(task.task_id, None)
+            self.cancel_reasons.pop(task.task_id, None)
+
+    async def _send_outputs(self, websocket, result):
+        """把结果中保存的文件替换为路径，开启binary_results时先用二进制帧把文件内容发给服务器"""
+        if isinstance(result, list):
+            return [await self._send_outputs(websocket, r) for r in result]
+        if isinstance(result, SavedOutput):
+            if self.binary_results:
+                await websocket.send(encode_file_frame(result.path, result.media_type, result.data))
+            return {"type": "image", "path": result.path}
+        return result
+
+    def _cancel_task(self, task_id: str, reason: str):
+        """标记任务取消，只对正在执行的任务生效"""
+        if task_id in self.current_tasks:
+            self.cancel_reasons.setdefault(task_id, reason)
+
+    def _make_progress_reporter(self, websocket, task: Task):
+        """创建任务的进度上报函数，在任务线程中调用，按时间间隔节流并缩小预览图"""
+        loop = asyncio.get_running_loop()
+        last_sent = 0.0
+
+        def report(step: int, total_steps: int, preview=None):
+            nonlocal last_sent
+            now = time.monotonic()
+            if step < total_steps and now - last_sent < self.preview_interval:
+                return
+            last_sent = now
+
+            data_url = None
+            if preview is not None:
+                image = preview()
+                image.thumbnail((self.preview_size, self.preview_size))
+                buffer = io.BytesIO()
+                image.convert("RGB").save(buffer, format="JPEG", quality=70)
+                data_url = "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+            message = TaskProgress(task_id=task.task_id, step=step, total_steps=total_steps, preview=data_url)
+            asyncio.run_coroutine_threadsafe(websocket.send(message.model_dump_json()), loop)
+
+        return report
+
+    def _run_task(self, task: Task, on_start: Optional[Callable[[], None]] = None):
+        """执行任务并返回结果，on_start在真正开始执行时调用"""
+        with self._load_lock:
+            # 脚本未修改时复用编译结果和已执行的模块
+            loader = SSLoader(use_sandbox=task.use_sandbox, use_cache=True)
+            loader.load(task.script)
+            loader.Execute()
+
+        with loader.bundle.lock:
+            if on_start:
+                on_start()
+            # 重置上一个任务留下的配置状态
+            if loader.config:
+                loader.config.reset()
+            return self._run_callable(loader, task)
+
+    def _run_callable(self, loader: SSLoader, task: Task):
+        if task.is_prepare:
+            # 执行prepare pass
+            result = loader.GetConfig(task.callable)
+            print("执行器结果：")
+            print(result)
+            return result
+
+        # 执行execute pass
+        def convert_param(param: dict): 
+            name = param['function']
+            params = param['params']
+
+            # 动态导入并获取属性,支持任意层级的包/模块/类/函数访问
+            parts = name.split('.')
+            current = __import__(parts[0])
+            for part in parts[1:]:
+                current = getattr(current, part)
+            return current(**params)
+
+        def find_callable(loader: SSLoader, callable: str):
+            for func, param_types, return_type in loader.callables:
+                if func.__name__ == callable:
+                    return func, param_types, return_type
+            raise ValueError(f"未找到可调用函数: {callable}")
+        
+        func, param_types, return_type = find_callable(loader, task.callable)
+        print(task.script, task.callable, task.params, task.details)
+        new_params = {}
+        for name, param in task.params.items():
+            print(name, param)
+            new_params[name] = convert_param(param)
+
+        project_root = search_project_root(os.path.dirname(task.script))
+        output_dir = os.path.join(project_root, "output")
+        metadata = {"script": task.script, "callable": task.callable, "params": task.params, "details": task.details}
+
+        def submit_return(result):
+            # 先把所有图片提交给线程池并行编码，再统一等待保存完成
+            # 列表是批量生成的一组图片，例如SD1LatentDecodeBatch的结果
+            if isinstance(result, (tuple, list)):
+                return [submit_return(r) for r in result]
+
+            if isinstance(result, Image):
+                return self.output_writer.submit(result._image, output_dir, metadata)
+
+        def collect_return(result):
+            if isinstance(result, list):
+                return [collect_return(r) for r in result]
+            if isinstance(result, Future):
+                # 由_handle_task发送文件内容并转换为路径
+                return result.result()
+            return result
+
+        # 按prepare阶段记录的节点顺序预取模型，GetPlan会重置配置，所以要在注入配置之前
+        prefetcher = ModelPrefetcher(loader.GetPlan(task.callable), new_params, self._prefetch_pool)
+        # 注入配置
+        loader.config._update = task.details
+        # 执行
+        token = set_node_listener(prefetcher.on_node)
+        cache_token = set_node_cache(self.node_cache.session() if self.node_cache is not None else None)
+        try:
+            prefetcher.start()
+            result = func(**new_params)
+        finally:
+            reset_node_cache(cache_token)
+            reset_node_listener(token)
+
+        # 确保返回一个数组
+        if not isinstance(result, tuple):
+            result = (result,)
+
+        return collect_return(submit_return(result))
             
+def load_node_cache_mb(default: float = 1024) -> float:
+    """从服务器的配置文件读取节点结果缓存的大小上限，文件不存在时使用默认值"""
+    settings_path = os.environ.get("SSUI_SETTINGS_PATH")
+    if not settings_path or not os.path.exists(settings_path):
+        return default
+    with open(settings_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("node_cache_mb", default)
+
 def main():
     print("executor_main.py 启动")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scheduler-url", type=str, default="ws://localhost:5000/")
+    parser.add_argument("--max-tasks", type=int, default=1, help="同时执行的最大任务数")
+    parser.add_argument("--capabilities", type=str, default=None, help="逗号分隔的能力列表，默认自动检测")
+    parser.add_argument("--preview-interval", type=float, default=0.5, help="进度预览的最小发送间隔（秒）")
+    parser.add_argument("--preview-size", type=int, default=256, help="进度预览图的最大边长")
+    parser.add_argument("--output-format", type=str, default="png", choices=["png", "webp", "jpeg"], help="结果图片的保存格式")
+    parser.add_argument("--png-compress-level", type=int, default=1, help="PNG压缩等级(0-9)，越低越快")
+    parser.add_argument("--output-quality", type=int, default=90, help="WebP/JPEG的编码质量")
+    parser.add_argument("--no-binary-results", action="store_true", help="只发送结果文件路径，不通过websocket发送文件内容")
+    parser.add_argument("--node-cache-size", type=int, default=32, help="跨任务缓存的节点结果数，0表示不缓存")
+    parser.add_argument("--node-cache-mb", type=float, default=None, help="节点结果缓存的大小上限(MB)，默认使用配置文件中的node_cache_mb，0表示不缓存")
+    args = parser.parse_args()
+
     import ssui
     import ssui_image
+    capabilities = args.capabilities.split(",") if args.capabilities else None
     async def _start():
-        executor = Executor()
+        executor = Executor(
+            args.scheduler_url,
+            max_tasks=args.max_tasks,
+            capabilities=capabilities,
+            preview_interval=args.preview_interval,
+            preview_size=args.preview_size,
+            output_writer=OutputWriter(
+                format=args.output_format,
+                compress_level=args.png_compress_level,
+                quality=args.output_quality,
+            ),
+            binary_results=not args.no_binary_results,
+            node_cache_size=args.node_cache_size,
+            node_cache_mb=args.node_cache_mb if args.node_cache_mb is not None else load_node_cache_mb(),
+        )
         await executor.connect()
     asyncio.run(_start())
 
@@ -1,19 +1,29 @@
+import ast
+import copy
 import os
 import sys
 import yaml
+from typing import Dict, List, Tuple
 from pydantic import BaseModel, Field
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from ss_executor.sandbox import Sandbox, NoSandbox
+from ss_executor.sandbox import ModuleBundle, Sandbox, NoSandbox
+from ssui.progress import reset_node_listener, set_node_listener
+
+# 已执行模块的缓存：(是否使用沙盒, 脚本路径) -> ((修改时间, 内容哈希), ModuleBundle)
+# 每个脚本只保留最新的一份，脚本修改后旧的模块直接被替换
+_module_cache: Dict[Tuple[bool, str], Tuple[Tuple, ModuleBundle]] = {}
 
 class SSLoader:
-    def __init__(self, use_sandbox: bool = True):
+    def __init__(self, use_sandbox: bool = True, use_cache: bool = False):
         self.callables = []
         self.use_sandbox = use_sandbox
+        self.use_cache = use_cache
         self.executor = Sandbox() if use_sandbox else NoSandbox()
         self.config = None
         self.current_file_path = None
+        self.bundle = None
 
     def load(self, path: str):
         """加载模块"""
@@ -26,9 +36,20 @@ class SSLoader:
         if not self.current_file_path:
             raise ValueError("No file path set. Call load() first.")
             
-        module_bundle = self.executor.execute_module()
+        path, mtime, digest = self.executor.cache_key
+        cache_key = (self.use_sandbox, path)
+        module_bundle = None
+        if self.use_cache:
+            cached = _module_cache.get(cache_key)
+            if cached is not None and cached[0] == (mtime, digest):
+                module_bundle = cached[1]
+        if module_bundle is None:
+            module_bundle = self.executor.execute_module()
+            if module_bundle and self.use_cache:
+                _module_cache[cache_key] = ((mtime, digest), module_bundle)
         
         if module_bundle:
+            self.bundle = module_bundle
             self.callables = module_bundle.callables
             self.config = module_bundle.config
         else:
@@ -36,6 +57,13 @@ class SSLoader:
 
     # 准备调用目标函数
     def GetConfig(self, name: str) -> dict | None:
+        """以prepare模式执行函数，返回注册的参数配置
+
+        结果缓存在模块上，脚本不变时直接返回，不再重复执行。
+        """
+        if self.bundle is not None and name in self.bundle.prepared:
+            return self.bundle.prepared[name]
+
         callable = None
         for func, param_types, return_type in self.callables:
             if func.__name__ == name:
@@ -45,12 +73,65 @@ class SSLoader:
                 break
         
         if callable:
+            # 模块缓存时所有任务共用一个config，先清掉其他函数注册的参数
+            self.config.reset()
             self.config.set_prepared()
             params = {}
             for param in param_types:
                 params[param] = None
             callable(**params)
-            return self.config._config
+            # 缓存的结果不能和config共享，之后的执行会继续修改其中的参数
+            result = copy.deepcopy(self.config._config)
+            if self.bundle is not None:
+                self.bundle.prepared[name] = result
+            return result
+
+    def GetPlan(self, name: str) -> List[Tuple[str, List[Tuple[str, str]]]]:
+        """以prepare模式执行一遍函数，按顺序记录各节点用到的模型
+
+        返回[(节点名, [(函数参数名, 属性路径)])]，例如("SD1LatentDecode", [("model", "vae")])。
+        只记录直接来自函数参数的模型，结果缓存在模块上，脚本不变时不再重复执行。
+        """
+        if self.bundle is not None and name in self.bundle.plans:
+            return self.bundle.plans[name]
+
+        callable = None
+        for func, param_types, return_type in self.callables:
+            if func.__name__ == name:
+                callable = func
+                break
+        if callable is None:
+            return []
+
+        plan = []
+
+        def record(node: str, arguments: dict, uses: tuple):
+            targets = []
+            for path in uses:
+                root, _, attr = path.partition(".")
+                value = arguments.get(root)
+                if isinstance(value, PlanParam):
+                    targets.append((value.name, attr))
+            if targets:
+                plan.append((node, targets))
+
+        token = set_node_listener(record)
+        self.config.reset()
+        self.config.set_prepared()
+        try:
+            # 用占位对象代替参数，记录节点实际使用的是哪个参数
+            callable(**{param: PlanParam(param) for param in param_types})
+        except Exception as e:
+            # 记录失败只会失去预取，不影响执行
+            print(f"记录{name}的模型使用顺序失败: {e}")
+            plan = []
+        finally:
+            reset_node_listener(token)
+            self.config.reset()
+
+        if self.bundle is not None:
+            self.bundle.plans[name] = plan
+        return plan
 
     def Show(self):
         print(self.callables)
@@ -63,6 +144,15 @@ class SSLoader:
             print()
 
 
+class PlanParam:
+    """GetPlan中代替函数参数的占位对象"""
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return f"PlanParam({self.name})"
+
+
 class SSProject(BaseModel):
     path: str = Field(description="The path to the project")
     ssui_version: str = Field(description="The version of SSUI")
@@ -94,3 +184,20 @@ def search_project_root(path):
         path = os.path.dirname(path)
         if path == os.path.dirname(path):
             return None
+
+
+def script_requirements(script_path: str, package_capabilities: Dict[str, str]) -> List[str]:
+    """根据脚本导入的包得到执行它所需的执行器能力
+
+    package_capabilities为包名 -> 能力名，能力名与执行器detect_capabilities上报的扩展名一致
+    """
+    with open(script_path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=script_path)
+
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.add(node.module.split(".")[0])
+    return sorted({package_capabilities[m] for m in modules if m in package_capabilities})
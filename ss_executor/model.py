@@ -40,8 +40,9 @@ class Task(BaseModel):
     is_prepare: bool = Field(default=False, description="Whether the task is prepare-execution")
     
     use_sandbox: bool = Field(default=True, description="Whether to use a sandbox")
-    timeout: int = Field(default=300, description="The timeout for the task")
+    timeout: Optional[int] = Field(default=None, description="The timeout for the task in seconds, counted from when it starts executing; None means no limit")
     priority: int = Field(default=0, description="The priority of the task")
+    requirements: List[str] = Field(default_factory=list, description="The capabilities an executor must have to run the task")
     
     status: TaskStatus = Field(default=TaskStatus.PENDING, description="The status of the task")
     started_at: Optional[str] = Field(default=None, description="The time the task was started")
@@ -64,7 +65,18 @@ class TaskResult(BaseModel):
 class KillMessage(BaseModel):
     type: Literal["kill"] = Field(default="kill")
 
-ExeMessage = TypeAdapter(Annotated[Union[ExecutorRegister, RegisterResponse, UpdateStatus, Task, TaskResult, KillMessage], Field(discriminator="type")])
+class CancelTask(BaseModel):
+    type: Literal["cancel_task"] = Field(default="cancel_task")
+    task_id: str = Field(description="The id of the task to cancel")
+
+class TaskProgress(BaseModel):
+    type: Literal["task_progress"] = Field(default="task_progress")
+    task_id: str = Field(description="The id of the task")
+    step: int = Field(description="The current step")
+    total_steps: int = Field(description="The total number of steps")
+    preview: Optional[str] = Field(default=None, description="A downscaled preview image as a data url")
+
+ExeMessage = TypeAdapter(Annotated[Union[ExecutorRegister, RegisterResponse, UpdateStatus, Task, TaskResult, KillMessage, TaskProgress, CancelTask], Field(discriminator="type")])
 
 
 class ExecutorInfo:
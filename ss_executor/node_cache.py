@@ -0,0 +1,161 @@
+# node_cache.py
+import hashlib
+import json
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from backend.util.byte_lru_cache import ByteLRUCache
+
+# 结构化计算输入键时的最大嵌套深度，超过时认为输入无法识别
+_MAX_DEPTH = 8
+
+
+class NodeCache:
+    """节点结果的LRU缓存，由执行器进程持有，跨任务复用
+
+    键为(节点名, 配置段名, 用户修改的配置, 输入键)。修改下游节点的参数时，上游节点的输入和配置不变，
+    直接返回缓存的条件向量、latent等中间结果，只从第一个受影响的节点开始重新计算。
+    结果中的张量可能在显存上，所以除了条目数，还按结果中张量和图片的总大小限制缓存。
+    """
+
+    def __init__(self, max_entries: int = 32, max_bytes: int = 2**30):
+        self._cache: ByteLRUCache[Hashable, Any] = ByteLRUCache(max_bytes, max_entries=max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cur_bytes(self) -> int:
+        return self._cache.cur_bytes
+
+    def session(self) -> "NodeCacheSession":
+        """为一个任务创建会话，会话记录本任务中出现过的节点结果"""
+        return NodeCacheSession(self)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._cache.lock:
+            if key not in self._cache:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, self._cache.get(key)
+
+    def put(self, key: Hashable, value: Any):
+        # 超出预算的结果不缓存
+        self._cache.put(key, value, value_size(value))
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+def value_size(value: Any, depth: int = 0, seen: Optional[set] = None) -> int:
+    """估算节点结果中张量、数组和图片占用的字节数，同一个对象只计算一次
+
+    已加载的模型由模型缓存管理，不计入。
+    """
+    if depth > _MAX_DEPTH or value is None or isinstance(value, (bool, int, float, str)):
+        return 0
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if hasattr(value, "element_size") and hasattr(value, "nelement"):
+        return value.nelement() * value.element_size()
+    if isinstance(getattr(value, "nbytes", None), int):
+        return value.nbytes
+    if hasattr(value, "tobytes") and hasattr(value, "size") and hasattr(value, "getbands"):
+        width, height = value.size
+        return width * height * len(value.getbands())
+    if getattr(value, "_cache_record", None) is not None or type(value).__module__.split(".")[0] == "torch":
+        return 0
+
+    if isinstance(value, (list, tuple)):
+        items = value
+    elif isinstance(value, dict):
+        items = value.values()
+    else:
+        items = getattr(value, "__dict__", {}).values()
+    return sum(value_size(item, depth + 1, seen) for item in items)
+
+
+class NodeCacheSession:
+    """一个任务使用的节点缓存，由ssui.annotation.memoize调用
+
+    节点结果按对象身份记录它的键，下游节点以此识别输入；任务参数等其他输入按内容计算键。
+    """
+
+    def __init__(self, cache: NodeCache):
+        self.cache = cache
+        # id(结果) -> (结果, 键)，保留结果的引用，避免id被其他对象复用
+        self._known: Dict[int, Tuple[Any, Hashable]] = {}
+
+    def node_key(self, name: str, config: Any, args: tuple, kwargs: dict) -> Optional[Hashable]:
+        """计算节点调用的键，有无法识别的输入时返回None"""
+        section = config._current
+        overrides = json.dumps(config._update.get(section) or {}, sort_keys=True, default=repr)
+        inputs = self.input_key((args, tuple(sorted(kwargs.items()))))
+        if inputs is None:
+            return None
+        return (name, section, overrides, inputs)
+
+    def get_or_run(self, key: Hashable, run: Callable[[], Any]) -> Any:
+        found, result = self.cache.get(key)
+        if not found:
+            result = run()
+            self.cache.put(key, result)
+        self._remember(result, key)
+        return result
+
+    def _remember(self, value: Any, key: Hashable):
+        self._known[id(value)] = (value, ("node", key))
+        # 节点返回多个结果或一批结果时，每个结果分别作为下游节点的输入
+        if isinstance(value, (tuple, list)):
+            for i, item in enumerate(value):
+                self._remember(item, key + (i,))
+
+    def input_key(self, value: Any, depth: int = 0) -> Optional[Hashable]:
+        """按内容计算输入的键，节点结果直接使用它的键"""
+        if depth > _MAX_DEPTH:
+            return None
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return (type(value).__name__, value)
+
+        known = self._known.get(id(value))
+        if known is not None and known[0] is value:
+            return known[1]
+
+        if isinstance(value, (list, tuple)):
+            items = []
+            for item in value:
+                key = self.input_key(item, depth + 1)
+                if key is None:
+                    return None
+                items.append(key)
+            return (type(value).__name__, tuple(items))
+
+        # 已加载的模型用它在模型缓存中的键识别
+        cache_record = getattr(value, "_cache_record", None)
+        if cache_record is not None and hasattr(cache_record, "key"):
+            return ("loaded_model", cache_record.key)
+
+        if hasattr(value, "tobytes") and hasattr(value, "size") and hasattr(value, "mode"):
+            # PIL图片按像素内容识别
+            digest = hashlib.sha256(value.tobytes()).hexdigest()
+            return ("image", value.mode, tuple(value.size), digest)
+
+        # 张量等不是由节点产生的数据无法廉价识别，不缓存
+        if type(value).__module__.split(".")[0] in ("torch", "numpy"):
+            return None
+
+        attributes = getattr(value, "__dict__", None)
+        if attributes is None:
+            return None
+        items = []
+        for name, attribute in sorted(attributes.items()):
+            key = self.input_key(attribute, depth + 1)
+            if key is None:
+                return None
+            items.append((name, key))
+        return (type(value).__module__ + "." + type(value).__qualname__, tuple(items))
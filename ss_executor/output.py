@@ -0,0 +1,83 @@
+# output.py
+import datetime
+import io
+import json
+import os
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+from backend.image_util.pngwriter import build_pnginfo
+
+OUTPUT_FORMATS = {"png": "png", "webp": "webp", "jpeg": "jpg"}
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+@dataclass
+class SavedOutput:
+    path: str
+    media_type: str
+    data: bytes
+
+
+def unique_name(prefix: str, ext: str) -> str:
+    """生成不会冲突的文件名：时间戳便于排序，随机后缀保证同一时刻的多个输出不会重名"""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+    return f"{prefix}_{timestamp}_{uuid.uuid4().hex[:8]}.{ext}"
+
+
+class OutputWriter:
+    """在线程池中编码并保存结果图片
+
+    PIL在zlib压缩和WebP/JPEG编码时会释放GIL，所以一个批次的多张图片可以在线程中并行编码。
+    PNG写入与PngWriter相同的生成参数，压缩等级越低编码越快，文件越大。
+    """
+
+    def __init__(
+        self,
+        format: str = "png",
+        compress_level: int = 1,
+        quality: int = 90,
+        max_workers: Optional[int] = None,
+    ):
+        if format not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {format}，可选: {', '.join(OUTPUT_FORMATS)}")
+        self.format = format
+        self.compress_level = compress_level
+        self.quality = quality
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or min(4, os.cpu_count() or 1), thread_name_prefix="output"
+        )
+
+    def submit(self, image: Image.Image, output_dir: str, metadata: Optional[Dict[str, Any]] = None) -> Future:
+        """提交一张图片，返回SavedOutput的Future"""
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, unique_name("image", OUTPUT_FORMATS[self.format]))
+        return self._pool.submit(self._save, image, path, metadata)
+
+    def _save(self, image: Image.Image, path: str, metadata: Optional[Dict[str, Any]]) -> SavedOutput:
+        # 先编码到内存，写盘后编码结果还可以直接发送给服务器
+        buffer = io.BytesIO()
+        if self.format == "png":
+            pnginfo = build_pnginfo((metadata or {}).get("callable", ""), metadata)
+            image.save(buffer, "PNG", pnginfo=pnginfo, compress_level=self.compress_level)
+        elif self.format == "jpeg":
+            # JPEG不支持透明通道
+            image.convert("RGB").save(buffer, "JPEG", quality=self.quality)
+        else:
+            exif = Image.Exif()
+            if metadata:
+                # 0x010E: ImageDescription
+                exif[0x010E] = json.dumps(metadata)
+            image.save(buffer, "WEBP", quality=self.quality, method=0, exif=exif)
+
+        data = buffer.getvalue()
+        with open(path, "wb") as f:
+            f.write(data)
+        return SavedOutput(path=path, media_type=MEDIA_TYPES[self.format], data=data)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
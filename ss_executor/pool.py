@@ -0,0 +1,93 @@
+# pool.py
+import asyncio
+import os
+import subprocess
+import sys
+import traceback
+from typing import Dict, List, Optional
+
+
+def detect_executor_count() -> int:
+    """按GPU数量决定执行器进程数，没有GPU时只启动一个"""
+    try:
+        import torch
+
+        return max(1, torch.cuda.device_count())
+    except Exception:
+        return 1
+
+
+class ExecutorPool:
+    """执行器进程池，由服务器启动并维护多个执行器进程，每个进程绑定一张GPU"""
+
+    def __init__(
+        self,
+        count: int,
+        scheduler_url: str = "ws://localhost:5000/",
+        max_tasks: int = 1,
+        restart_delay: float = 3.0,
+    ):
+        self.count = count
+        self.scheduler_url = scheduler_url
+        self.max_tasks = max_tasks
+        self.restart_delay = restart_delay
+        self.processes: Dict[int, subprocess.Popen] = {}
+        self._monitor: Optional[asyncio.Task] = None
+        self._running = False
+
+    def _command(self) -> List[str]:
+        return [
+            sys.executable,
+            "-m",
+            "ss_executor",
+            "--scheduler-url",
+            self.scheduler_url,
+            "--max-tasks",
+            str(self.max_tasks),
+        ]
+
+    def _spawn(self, slot: int) -> subprocess.Popen:
+        """启动一个执行器进程，多GPU时通过CUDA_VISIBLE_DEVICES绑定到对应的GPU"""
+        env = os.environ.copy()
+        if self.count > 1 and detect_executor_count() >= self.count:
+            env["CUDA_VISIBLE_DEVICES"] = str(slot)
+        process = subprocess.Popen(self._command(), env=env)
+        print(f"执行器 {slot} 已启动, pid={process.pid}")
+        return process
+
+    async def start(self):
+        """启动所有执行器进程，并监控进程异常退出后重启"""
+        self._running = True
+        for slot in range(self.count):
+            self.processes[slot] = self._spawn(slot)
+        self._monitor = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while self._running:
+            await asyncio.sleep(self.restart_delay)
+            for slot, process in list(self.processes.items()):
+                if process.poll() is None or not self._running:
+                    continue
+                print(f"执行器 {slot} 已退出(返回码 {process.returncode})，正在重启")
+                try:
+                    self.processes[slot] = self._spawn(slot)
+                except Exception:
+                    print(f"重启执行器 {slot} 失败:\n{traceback.format_exc()}")
+
+    async def stop(self, timeout: float = 10.0):
+        """停止所有执行器进程"""
+        self._running = False
+        if self._monitor:
+            self._monitor.cancel()
+            self._monitor = None
+
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes.values():
+            try:
+                await asyncio.to_thread(process.wait, timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes.clear()
+        print("执行器进程池已停止")
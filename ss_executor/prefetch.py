@@ -0,0 +1,61 @@
+# prefetch.py
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+Plan = List[Tuple[str, List[Tuple[str, str]]]]
+
+
+def collect_prefetchable(value: Any) -> List[Any]:
+    """找出对象中可以预取的模型：自身或其属性带有prefetch方法的对象"""
+    if value is None:
+        return []
+    if callable(getattr(value, "prefetch", None)):
+        return [value]
+    return [v for v in getattr(value, "__dict__", {}).values() if callable(getattr(v, "prefetch", None))]
+
+
+class ModelPrefetcher:
+    """按SSLoader.GetPlan记录的节点顺序，在当前节点计算时后台预取下一个节点要用的模型"""
+
+    def __init__(self, plan: Plan, params: Dict[str, Any], pool: ThreadPoolExecutor):
+        self.plan = plan
+        self.params = params
+        self.pool = pool
+        self.cursor = 0
+
+    def start(self):
+        """在第一个节点执行前预取它的模型"""
+        if self.plan:
+            self._prefetch(self.plan[0][1])
+
+    def on_node(self, name: str, arguments: Dict[str, Any], uses: Tuple[str, ...]):
+        """节点开始执行时调用，预取计划中下一个节点的模型"""
+        for index in range(self.cursor, len(self.plan)):
+            if self.plan[index][0] == name:
+                self.cursor = index + 1
+                break
+        else:
+            return
+        if self.cursor < len(self.plan):
+            self._prefetch(self.plan[self.cursor][1])
+
+    def _prefetch(self, targets: List[Tuple[str, str]]):
+        models = []
+        for param, attr in targets:
+            value = self.params.get(param)
+            for part in attr.split(".") if attr else []:
+                value = getattr(value, part, None)
+            models.extend(collect_prefetchable(value))
+        if models:
+            self.pool.submit(self._run, models)
+
+    @staticmethod
+    def _run(models: List[Any]):
+        for model in models:
+            try:
+                model.prefetch()
+            except Exception:
+                logger.exception("预取模型失败")
@@ -2,13 +2,15 @@ from abc import ABC, abstractmethod
 
 import ast
 import builtins
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import hashlib
 import os
+import threading
 import importlib.util
 from importlib.machinery import SourceFileLoader
-from typing import Any, Dict, List, Literal, Optional, Callable, TYPE_CHECKING
+from typing import Any, Dict, List, Literal, Optional, Callable, Tuple, TYPE_CHECKING
 from RestrictedPython import compile_restricted, safe_builtins, utility_builtins
-from RestrictedPython.Guards import safer_getattr, guarded_unpack_sequence
+from RestrictedPython.Guards import guarded_unpack_sequence
 from RestrictedPython.PrintCollector import PrintCollector
 from RestrictedPython.transformer import RestrictingNodeTransformer
 
@@ -18,10 +20,29 @@ from ssui.config import SSUIConfig
 if TYPE_CHECKING:
     from ss_executor.loader import ModuleExecutor
 
+ScriptKey = Tuple[str, int, str]
+
+
+def script_cache_key(path: str, code: Optional[str] = None) -> ScriptKey:
+    """脚本的缓存键：绝对路径、修改时间和内容哈希"""
+    path = os.path.abspath(path)
+    if code is None:
+        with open(path, "r") as file:
+            code = file.read()
+    digest = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    return (path, os.stat(path).st_mtime_ns, digest)
+
+
 @dataclass
 class ModuleBundle:
     callables: List[Callable]
     config: SSUIConfig
+    # 模块的config是全局共享的，复用同一个模块的任务需要串行执行
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # 函数名 -> 节点使用模型的顺序，见SSLoader.GetPlan
+    plans: Dict[str, list] = field(default_factory=dict)
+    # 函数名 -> prepare阶段的结果，见SSLoader.GetConfig
+    prepared: Dict[str, dict] = field(default_factory=dict)
 
 class ModuleExecutor(ABC):
     """模块执行器的抽象基类，提供统一的接口来获取ModuleBundle"""
@@ -45,6 +66,10 @@ class Sandbox(ModuleExecutor):
     安全沙盒环境，用于执行受限制的Python代码，安全调用SSUI API。
     """
     debug = False
+    # 编译结果缓存：脚本路径 -> (缓存键, 编译结果)，脚本未修改时跳过compile_restricted
+    # 每个路径只保留最新的一份，脚本修改后旧的编译结果直接被替换
+    # 只保存在内存中：从磁盘读回的字节码无法确认是由compile_restricted生成的
+    _compiled_cache: Dict[str, Tuple[ScriptKey, Any]] = {}
 
     def __init__(self):
         """
@@ -59,6 +84,7 @@ class Sandbox(ModuleExecutor):
         self.module_name = None
         self.compiled_code = None
         self.global_vars = None
+        self.cache_key = None
 
     def _setup_restricted_globals(self):
         """设置受限制的全局环境"""
@@ -66,7 +92,8 @@ class Sandbox(ModuleExecutor):
         # 基础安全内置函数
 
         builtins_dict = safe_builtins.copy()
-        builtins_dict["_getattr_"] = self._safe_getattr
+        # 每次属性访问都会调用，只在调试时输出日志
+        builtins_dict["_getattr_"] = self._safe_getattr if self.debug else getattr
         self.restricted_globals = {
             "__builtins__": {
                 **builtins_dict,
@@ -88,9 +115,8 @@ class Sandbox(ModuleExecutor):
         }
 
     def _safe_getattr(self, obj, name):
-        """安全的获取属性"""
+        """安全的获取属性，调试时输出每次访问"""
         print('getattr', obj, name)
-
         return getattr(obj, name)
     
     def _safe_getiter(self, obj):
@@ -122,7 +148,8 @@ class Sandbox(ModuleExecutor):
         if first_part not in self.allowed_modules:
             raise ImportError(f"导入被拒绝: 模块 '{name}' 不在允许列表中")
         
-        print('imported', name)
+        if self.debug:
+            print('imported', name)
         # 使用标准导入
         if fromlist:
             module = importlib.import_module(name)
@@ -166,9 +193,15 @@ class Sandbox(ModuleExecutor):
         # 读取文件内容
         with open(self.module_path, "r") as file:
             code = file.read()
+        self.cache_key = script_cache_key(self.module_path, code)
             
         # 编译代码，允许注解
-        self.compiled_code = compile_restricted(code, filename=self.module_name, mode="exec", flags=0)
+        cached = Sandbox._compiled_cache.get(self.module_path)
+        if cached is not None and cached[0] == self.cache_key:
+            self.compiled_code = cached[1]
+        else:
+            self.compiled_code = compile_restricted(code, filename=self.module_name, mode="exec", flags=0)
+            Sandbox._compiled_cache[self.module_path] = (self.cache_key, self.compiled_code)
         if self.debug:
             parsed_ast = ast.parse(code)
             restricted_ast = RestrictingNodeTransformer().visit(parsed_ast)
@@ -194,7 +227,7 @@ class Sandbox(ModuleExecutor):
             reset_callables()
             exec(self.compiled_code, self.global_vars)
             return ModuleBundle(
-                callables=get_callables(),
+                callables=list(get_callables()),
                 config=self.global_vars.get("config")
             )
         except Exception as e:
@@ -220,6 +253,7 @@ class NoSandbox(ModuleExecutor):
     def __init__(self):
         self.module = None
         self.spec = None
+        self.cache_key = None
     
     def load(self, path: str) -> None:
         """加载模块"""
@@ -228,6 +262,8 @@ class NoSandbox(ModuleExecutor):
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Could not find module at: {file_path}")
         
+        self.cache_key = script_cache_key(file_path)
+
         # 定义模块名称和文件路径
         module_name = file_path.split("/")[-1].split(".")[0]
 
@@ -251,7 +287,7 @@ class NoSandbox(ModuleExecutor):
             self.spec.loader.exec_module(self.module)
             
             return ModuleBundle(
-                callables=get_callables(),
+                callables=list(get_callables()),
                 config=getattr(self.module, "config", None)
             )
         except Exception as e:
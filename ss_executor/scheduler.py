@@ -1,15 +1,19 @@
 # scheduler.py
 import asyncio
-from typing import Dict, List, Optional, Any, Union, Tuple
+import itertools
+from typing import Callable, Dict, List, Optional, Any, Union, Tuple
 from datetime import datetime
-from .model import KillMessage, Task, TaskStatus, ExecutorInfo, ExecutorRegister, RegisterResponse, UpdateStatus, TaskResult, ExeMessage
+from .transport import ResultCache, decode_file_frame
+from .model import CancelTask, KillMessage, Task, TaskProgress, TaskStatus, ExecutorInfo, ExecutorRegister, RegisterResponse, UpdateStatus, TaskResult, ExeMessage
 import websockets
 import traceback
 
+MAX_FRAME_SIZE = 512 * 1024 * 1024
+
 class TaskScheduler:
     """异步任务调度器，用于管理执行器连接和任务分配"""
     
-    def __init__(self):
+    def __init__(self, result_cache: Optional[ResultCache] = None):
         # 核心数据结构
         self.tasks: Dict[str, Task] = {}
         self.executors: Dict[str, ExecutorInfo] = {}
@@ -17,12 +21,18 @@ class TaskScheduler:
         
         # 异步组件
         self.task_queue = asyncio.PriorityQueue()
+        # 同优先级的任务按提交顺序出队
+        self._task_seq = itertools.count()
         self.lock = asyncio.Lock()
         self.server = None
         
         # 事件通知
         self.task_completion_events: Dict[str, asyncio.Event] = {}
+        # 任务进度回调
+        self.progress_callbacks: Dict[str, Callable[[TaskProgress], None]] = {}
         self.all_tasks_completion_event = asyncio.Event()
+        # 执行器通过二进制帧发送的结果文件，服务器优先从这里读取
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
         
 
     async def start(self):
@@ -32,7 +42,9 @@ class TaskScheduler:
             self.server = await websockets.serve(
                 self.handle_executor_connection, 
                 "localhost", 
-                5000
+                5000,
+                # 结果文件通过二进制帧发送，默认1MB的消息上限放不下
+                max_size=MAX_FRAME_SIZE,
             )
             print("任务调度器已启动")
           
@@ -103,6 +115,8 @@ class TaskScheduler:
             host=websocket.remote_address[0],
             port=websocket.remote_address[1],
         )
+        # 收到注册消息之前不分配任务
+        executor.is_active = False
         
         self.executors[executor_id] = executor
         self.executor_websockets[executor_id] = websocket
@@ -110,18 +124,42 @@ class TaskScheduler:
     async def _process_messages(self, executor_id: str, websocket: websockets.ClientConnection):
         """处理来自执行器的消息"""
         async for message in websocket:
+            if isinstance(message, bytes):
+                self._handle_file_frame(message)
+                continue
             try:
                 exe_message = ExeMessage.validate_json(message)
                 await self._process_executor_message(executor_id, exe_message)
             except Exception as e:
                 print(f"处理消息失败: {e}")
 
+    def _handle_file_frame(self, frame: bytes):
+        """缓存执行器发送的结果文件，帧总是在对应的TaskResult之前到达"""
+        try:
+            path, media_type, data = decode_file_frame(frame)
+            self.result_cache.put(path, data, media_type)
+        except Exception as e:
+            print(f"处理结果文件失败: {e}")
+
     async def _cleanup_connection(self, executor_id: str):
         """清理执行器连接"""
         if executor_id in self.executor_websockets:
             del self.executor_websockets[executor_id]
         if executor_id in self.executors:
             self.executors[executor_id].is_active = False
+            self.executors[executor_id].current_tasks = 0
+
+        # 断开的执行器上正在运行的任务直接标记为失败，避免调用方永久等待
+        for task in self.tasks.values():
+            if task.executor_id == executor_id and task.status == TaskStatus.RUNNING:
+                task.status = TaskStatus.FAILED
+                task.error = f"执行器 {executor_id} 已断开连接"
+                task.completed_at = str(datetime.now())
+                task.executor_id = None
+                if task.task_id in self.task_completion_events:
+                    self.task_completion_events[task.task_id].set()
+        await self._check_all_tasks_completion()
+        self._dispatch_pending()
 
     def add_task(self, task: Task) -> str:
         """添加新任务"""
@@ -132,21 +170,48 @@ class TaskScheduler:
         if self._try_assign_task(task):
             print(f"任务 {task.task_id} 已立即分配给执行器")
         else:
-            asyncio.create_task(self.task_queue.put((-task.priority, task.task_id)))
+            self._enqueue_task(task)
             print(f"任务 {task.task_id} 已加入队列")
         
         return task.task_id
 
-    async def run_task(self, task: Task):
+    async def run_task(self, task: Task, progress_callback: Optional[Callable[[TaskProgress], None]] = None):
         """运行任务"""
-        self.add_task(task)
-        task = await self.wait_until_finished(task.task_id)
+        task_id = task.task_id
+        if progress_callback:
+            self.progress_callbacks[task_id] = progress_callback
+        try:
+            self.add_task(task)
+            task = await self.wait_until_finished(task_id)
+        finally:
+            self.progress_callbacks.pop(task_id, None)
         if task.status == TaskStatus.FAILED:
             return {"error": task.error}
         if task.status == TaskStatus.CANCELLED:
             return {"cancelled": True}
         return task.result
 
+    async def cancel_task(self, task_id: str) -> bool:
+        """取消任务：排队中的任务直接取消，执行中的任务通知执行器在下一个安全点停止"""
+        task = self.tasks.get(task_id)
+        if task is None or task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
+            return False
+
+        async with self.lock:
+            websocket = self.executor_websockets.get(task.executor_id) if task.executor_id else None
+            if task.status == TaskStatus.RUNNING and websocket:
+                try:
+                    await websocket.send(CancelTask(task_id=task_id).model_dump_json())
+                except Exception as e:
+                    print(f"发送取消消息失败: {e}")
+            # 执行器的容量在收到任务结果后释放
+            task.status = TaskStatus.CANCELLED
+            task.completed_at = str(datetime.now())
+            print(f"任务 {task_id} 已取消")
+            await self._set_task_completion_event(task_id)
+            await self._check_all_tasks_completion()
+        return True
+
     def get_task(self, task_id: str) -> Optional[Task]:
         """获取任务信息"""
         return self.tasks.get(task_id)
@@ -164,7 +229,7 @@ class TaskScheduler:
         if task.status != TaskStatus.PENDING:
             return False
         
-        executor, websocket = self._find_available_executor()
+        executor, websocket = self._find_available_executor(task)
         if not executor or not websocket:
             return False
         
@@ -177,19 +242,41 @@ class TaskScheduler:
             self._revert_task_assignment(task, executor)
             return False
 
-    def _find_available_executor(self) -> Tuple[Optional[ExecutorInfo], Optional[websockets.ClientConnection]]:
-        """查找可用的执行器"""
+    def _find_available_executor(self, task: Task) -> Tuple[Optional[ExecutorInfo], Optional[websockets.ClientConnection]]:
+        """查找满足任务能力要求且负载最低的执行器"""
+        best: Optional[ExecutorInfo] = None
         for executor_id, executor in self.executors.items():
-            is_active = executor.is_active
-            has_capacity = executor.current_tasks < executor.max_tasks
-            
-            print(f"执行器 {executor_id} 状态: 活动={is_active}, 容量={has_capacity}")
-            
-            if is_active and has_capacity:
-                return executor, self.executor_websockets.get(executor_id)
-        
-        print("没有可用的执行器")
-        return None, None
+            if not executor.is_active or executor.current_tasks >= executor.max_tasks:
+                continue
+            if executor_id not in self.executor_websockets:
+                continue
+            if not all(req in executor.capabilities for req in task.requirements):
+                continue
+            if best is None or executor.current_tasks / executor.max_tasks < best.current_tasks / best.max_tasks:
+                best = executor
+
+        if best is None:
+            return None, None
+        return best, self.executor_websockets[best.executor_id]
+
+    def _enqueue_task(self, task: Task):
+        """将任务放回优先级队列"""
+        self.task_queue.put_nowait((-task.priority, next(self._task_seq), task.task_id))
+
+    def _dispatch_pending(self):
+        """将队列中的任务分配给空闲的执行器，无法分配的任务保持原有顺序放回队列"""
+        waiting = []
+        while not self.task_queue.empty():
+            entry = self.task_queue.get_nowait()
+            task = self.tasks.get(entry[2])
+            if task is None or task.status != TaskStatus.PENDING:
+                continue
+            if self._try_assign_task(task):
+                print(f"任务 {task.task_id} 已分配给执行器 {task.executor_id}")
+            else:
+                waiting.append(entry)
+        for entry in waiting:
+            self.task_queue.put_nowait(entry)
 
     def _update_task_and_executor_status(self, task: Task, executor: ExecutorInfo):
         """更新任务和执行器状态"""
@@ -205,7 +292,7 @@ class TaskScheduler:
         task.executor_id = None
         executor.current_tasks = max(0, executor.current_tasks - 1)
 
-    async def _process_executor_message(self, executor_id: str, message: Union[ExecutorRegister, RegisterResponse, UpdateStatus, TaskResult]):
+    async def _process_executor_message(self, executor_id: str, message: Union[ExecutorRegister, RegisterResponse, UpdateStatus, TaskResult, TaskProgress]):
         """处理来自执行器的消息"""
         async with self.lock:
             if executor_id not in self.executors:
@@ -214,37 +301,44 @@ class TaskScheduler:
             executor = self.executors[executor_id]
             
             if isinstance(message, ExecutorRegister):
-                await self._handle_executor_register(executor_id)
+                await self._handle_executor_register(executor_id, message)
             elif isinstance(message, UpdateStatus):
                 await self._handle_status_update(message)
             elif isinstance(message, TaskResult):
                 await self._handle_task_result(message, executor)
+            elif isinstance(message, TaskProgress):
+                self._handle_task_progress(message)
 
-    async def _handle_executor_register(self, executor_id: str):
+    async def _handle_executor_register(self, executor_id: str, message: ExecutorRegister):
         """处理执行器注册"""
+        executor = self.executors[executor_id]
+        executor.max_tasks = max(1, message.max_tasks)
+        executor.capabilities = list(message.capabilities)
+        executor.is_active = True
+
         register_response = RegisterResponse(
             status="success",
             message="注册成功"
         )
         await self.executor_websockets[executor_id].send(register_response.model_dump_json())
-        print(f"执行器 {executor_id} 已注册")
+        print(f"执行器 {executor_id} 已注册, 最大任务数={executor.max_tasks}, 能力={executor.capabilities}")
         
-        if self.task_queue.qsize() > 0:
-            priority, task_id = await self.task_queue.get()
-            print(f"尝试分配任务 {task_id}")
-            self._try_assign_task(self.tasks[task_id])
+        self._dispatch_pending()
 
     async def _handle_status_update(self, message: UpdateStatus):
         """处理状态更新"""
         task_id = message.task_id
-        if task_id in self.tasks:
+        if task_id in self.tasks and self.tasks[task_id].status != TaskStatus.CANCELLED:
             self.tasks[task_id].status = message.status
-            
-            # 如果任务状态更新为RUNNING，尝试分配队列中的下一个任务
-            if message.status == TaskStatus.RUNNING and self.task_queue.qsize() > 0:
-                priority, next_task_id = await self.task_queue.get()
-                print(f"状态更新触发：尝试分配任务 {next_task_id}")
-                self._try_assign_task(self.tasks[next_task_id])
+
+    def _handle_task_progress(self, message: TaskProgress):
+        """转发任务进度"""
+        callback = self.progress_callbacks.get(message.task_id)
+        if callback:
+            try:
+                callback(message)
+            except Exception:
+                print(f"处理任务进度失败:\n{traceback.format_exc()}")
 
     async def _handle_task_result(self, message: TaskResult, executor: ExecutorInfo):
         """处理任务结果"""
@@ -253,12 +347,29 @@ class TaskScheduler:
             return
             
         task = self.tasks[task_id]
+        if task.status == TaskStatus.CANCELLED:
+            # 调度器已经取消的任务，只需要释放执行器的容量
+            await self._handle_cancelled_task(task, executor)
+            return
         task.status = message.status
         
         if message.status == TaskStatus.COMPLETED:
             await self._handle_completed_task(task, message, executor)
         elif message.status == TaskStatus.FAILED:
             await self._handle_failed_task(task, message, executor)
+        elif message.status == TaskStatus.CANCELLED:
+            await self._handle_cancelled_task(task, executor)
+
+    async def _handle_cancelled_task(self, task: Task, executor: ExecutorInfo):
+        """处理已停止的取消任务"""
+        if task.executor_id == executor.executor_id:
+            task.executor_id = None
+            executor.current_tasks = max(0, executor.current_tasks - 1)
+        task.completed_at = task.completed_at or str(datetime.now())
+        print(f"任务 {task.task_id} 已在执行器 {executor.executor_id} 上停止")
+
+        await self._set_task_completion_event(task.task_id)
+        await self._check_all_tasks_completion()
 
     async def _handle_completed_task(self, task: Task, message: TaskResult, executor: ExecutorInfo):
         """处理完成的任务"""
@@ -286,11 +397,8 @@ class TaskScheduler:
         """设置任务完成事件"""
         if task_id in self.task_completion_events:
             self.task_completion_events[task_id].set()
-        # 如何还有其他任务
-        if self.task_queue.qsize() > 0:
-            priority, task_id = await self.task_queue.get()
-            print(f"尝试分配任务 {task_id}")
-            self._try_assign_task(self.tasks[task_id])
+        # 执行器有空闲容量，分配队列中的其他任务
+        self._dispatch_pending()
 
     async def _check_all_tasks_completion(self):
         """检查是否所有任务都已完成"""
@@ -0,0 +1,70 @@
+# transport.py
+import json
+import struct
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# 二进制帧格式：4字节大端的头部长度 + JSON头部 + 文件内容
+_HEADER_SIZE = struct.Struct(">I")
+
+
+def encode_file_frame(path: str, media_type: str, data: bytes) -> bytes:
+    """把结果文件打包成一个二进制帧，在TaskResult之前通过同一个websocket发送"""
+    header = json.dumps({"path": path, "media_type": media_type}).encode("utf-8")
+    return _HEADER_SIZE.pack(len(header)) + header + data
+
+
+def decode_file_frame(frame: bytes) -> Tuple[str, str, memoryview]:
+    """解析二进制帧，返回(路径, 媒体类型, 文件内容)，文件内容不复制"""
+    view = memoryview(frame)
+    (header_size,) = _HEADER_SIZE.unpack_from(view)
+    start = _HEADER_SIZE.size
+    header = json.loads(bytes(view[start : start + header_size]))
+    return header["path"], header["media_type"], view[start + header_size :]
+
+
+class ResultCache:
+    """最近任务结果文件的内存LRU缓存，按路径索引，总大小不超过max_bytes
+
+    服务器读取结果文件时先查这里，未命中再读磁盘。
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[memoryview, str]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, path: str, data: memoryview, media_type: str):
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[path] = (data, media_type)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get(self, path: str) -> Optional[Tuple[memoryview, str]]:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
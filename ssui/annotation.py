@@ -1,6 +1,7 @@
 import functools
 import inspect
 from .config import SSUIConfig
+from .progress import check_canceled, get_node_cache, notify_node
 
 callables = []
 
@@ -34,6 +35,8 @@ def param(name, controler, default=None):
         if inspect.isfunction(target):
             @functools.wraps(target)
             def wrapper(config: SSUIConfig, *args, **kwargs):
+                # 每个节点执行前检查任务是否已取消
+                check_canceled()
                 if name not in config:
                     config.register(name, {
                         "controler": controler.__class__.__name__,
@@ -46,6 +49,7 @@ def param(name, controler, default=None):
         elif inspect.isclass(target):
             original_init = target.__init__
             def new_init(self, config: SSUIConfig, *args, **kwargs):    
+                check_canceled()
                 if name not in config:
                     config.register(name, {
                         "controler": controler.__class__.__name__,
@@ -57,4 +61,38 @@ def param(name, controler, default=None):
             return target
         raise ValueError("Unsupported target type")
 
-    return decorator
\ No newline at end of file
+    return decorator
+
+def uses(*paths: str):
+    """声明节点会用到的模型，如@uses("model.vae")表示使用参数model的vae属性
+
+    执行器在prepare阶段记录各节点的使用顺序，执行时在当前节点计算的同时预取下一个节点的模型
+    """
+    def decorator(target):
+        signature = inspect.signature(target)
+
+        @functools.wraps(target)
+        def wrapper(*args, **kwargs):
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            notify_node(target.__name__, arguments, paths)
+            return target(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+def memoize(target):
+    """节点结果按(节点名, 输入, 配置)缓存，再次执行时输入和配置都没变就直接返回上次的结果
+
+    缓存由执行器通过set_node_cache提供；没有缓存、prepare阶段或输入无法识别时照常执行。
+    节点不能修改输入，也不能依赖输入和配置之外的状态。
+    """
+    @functools.wraps(target)
+    def wrapper(config: SSUIConfig, *args, **kwargs):
+        cache = get_node_cache()
+        if cache is None or config.is_prepare():
+            return target(config, *args, **kwargs)
+        key = cache.node_key(f"{target.__module__}.{target.__qualname__}", config, args, kwargs)
+        if key is None:
+            return target(config, *args, **kwargs)
+        return cache.get_or_run(key, lambda: target(config, *args, **kwargs))
+    return wrapper
@@ -16,15 +16,11 @@ class SSUIConfig:
     
     def __getitem__(self, name):
         if self.is_prepare():
-            print('getitem prepare: ', self._current, name)
             return self._config[self._current][name]
         else:
             if self._update.get(self._current) is not None:
                 if self._update[self._current].get(name) is not None:
-                    print('getitem update: ', self._update[self._current][name])
                     return self._update[self._current][name]
-            print(self._config[self._current])
-            print('getitem default: ', self._config[self._current][name]['default'])
             return self._config[self._current][name]['default']
     
     def __contains__(self, name):
@@ -52,4 +48,14 @@ class SSUIConfig:
         return self._is_prepare
     
     def set_prepared(self, is_prepare: bool = True):
-        self._is_prepare = is_prepare
\ No newline at end of file
+        self._is_prepare = is_prepare
+
+    def reset(self):
+        """清除上一次执行留下的状态，包括已注册的参数
+
+        参数在节点执行时按需重新注册，保留下来会让其他函数的参数混进本次的配置
+        """
+        self._is_prepare = False
+        self._config = {}
+        self._update = {}
+        self._current = None
\ No newline at end of file
@@ -0,0 +1,96 @@
+import contextvars
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import PIL.Image
+
+# 上报函数的参数：当前步数、总步数、按需生成预览图的函数
+ProgressReporter = Callable[[int, int, Optional[Callable[[], PIL.Image.Image]]], None]
+
+_reporter: contextvars.ContextVar[Optional[ProgressReporter]] = contextvars.ContextVar(
+    "ssui_progress_reporter", default=None
+)
+
+
+def set_progress_reporter(reporter: Optional[ProgressReporter]) -> contextvars.Token:
+    """设置当前上下文的进度上报函数，由执行器在运行任务前调用"""
+    return _reporter.set(reporter)
+
+
+def reset_progress_reporter(token: contextvars.Token):
+    _reporter.reset(token)
+
+
+_cancel_check: contextvars.ContextVar[Optional[Callable[[], bool]]] = contextvars.ContextVar(
+    "ssui_cancel_check", default=None
+)
+
+
+class TaskCanceledError(Exception):
+    """任务被取消或超时"""
+
+
+def set_cancel_check(check: Optional[Callable[[], bool]]) -> contextvars.Token:
+    """设置当前上下文的取消检查函数，由执行器在运行任务前调用"""
+    return _cancel_check.set(check)
+
+
+def reset_cancel_check(token: contextvars.Token):
+    _cancel_check.reset(token)
+
+
+def is_canceled() -> bool:
+    check = _cancel_check.get()
+    return check is not None and check()
+
+
+def check_canceled():
+    """任务已取消时抛出TaskCanceledError，供节点和去噪循环在安全点调用"""
+    if is_canceled():
+        raise TaskCanceledError()
+
+
+def report_progress(step: int, total_steps: int, preview: Optional[Callable[[], PIL.Image.Image]] = None):
+    """上报任务进度，预览图只有在需要发送时才会生成"""
+    reporter = _reporter.get()
+    if reporter is not None:
+        reporter(step, total_steps, preview)
+
+
+# 节点监听函数的参数：节点名、节点的实参、节点使用的模型路径(如"model.vae")
+NodeListener = Callable[[str, Dict[str, Any], Tuple[str, ...]], None]
+
+_node_listener: contextvars.ContextVar[Optional[NodeListener]] = contextvars.ContextVar(
+    "ssui_node_listener", default=None
+)
+
+
+def set_node_listener(listener: Optional[NodeListener]) -> contextvars.Token:
+    """设置当前上下文的节点监听函数，执行器用它记录和跟踪节点的执行顺序"""
+    return _node_listener.set(listener)
+
+
+def reset_node_listener(token: contextvars.Token):
+    _node_listener.reset(token)
+
+
+def notify_node(name: str, arguments: Dict[str, Any], uses: Tuple[str, ...]):
+    """通知节点即将执行"""
+    listener = _node_listener.get()
+    if listener is not None:
+        listener(name, arguments, uses)
+
+
+_node_cache: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar("ssui_node_cache", default=None)
+
+
+def set_node_cache(cache: Optional[Any]) -> contextvars.Token:
+    """设置当前上下文的节点结果缓存，见ss_executor.node_cache.NodeCacheSession"""
+    return _node_cache.set(cache)
+
+
+def reset_node_cache(token: contextvars.Token):
+    _node_cache.reset(token)
+
+
+def get_node_cache() -> Optional[Any]:
+    return _node_cache.get()
@@ -26,6 +26,59 @@ class TestSD1(unittest.TestCase):
         image = SD1LatentDecode(self.config("Latent to Image"), self.model, latent)
         image._image.save("result2.png")
 
+    def test_batch_workflow(self):
+        from ssui_image.SD1 import (
+            SD1Clip, SD1Latent, 
+            SD1Denoise, SD1LatentDecodeBatch
+        )
+        positive, negative = SD1Clip(self.config("Prompt To Condition"), self.model, self.positive, self.negative)
+        latent = SD1Latent(self.config("Create Empty Latent"))
+        self.config("Denoise")["batch_size"] = 4
+        latent = SD1Denoise(self.config("Denoise"), self.model, latent, positive, negative)
+        self.assertEqual(latent.tensor.tensor.shape[0], 4)
+        images = SD1LatentDecodeBatch(self.config("Latent to Image"), self.model, latent)
+        self.assertEqual(len(images), 4)
+        for i, image in enumerate(images):
+            image._image.save(f"result_batch_{i}.png")
+
+    def test_img2img(self):
+        """图生图从图片编码的latent开始去噪：强度为0时原样返回，强度小于1时结果与文生图不同"""
+        import torch
+        from PIL import Image as PILImage
+        from ssui.base import Image
+        from ssui_image.SD1 import SD1Clip, SD1Latent, SD1Denoise
+
+        positive, negative = SD1Clip(self.config("Prompt To Condition"), self.model, self.positive, self.negative)
+        latent = SD1Latent.from_image(Image(PILImage.new("RGB", (512, 512), (200, 80, 40))), self.model)
+        self.config("Denoise")["steps"] = 10
+        self.config("Denoise")["strength"] = 0.0
+        unchanged = SD1Denoise(self.config("Denoise"), self.model, latent, positive, negative)
+        self.assertTrue(torch.allclose(unchanged.tensor.tensor.float(), latent.tensor.tensor.float(), atol=1e-2))
+
+        self.config("Denoise")["strength"] = 0.5
+        img2img = SD1Denoise(self.config("Denoise"), self.model, latent, positive, negative).tensor.tensor
+        txt2img = SD1Denoise(self.config("Denoise"), self.model, SD1Latent(self.config("Create Empty Latent")), positive, negative).tensor.tensor
+        self.assertFalse(torch.allclose(img2img.float(), txt2img.float(), atol=1e-2))
+
+    def test_batch_matches_single_seed(self):
+        """批量生成的第i个样本与单独使用第i个种子生成的结果一致，包括每一步都加噪声的SDE采样器"""
+        import torch
+        from ssui_image.SD1 import SD1Clip, SD1Latent, SD1Denoise
+
+        positive, negative = SD1Clip(self.config("Prompt To Condition"), self.model, self.positive, self.negative)
+        latent = SD1Latent(self.config("Create Empty Latent"))
+        for scheduler in ("euler_a", "dpmpp_sde"):
+            self.config("Denoise")["scheduler"] = scheduler
+            self.config("Denoise")["steps"] = 10
+            self.config("Denoise")["seed"] = 1000
+            self.config("Denoise")["batch_size"] = 2
+            batch = SD1Denoise(self.config("Denoise"), self.model, latent, positive, negative).tensor.tensor
+            self.config("Denoise")["batch_size"] = 1
+            for i in range(2):
+                self.config("Denoise")["seed"] = 1000 + i
+                single = SD1Denoise(self.config("Denoise"), self.model, latent, positive, negative).tensor.tensor
+                self.assertTrue(torch.allclose(batch[i:i + 1].float(), single.float(), atol=1e-2), scheduler)
+
 
 @unittest.skipIf(not should_run_slow_tests(), "Skipping slow test")
 class TestSDXL(unittest.TestCase):
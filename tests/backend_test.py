@@ -147,3 +147,516 @@ class TestBackend(unittest.TestCase):
             positive="a beautiful girl in a red dress",
             negative="a bad image",
         )
+
+class TestModelHash(unittest.TestCase):
+    def test_hash_is_memoized_by_fingerprint(self):
+        import os
+        import tempfile
+        from backend.model_hash.model_hash import ModelHash, model_fingerprint
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model_path = Path(temp_dir) / "model.safetensors"
+            model_path.write_bytes(b"weights")
+            fingerprint = model_fingerprint(model_path)
+            first = ModelHash().hash(model_path)
+            self.assertEqual(ModelHash().hash(model_path), first)
+            self.assertEqual(model_fingerprint(model_path), fingerprint)
+
+            model_path.write_bytes(b"other weights")
+            stat = model_path.stat()
+            os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            self.assertNotEqual(model_fingerprint(model_path), fingerprint)
+            self.assertNotEqual(ModelHash().hash(model_path), first)
+
+
+class TestConditioningCache(unittest.TestCase):
+    def test_lru_and_disk_spill(self):
+        import tempfile
+        import torch
+        from ssui_image.api.embedding_cache import ConditioningCache
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ConditioningCache(max_entries=1, cache_dir=temp_dir)
+            calls = []
+
+            def encode(prompt):
+                calls.append(prompt)
+                return torch.full((1, 2), float(len(prompt)))
+
+            first = cache.get_or_create("a cat", lambda: encode("a cat"))
+            self.assertIs(cache.get_or_create("a cat", lambda: encode("a cat")), first)
+            # 超出容量后旧条目写入磁盘，再次请求时从磁盘读取而不重新编码
+            cache.get_or_create("a dog!", lambda: encode("a dog!"))
+            reloaded = cache.get_or_create("a cat", lambda: encode("a cat"))
+            self.assertTrue(torch.equal(reloaded, first))
+            self.assertEqual(calls, ["a cat", "a dog!"])
+            self.assertEqual(cache.misses, 2)
+
+    def test_disk_round_trip(self):
+        """设置缓存目录后，新的缓存实例（例如重启后的执行器）直接从磁盘读取编码结果"""
+        import tempfile
+        import torch
+        from ssui_image.api.embedding_cache import ConditioningCache
+
+        embeds, pooled = torch.randn(1, 77, 8), torch.randn(1, 8)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ConditioningCache(max_entries=1)
+            cache.set_cache_dir(temp_dir)
+            cache.get_or_create(("clip", "a cat"), lambda: (embeds, pooled))
+            cache.get_or_create(("clip", "a dog"), lambda: (embeds, None))
+
+            restarted = ConditioningCache(max_entries=1, cache_dir=temp_dir)
+            reloaded = restarted.get_or_create(("clip", "a cat"), lambda: self.fail("不应重新编码"))
+            self.assertTrue(torch.equal(reloaded[0], embeds))
+            self.assertTrue(torch.equal(reloaded[1], pooled))
+            self.assertEqual(restarted.misses, 0)
+
+
+class TestVAETiling(unittest.TestCase):
+    def test_choose_tile_size(self):
+        from ssui_image.api.denoise import (
+            VAE_DECODE_SCALING_CONSTANT,
+            choose_vae_tile_size,
+            estimate_vae_working_memory,
+        )
+
+        budget = 3 * 2**30
+        # 常规分辨率整图解码，不分块
+        self.assertEqual(choose_vae_tile_size(1024, 1024, 1, 2, VAE_DECODE_SCALING_CONSTANT, budget), 0)
+        # 4K输出分块，每块都在预算内
+        tile_size = choose_vae_tile_size(3840, 3840, 1, 2, VAE_DECODE_SCALING_CONSTANT, budget)
+        self.assertGreaterEqual(tile_size, 512)
+        self.assertEqual(tile_size % 64, 0)
+        self.assertLessEqual(estimate_vae_working_memory(tile_size, tile_size, 1, 2, VAE_DECODE_SCALING_CONSTANT), budget)
+
+    def test_chunk_large_batch(self):
+        from ssui_image.api.denoise import (
+            VAE_DECODE_SCALING_CONSTANT,
+            choose_vae_chunk_size,
+            choose_vae_tile_size,
+            estimate_vae_working_memory,
+        )
+
+        budget = 3 * 2**30
+        # 能放下的批次一次解码
+        self.assertEqual(choose_vae_chunk_size(512, 512, 4, 2, VAE_DECODE_SCALING_CONSTANT, budget), 4)
+        # 16张1024的图，即使用最小的分块也超出预算，按样本分批解码
+        chunk_size = choose_vae_chunk_size(1024, 1024, 16, 2, VAE_DECODE_SCALING_CONSTANT, budget)
+        self.assertGreaterEqual(chunk_size, 1)
+        self.assertLess(chunk_size, 16)
+        tile_size = choose_vae_tile_size(1024, 1024, chunk_size, 2, VAE_DECODE_SCALING_CONSTANT, budget)
+        self.assertLessEqual(
+            estimate_vae_working_memory(tile_size or 1024, tile_size or 1024, chunk_size, 2, VAE_DECODE_SCALING_CONSTANT),
+            budget,
+        )
+        # 预算连一个样本都放不下时仍然每次解码一个
+        self.assertEqual(choose_vae_chunk_size(1024, 1024, 16, 2, VAE_DECODE_SCALING_CONSTANT, 1), 1)
+
+
+@unittest.skipIf(not should_run_slow_tests(), "Skipping slow test")
+class TestPartialLoading(unittest.TestCase):
+    def flux_steps_per_second(self, settings, steps: int = 8) -> float:
+        import time
+        import torch
+        from backend.model_manager import SubModelType
+        from backend.stable_diffusion.diffusion.conditioning_data import FLUXConditioningInfo
+        from ssui_image.api.denoise import flux_denoise_image
+        from ssui_image.api.model import FluxModel, ModelLoaderService, create_model_cache
+        from tests.utils import download_if_needed
+
+        model_path = download_if_needed("flux", "model")
+        service = ModelLoaderService(create_model_cache(settings))
+        config = service.probe(model_path)
+        transformer = service.load_model(
+            config.model_copy(update={"submodel_type": SubModelType.Transformer}), SubModelType.Transformer
+        )
+        # 只测量去噪速度，文本编码结果用随机张量代替
+        conditioning = FLUXConditioningInfo(clip_embeds=torch.randn(1, 768), t5_embeds=torch.randn(1, 256, 4096))
+        model = FluxModel(transformer=transformer)
+        flux_denoise_image(model, conditioning, steps=1)
+
+        start = time.perf_counter()
+        flux_denoise_image(model, conditioning, steps=steps)
+        return steps / (time.perf_counter() - start)
+
+    def test_flux_partial_vs_full_load(self):
+        import torch
+        from ssui_image.api.model import ModelCacheSettings
+
+        if not torch.cuda.is_available():
+            self.skipTest("分批加载只在CUDA设备上生效")
+        # 12GB显卡：9GB用于模型缓存，3GB留给推理中间结果
+        partial = self.flux_steps_per_second(
+            ModelCacheSettings(enable_partial_loading=True, device_working_mem_gb=3, max_vram_cache_gb=9)
+        )
+        full = self.flux_steps_per_second(ModelCacheSettings(enable_partial_loading=False))
+        print(f"Flux 分批加载(12GB): {partial:.2f} steps/s, 整体加载: {full:.2f} steps/s")
+        self.assertGreater(partial, 0)
+
+
+class TestCachedModelWithPartialLoad(unittest.TestCase):
+    def build_model(self, num_blocks: int, hidden: int):
+        import torch
+        from backend.model_manager.load.model_cache.torch_module_autocast.torch_module_autocast import (
+            apply_custom_layers_to_model,
+        )
+
+        # meta设备上的张量不分配内存，只保留形状，可以快速构造大模型大小的state dict
+        def block():
+            return torch.nn.ModuleDict(
+                {
+                    "norm": torch.nn.LayerNorm(hidden, device="meta"),
+                    "attn": torch.nn.ModuleList(torch.nn.Linear(hidden, hidden, device="meta") for _ in range(4)),
+                    "mlp": torch.nn.ModuleList(
+                        [torch.nn.Linear(hidden, hidden * 4, device="meta"), torch.nn.Linear(hidden * 4, hidden, device="meta")]
+                    ),
+                }
+            )
+
+        model = torch.nn.ModuleDict({"blocks": torch.nn.ModuleList(block() for _ in range(num_blocks))})
+        apply_custom_layers_to_model(model)
+        return model
+
+    def test_wrap_time(self):
+        import time
+        import torch
+        from backend.model_manager.load.model_cache.cached_model.cached_model_with_partial_load import (
+            CachedModelWithPartialLoad,
+        )
+
+        # 按SD1、SDXL、Flux的参数数量量级构造模型
+        for name, num_blocks, hidden in [("sd1", 32, 320), ("sdxl", 96, 640), ("flux", 300, 3072)]:
+            model = self.build_model(num_blocks, hidden)
+            start = time.perf_counter()
+            cached_model = CachedModelWithPartialLoad(model, torch.device("cpu"))
+            elapsed = time.perf_counter() - start
+            print(f"{name}: {len(model.state_dict())} keys, wrap {elapsed * 1000:.1f} ms")
+
+            # 只有LayerNorm不支持autocast
+            self.assertEqual(
+                cached_model._keys_in_modules_that_do_not_support_autocast,
+                {k for k in model.state_dict() if ".norm." in k},
+            )
+            self.assertEqual(
+                sorted(cached_model._state_dict_keys_by_module_prefix["blocks.0.mlp.0"]),
+                ["blocks.0.mlp.0.bias", "blocks.0.mlp.0.weight"],
+            )
+            self.assertEqual(cached_model.total_bytes(), sum(v.nelement() * v.element_size() for v in model.state_dict().values()))
+
+
+class TestGGUFDequantize(unittest.TestCase):
+    def test_torch_matches_numpy(self):
+        import gguf
+        import numpy as np
+        import torch
+        from backend.quantization.gguf.utils import dequantize
+
+        for qtype in [gguf.GGMLQuantizationType.IQ4_NL, gguf.GGMLQuantizationType.IQ4_XS]:
+            block_size, type_size = gguf.GGML_QUANT_SIZES[qtype]
+            blocks = np.random.randint(0, 256, size=(4, type_size * 2), dtype=np.uint8)
+            # 把每个块的缩放系数设为有限的fp16，避免随机字节产生NaN
+            for i in range(0, blocks.shape[1], type_size):
+                blocks[:, i : i + 2] = np.full((4, 1), 0.5, dtype=np.float16).view(np.uint8)
+            expected = gguf.quants.dequantize(blocks, qtype)
+            actual = dequantize(torch.from_numpy(blocks), qtype, torch.Size(expected.shape), torch.float32)
+            np.testing.assert_allclose(actual.numpy(), expected, rtol=1e-3)
+
+    def test_q8_blocks_match_reference(self):
+        """Q8_1和Q8_K按ggml的块结构构造，torch实现与gguf的numpy实现一致
+
+        gguf-py没有实现的类型按块结构直接计算 d * qs 作为参考。
+        """
+        import gguf
+        import numpy as np
+        import torch
+        from backend.quantization.gguf.utils import dequantize
+
+        rng = np.random.default_rng(0)
+        layouts = {
+            # block_q8_1: fp16 d, fp16 s = d * sum(qs), int8 qs[32]
+            gguf.GGMLQuantizationType.Q8_1: np.dtype([("d", "<f2"), ("s", "<f2"), ("qs", "i1", 32)]),
+            # block_q8_K: fp32 d, int8 qs[256], int16 bsums[16]（每16个qs的和）
+            gguf.GGMLQuantizationType.Q8_K: np.dtype([("d", "<f4"), ("qs", "i1", 256), ("bsums", "<i2", 16)]),
+        }
+        for qtype, layout in layouts.items():
+            block_size, type_size = gguf.GGML_QUANT_SIZES[qtype]
+            self.assertEqual(layout.itemsize, type_size)
+            blocks = np.zeros(8, dtype=layout)
+            blocks["d"] = rng.uniform(-0.1, 0.1, size=8)
+            blocks["qs"] = rng.integers(-128, 128, size=(8, block_size))
+            if "s" in layout.names:
+                blocks["s"] = blocks["d"] * blocks["qs"].sum(axis=1)
+            else:
+                blocks["bsums"] = blocks["qs"].reshape(8, -1, 16).sum(axis=2)
+            raw = blocks.view(np.uint8).reshape(2, -1)
+
+            try:
+                expected = gguf.quants.dequantize(raw, qtype)
+            except NotImplementedError:
+                expected = (blocks["d"].astype(np.float32)[:, None] * blocks["qs"]).reshape(2, -1)
+            actual = dequantize(torch.from_numpy(raw), qtype, torch.Size(expected.shape), torch.float32)
+            self.assertTrue(torch.allclose(actual, torch.from_numpy(expected).float(), rtol=1e-3, atol=1e-6), qtype.name)
+
+    def test_dequantized_tensor_cache(self):
+        import torch
+        from backend.quantization.gguf.ggml_tensor import DequantizedTensorCache
+
+        cache = DequantizedTensorCache(max_bytes=2 * 4 * 16)
+        weights = [torch.zeros(16) for _ in range(3)]
+        calls = []
+
+        def dequantize_fn(i):
+            calls.append(i)
+            return torch.full((16,), float(i))
+
+        first = cache.get_or_create(weights[0], lambda: dequantize_fn(0))
+        self.assertIs(cache.get_or_create(weights[0], lambda: dequantize_fn(0)), first)
+        cache.get_or_create(weights[1], lambda: dequantize_fn(1))
+        # 超出预算后淘汰最久未使用的权重
+        cache.get_or_create(weights[2], lambda: dequantize_fn(2))
+        cache.get_or_create(weights[0], lambda: dequantize_fn(0))
+        self.assertEqual(calls, [0, 1, 2, 0])
+        self.assertLessEqual(cache.cur_bytes, cache.max_bytes)
+        # 权重被释放后对应的缓存条目随之删除
+        del weights[0]
+        self.assertEqual(len(cache), 1)
+
+
+class TestMmapCheckpoint(unittest.TestCase):
+    def test_load_state_dict(self):
+        import os
+        import tempfile
+        import torch
+        from safetensors.torch import save_file
+        from backend.model_manager.util.model_util import load_state_dict
+
+        state_dict = {
+            "weight": torch.randn(4, 3, dtype=torch.float16),
+            "bias": torch.arange(3, dtype=torch.float32),
+            "step": torch.tensor(7, dtype=torch.int64),
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for file_name in ["model.safetensors", "model.ckpt"]:
+                path = os.path.join(temp_dir, file_name)
+                if file_name.endswith(".safetensors"):
+                    save_file(state_dict, path)
+                else:
+                    torch.save(state_dict, path)
+
+                loaded = load_state_dict(path, mmap=True)
+                self.assertEqual(loaded.keys(), state_dict.keys())
+                for key, value in state_dict.items():
+                    self.assertEqual(loaded[key].dtype, value.dtype)
+                    self.assertTrue(torch.equal(loaded[key], value))
+
+                # 映射是写时复制的，修改张量不会写回文件
+                loaded["bias"].add_(1)
+                self.assertTrue(torch.equal(load_state_dict(path, mmap=True)["bias"], state_dict["bias"]))
+                del loaded
+
+
+class TestDeviceTransfer(unittest.TestCase):
+    def test_full_load_through_transfer(self):
+        import torch
+        from backend.model_manager.load.model_cache.cached_model.cached_model_only_full_load import (
+            CachedModelOnlyFullLoad,
+        )
+        from backend.model_manager.load.model_cache.device_transfer import DeviceTransfer
+
+        # 没有GPU时以CPU作为执行设备，走与CUDA相同的加载路径，只是同步拷贝
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        transfer = DeviceTransfer(device, pinned_budget_bytes=2**20)
+        model = torch.nn.Linear(8, 8)
+        expected = model.weight.detach().clone()
+        cached_model = CachedModelOnlyFullLoad(model, device, 8 * 9 * 4, keep_ram_copy=True, transfer=transfer)
+        self.assertEqual(transfer.pinned_bytes, cached_model.pinned_bytes())
+
+        cached_model.full_load_to_vram()
+        transfer.wait()
+        self.assertEqual(model.weight.device.type, device.type)
+        self.assertTrue(torch.equal(model.weight.cpu(), expected))
+
+        cached_model.full_unload_from_vram()
+        self.assertEqual(model.weight.device.type, "cpu")
+        transfer.release(cached_model.pinned_bytes())
+        self.assertEqual(transfer.pinned_bytes, 0)
+
+
+class TestLoRADeltaCache(unittest.TestCase):
+    def test_fused_patches_reuse_deltas(self):
+        import torch
+        from backend.patches.layer_patcher import LayerPatcher
+        from backend.patches.layers.lora_layer import LoRALayer
+        from backend.patches.lora_delta_cache import LoRADeltaCache
+        from backend.patches.model_patch_raw import ModelPatchRaw
+
+        model = torch.nn.Sequential(torch.nn.Linear(8, 8), torch.nn.Linear(8, 8))
+        original = {k: v.clone() for k, v in model.state_dict().items()}
+
+        def make_lora(*module_keys):
+            return ModelPatchRaw(
+                {f"lora_{key}": LoRALayer(torch.randn(8, 2), None, torch.randn(2, 8), None, None) for key in module_keys}
+            )
+
+        lora_a, lora_b, lora_c = make_lora("0", "1"), make_lora("0"), make_lora("0")
+        expected_0 = original["0.weight"] + lora_a.layers["lora_0"].up @ lora_a.layers["lora_0"].down * 0.5
+        expected_0 += lora_b.layers["lora_0"].up @ lora_b.layers["lora_0"].down
+
+        cache = LoRADeltaCache(max_bytes=2**20)
+        for _ in range(2):
+            with LayerPatcher.apply_smart_model_patches(
+                model=model,
+                patches=[(lora_a, 0.5), (lora_b, 1.0)],
+                prefix="lora_",
+                dtype=torch.float32,
+                force_direct_patching=True,
+                delta_cache=cache,
+            ):
+                torch.testing.assert_close(model[0].weight, expected_0)
+            # 退出后恢复原始权重
+            for key, value in model.state_dict().items():
+                self.assertTrue(torch.equal(value, original[key]))
+        # 每个层的多个LoRA合并为一个增量，第二次运行全部命中缓存
+        self.assertEqual((cache.misses, cache.hits, len(cache)), (2, 2, 2))
+
+        # 更换LoRA组合时只重新计算受影响的层
+        with LayerPatcher.apply_smart_model_patches(
+            model=model,
+            patches=[(lora_a, 0.5), (lora_c, 1.0)],
+            prefix="lora_",
+            dtype=torch.float32,
+            force_direct_patching=True,
+            delta_cache=cache,
+        ):
+            pass
+        self.assertEqual((cache.misses, cache.hits), (3, 3))
+
+    def test_weight_dependent_layers_applied_in_order(self):
+        import torch
+        from backend.patches.layer_patcher import LayerPatcher
+        from backend.patches.layers.lora_layer import LoRALayer
+        from backend.patches.layers.set_parameter_layer import SetParameterLayer
+        from backend.patches.lora_delta_cache import LoRADeltaCache
+        from backend.patches.model_patch_raw import ModelPatchRaw
+
+        model = torch.nn.Sequential(torch.nn.Linear(8, 8))
+        lora = ModelPatchRaw({"lora_0": LoRALayer(torch.randn(8, 2), None, torch.randn(2, 8), None, None)})
+        target = torch.randn(8, 8)
+        set_weight = ModelPatchRaw({"lora_0": SetParameterLayer("weight", target)})
+
+        # 依赖当前权重的层按顺序作用在已修改的权重上，LoRA之后设置的参数不应再叠加LoRA的增量
+        with LayerPatcher.apply_smart_model_patches(
+            model=model,
+            patches=[(lora, 1.0), (set_weight, 1.0)],
+            prefix="lora_",
+            dtype=torch.float32,
+            force_direct_patching=True,
+            delta_cache=LoRADeltaCache(max_bytes=2**20),
+        ):
+            torch.testing.assert_close(model[0].weight, target)
+
+
+class TestByteLRUCache(unittest.TestCase):
+    def test_evicts_by_size(self):
+        from backend.util.byte_lru_cache import ByteLRUCache
+
+        cache = ByteLRUCache(max_bytes=10)
+        self.assertTrue(cache.put("a", 1, 4))
+        self.assertTrue(cache.put("b", 2, 4))
+        self.assertEqual(cache.get("a"), 1)
+        # 超出预算时淘汰最久未使用的b
+        self.assertTrue(cache.put("c", 3, 4))
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.cur_bytes, 8)
+        # 单个条目超过预算时不缓存，同时移除旧值
+        self.assertFalse(cache.put("a", 4, 11))
+        self.assertIsNone(cache.get("a"))
+        cache.set_max_bytes(0)
+        self.assertEqual((len(cache), cache.cur_bytes), (0, 0))
+
+    def test_budgets_must_fit_working_memory(self):
+        from ssui_image.api.model import ModelCacheSettings, create_model_cache
+
+        # 反量化和LoRA增量缓存占用推理时预留的显存，不能超出
+        settings = ModelCacheSettings(device_working_mem_gb=3, gguf_dequant_cache_gb=2, lora_delta_cache_gb=1)
+        with self.assertRaises(ValueError):
+            create_model_cache(settings)
+
+
+class TestLoRAFusion(unittest.TestCase):
+    def build_model(self, blocks_per_dim, device, dtype):
+        import torch
+
+        # 每个transformer块按SD的注意力层取q、k、v、out以及交叉注意力的q、out，维度按UNet各层级
+        layers = {}
+        for dim, num_blocks in blocks_per_dim:
+            for i in range(num_blocks):
+                for name in ["attn1_to_q", "attn1_to_k", "attn1_to_v", "attn1_to_out", "attn2_to_q", "attn2_to_out"]:
+                    layers[f"d{dim}_b{i}_{name}"] = torch.nn.Linear(dim, dim, bias=False, device=device, dtype=dtype)
+        return torch.nn.ModuleDict(layers)
+
+    def make_loras(self, model, count: int, rank: int):
+        import torch
+        from backend.patches.layers.lora_layer import LoRALayer
+        from backend.patches.model_patch_raw import ModelPatchRaw
+
+        return [
+            ModelPatchRaw(
+                {
+                    f"lora_unet_{key}": LoRALayer(
+                        torch.randn(module.out_features, rank, dtype=torch.float16) * 0.01,
+                        None,
+                        torch.randn(rank, module.in_features, dtype=torch.float16) * 0.01,
+                        float(rank),
+                        None,
+                    )
+                    for key, module in model.items()
+                }
+            )
+            for _ in range(count)
+        ]
+
+    @unittest.skipIf(not should_run_slow_tests(), "Skipping slow test")
+    def test_fused_vs_per_lora_patching(self):
+        import time
+        import torch
+        from backend.patches.layer_patcher import LayerPatcher
+        from backend.util.original_weights_storage import OriginalWeightsStorage
+
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        dtype = torch.float16 if device.type == "cuda" else torch.float32
+
+        def sync():
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+
+        # SD1: 16个transformer块，SDXL: 70个，集中在640和1280两个层级
+        for name, blocks_per_dim in [("sd1", [(320, 4), (640, 4), (1280, 8)]), ("sdxl", [(640, 4), (1280, 66)])]:
+            model = self.build_model(blocks_per_dim, device, dtype)
+            loras = self.make_loras(model, count=5, rank=16)
+            patches = [(lora, 0.8) for lora in loras]
+
+            sync()
+            start = time.perf_counter()
+            per_lora_weights = OriginalWeightsStorage()
+            for patch, weight in patches:
+                LayerPatcher.apply_smart_model_patch(
+                    model, "lora_unet_", patch, weight, per_lora_weights, {}, dtype, True, False
+                )
+            sync()
+            per_lora = time.perf_counter() - start
+            expected = {k: v.clone() for k, v in model.state_dict().items()}
+            for param_key, weight in per_lora_weights.get_changed_weights():
+                model.get_parameter(param_key).copy_(weight)
+
+            sync()
+            start = time.perf_counter()
+            LayerPatcher.apply_smart_model_patch_set(
+                model, "lora_unet_", patches, OriginalWeightsStorage(), {}, dtype, True, False
+            )
+            sync()
+            fused = time.perf_counter() - start
+
+            print(f"{name}: {len(model)} layers x {len(loras)} LoRAs, per LoRA {per_lora * 1000:.1f} ms, fused {fused * 1000:.1f} ms")
+            for key, value in model.state_dict().items():
+                torch.testing.assert_close(value, expected[key], rtol=1e-2, atol=1e-3)
@@ -46,3 +46,169 @@ class TestCosyVoice(unittest.TestCase):
         for i, j in enumerate(cosyvoice.inference_zero_shot(text_generator(), '希望你以后能够做的比我还好呦。', prompt_speech_16k, stream=False)):
             torchaudio.save('zero_shot_split_{}.wav'.format(i), j['tts_speech'], cosyvoice.sample_rate)
 
+    def test_batch_engine(self):
+        """并发请求进入同一个批次解码，每个请求都得到自己的语音"""
+        from cosyvoice.cli.batch_engine import BatchTTSEngine
+        from cosyvoice.cli.cosyvoice import CosyVoice2
+        from cosyvoice.utils.file_utils import load_wav
+
+        cosyvoice = CosyVoice2('iic/CosyVoice2-0.5B', load_jit=False, load_trt=False, fp16=False)
+        prompt_speech_16k = load_wav('./tests/data/zero_shot_prompt.wav', 16000)
+        assert cosyvoice.add_zero_shot_spk('希望你以后能够做的比我还好呦。', prompt_speech_16k, 'my_zero_shot_spk') is True
+
+        engine = BatchTTSEngine(cosyvoice.model, max_batch_size=4)
+        texts = ['收到好友从远方寄来的生日礼物。', '那份意外的惊喜与深深的祝福。', '让我心中充满了甜蜜的快乐。', '笑容如花儿般绽放。']
+        futures = [engine.submit(cosyvoice.frontend.frontend_zero_shot(text, '', None, cosyvoice.sample_rate, 'my_zero_shot_spk'))
+                   for text in texts]
+        for future in futures:
+            speech = future.result(timeout=600)
+            self.assertEqual(speech.shape[0], 1)
+            self.assertGreater(speech.shape[1], 0)
+        engine.shutdown()
+
+
+class TestBatchEngineScheduling(unittest.TestCase):
+    """不加载模型，用假的llm检查连续批处理的调度和出错处理"""
+
+    def make_engine(self, samples, max_batch_size=2):
+        import queue
+        import torch
+        from types import SimpleNamespace
+        from cosyvoice.cli.batch_engine import BatchTTSEngine, _KVBatch
+
+        samples = iter(samples)
+
+        def sampling_ids(logp, out_tokens, sampling, ignore_eos):
+            sample = next(samples)
+            if isinstance(sample, Exception):
+                raise sample
+            if sample is None:
+                # 按logp取最可能的token
+                return logp.argmax()
+            return torch.tensor(sample)
+
+        def prepare_inference_input(text, **kwargs):
+            # 文本长度就是要生成的token数
+            return torch.zeros(1, 3, 4), 0, text.shape[1]
+
+        def forward_one_step(lm_input, masks, cache):
+            length = lm_input.shape[1]
+            return lm_input, ((torch.zeros(1, 1, length, 2), torch.zeros(1, 1, length, 2)),)
+
+        def forward_batch_step(xs, attention_mask, position_ids, cache):
+            column = torch.zeros(xs.shape[0], 1, 1, 2)
+            return xs, tuple((torch.concat([k, column], dim=2), torch.concat([v, column], dim=2)) for k, v in cache)
+
+        llm = SimpleNamespace(
+            llm=SimpleNamespace(forward_one_step=forward_one_step, forward_batch_step=forward_batch_step),
+            prepare_inference_input=prepare_inference_input,
+            # 和Qwen2LM一样多出eos之后的特殊token，特殊token的分数最高
+            llm_decoder=lambda y: torch.tensor([0.0] * 3 + [1.0] + [0.0] * 7 + [5.0] * 2).repeat(y.shape[0], 1),
+            sampling_ids=sampling_ids,
+            speech_token_size=10,
+            speech_embedding=SimpleNamespace(weight=torch.zeros(13, 4)),
+        )
+        # 不启动线程，由测试逐步驱动
+        engine = BatchTTSEngine.__new__(BatchTTSEngine)
+        engine.model = SimpleNamespace(llm=llm, device='cpu')
+        engine.max_batch_size = max_batch_size
+        engine.max_flow_batch_size = 4
+        engine.sampling = 25
+        engine.requests = queue.Queue()
+        engine.flow_requests = queue.Queue()
+        engine.active = []
+        engine.kv = _KVBatch()
+        engine.is_running = True
+        return engine
+
+    def submit(self, engine, length):
+        import torch
+        return engine.submit({'text': torch.zeros(1, length, dtype=torch.int32)})
+
+    def test_kv_batch(self):
+        """不同长度的序列左侧补齐后合并，移除序列时去掉所有行都是补齐的列"""
+        import torch
+        from cosyvoice.cli.batch_engine import _KVBatch
+
+        def cache(length):
+            return tuple((torch.ones(1, 2, length, 4), torch.ones(1, 2, length, 4)) for _ in range(3))
+
+        kv = _KVBatch()
+        kv.add(cache(5), 5)
+        kv.add(cache(8), 8)
+        self.assertEqual(kv.cache[0][0].shape, (2, 2, 8, 4))
+        self.assertEqual(kv.valid.sum(dim=1).tolist(), [5, 8])
+        self.assertEqual(kv.positions.tolist(), [5, 8])
+
+        attention_mask, position_ids = kv.step_inputs()
+        self.assertEqual(attention_mask.shape, (2, 9))
+        self.assertEqual(position_ids.tolist(), [[5], [8]])
+
+        kv.keep([0])
+        self.assertEqual(kv.cache[0][0].shape, (1, 2, 5, 4))
+        self.assertTrue(kv.valid.all())
+        kv.keep([])
+        self.assertIsNone(kv.cache)
+
+    def test_continuous_batching(self):
+        """批次满时请求排队，有序列结束后在下一步加入，每个序列生成自己的token数"""
+        engine = self.make_engine([1] * 100)
+        futures = [self.submit(engine, length) for length in (2, 4, 3)]
+
+        engine._admit()
+        self.assertEqual(len(engine.active), 2)
+        self.assertEqual(engine.requests.qsize(), 1)
+        engine._decode_or_fail()
+        # 第一个序列生成2个token后结束，第三个请求在下一步补进批次
+        self.assertEqual(engine.flow_requests.qsize(), 1)
+        engine._admit()
+        self.assertEqual(len(engine.active), 2)
+        while len(engine.active) != 0:
+            self.assertEqual(engine.kv.cache[0][0].shape[0], len(engine.active))
+            engine._decode_or_fail()
+
+        finished = [engine.flow_requests.get_nowait() for _ in range(3)]
+        lengths = {id(seq.future): len(seq.out_tokens) for seq in finished}
+        self.assertEqual([lengths[id(future)] for future in futures], [2, 4, 3])
+
+    def test_special_tokens_never_sampled(self):
+        """特殊token不会被采样，prefill之后马上解码也不会把整段prompt留作下一步的输入"""
+        # 第一个序列prefill时按logp采样，其余都是普通token
+        engine = self.make_engine([None] + [1] * 100)
+        first, second = self.submit(engine, 3), self.submit(engine, 3)
+        engine._admit()
+        self.assertEqual([seq.lm_input.shape for seq in engine.active], [(1, 1, 4), (1, 1, 4)])
+        while len(engine.active) != 0:
+            engine._decode_or_fail()
+
+        self.assertFalse(first.done())
+        self.assertFalse(second.done())
+        finished = [engine.flow_requests.get_nowait() for _ in range(2)]
+        self.assertEqual([seq.out_tokens for seq in finished], [[3, 1, 1], [1, 1, 1]])
+
+    def test_decode_error_keeps_finished_sequences(self):
+        """解码出错时只让还在解码的请求失败，同一步里已经结束的请求照常合成语音"""
+        import threading
+        import torch
+
+        # 两次prefill各采样一次；解码时第一个序列结束，第二个序列采样出错；最后一次给出错后的新请求
+        engine = self.make_engine([1, 1, 1, RuntimeError('decode failed'), 1])
+        finished, failed = self.submit(engine, 2), self.submit(engine, 5)
+        engine._admit()
+        engine._decode_or_fail()
+        self.assertEqual(engine.active, [])
+        self.assertIsInstance(failed.exception(timeout=0), RuntimeError)
+        self.assertFalse(finished.done())
+
+        engine._token2wav = lambda batch: [torch.zeros(1, 4) for _ in batch]
+        flow_thread = threading.Thread(target=engine._flow_loop)
+        flow_thread.start()
+        try:
+            self.assertEqual(finished.result(timeout=5).shape, (1, 4))
+            # 流程线程仍在运行，出错之后的请求照常完成
+            later = self.submit(engine, 1)
+            engine._admit()
+            self.assertEqual(later.result(timeout=5).shape, (1, 4))
+        finally:
+            engine.is_running = False
+            flow_thread.join()
@@ -2,6 +2,8 @@ from unittest.mock import MagicMock, AsyncMock
 from typing import Dict, Any, List, Optional
 import asyncio
 
+from ss_executor.transport import ResultCache
+
 class MockConfigService:
     def __init__(self):
         self.config = {}
@@ -33,5 +35,6 @@ class MockTaskScheduler:
     def __init__(self):
         self.start = AsyncMock()
         self.stop = AsyncMock()
+        self.result_cache = ResultCache()
         self.add_task = AsyncMock(return_value={"task_id": "test_task_id"})
         self.get_task_status = AsyncMock(return_value={"status": "running"})
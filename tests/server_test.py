@@ -115,3 +115,176 @@ class TestServer(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
 
 
+
+class TestModelInfoCache(unittest.TestCase):
+    def test_index_survives_restart(self):
+        import tempfile
+        from server.resource_manager import ModelInfoCache
+
+        class FakeConfig:
+            def __init__(self, key):
+                self.key = key
+
+            def model_dump(self, mode=None):
+                return {"key": self.key}
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model_path = os.path.join(temp_dir, "model.safetensors")
+            with open(model_path, "wb") as f:
+                f.write(b"weights")
+            index_path = os.path.join(temp_dir, "model_index.jsonl")
+
+            with patch("server.resource_manager.ModelProbe.probe", return_value=FakeConfig("abc")) as probe, \
+                    patch("server.resource_manager.ModelConfigFactory.make_config", side_effect=lambda c: FakeConfig(c["key"])):
+                self.assertEqual(ModelInfoCache(index_path)._get(model_path).key, "abc")
+                self.assertEqual(probe.call_count, 1)
+
+                # 重启后直接命中索引，不再探测
+                self.assertEqual(ModelInfoCache(index_path)._get(model_path).key, "abc")
+                self.assertEqual(probe.call_count, 1)
+
+                # 文件变化后重新探测
+                with open(model_path, "ab") as f:
+                    f.write(b"more")
+                self.assertEqual(ModelInfoCache(index_path)._get(model_path).key, "abc")
+                self.assertEqual(probe.call_count, 2)
+
+    def test_failed_probe_not_persisted(self):
+        import tempfile
+        from server.resource_manager import ModelInfoCache
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model_path = os.path.join(temp_dir, "not_a_model.safetensors")
+            with open(model_path, "wb") as f:
+                f.write(b"garbage")
+            index_path = os.path.join(temp_dir, "model_index.jsonl")
+
+            with patch("server.resource_manager.ModelProbe.probe", side_effect=ValueError) as probe:
+                cache = ModelInfoCache(index_path)
+                self.assertIsNone(cache._get(model_path))
+                # 同一进程内不重复探测
+                self.assertIsNone(cache._get(model_path))
+                self.assertEqual(probe.call_count, 1)
+
+                # 失败不写入索引，重启后重新探测
+                self.assertIsNone(ModelInfoCache(index_path)._get(model_path))
+                self.assertEqual(probe.call_count, 2)
+
+
+class TestModelScan(unittest.TestCase):
+    def test_failed_model_dir_is_scanned(self):
+        import asyncio
+        import tempfile
+        from server.model_service import ModelService
+
+        with tempfile.TemporaryDirectory() as root:
+            model_dir = os.path.join(root, "broken_diffusers")
+            os.makedirs(os.path.join(model_dir, "nested"))
+            good_path = os.path.join(model_dir, "nested", "good.ckpt")
+            bad_path = os.path.join(root, "bad.ckpt")
+            for path in (good_path, bad_path):
+                with open(path, "wb") as f:
+                    f.write(b"x")
+
+            async def scan():
+                loop = asyncio.get_event_loop()
+                finished = loop.create_future()
+                service = ModelService(root)
+                await service.scan_models(
+                    root, "client", "uuid",
+                    callback=lambda *args: None,
+                    finish_callback=lambda client_id, request_uuid, data: finished.set_result(data),
+                )
+                return await finished
+
+            # 目录通过了配置文件检查但完整探测失败
+            with patch("server.model_service._is_model_dir", side_effect=lambda path: path == model_dir), \
+                    patch("server.model_service.ModelInfoCache.get", side_effect=lambda path: object() if path == good_path else None):
+                result = asyncio.run(scan())
+
+            # 探测失败的目录不跳过子目录，无法识别的文件也会报告
+            self.assertEqual([model["path"] for model in result["models"]], [good_path])
+            self.assertEqual(sorted(model["path"] for model in result["unrecognized"]), sorted([model_dir, bad_path]))
+
+
+    def test_incremental_scan_detects_rewritten_files(self):
+        import asyncio
+        import tempfile
+        from server.model_service import ModelService
+
+        with tempfile.TemporaryDirectory() as root:
+            model_path = os.path.join(root, "model.ckpt")
+            with open(model_path, "wb") as f:
+                f.write(b"old weights")
+            service = ModelService(root)
+
+            async def scan():
+                loop = asyncio.get_event_loop()
+                finished = loop.create_future()
+                await service.scan_models(
+                    root, "client", "uuid",
+                    callback=lambda *args: None,
+                    finish_callback=lambda client_id, request_uuid, data: finished.set_result(data),
+                    incremental=True,
+                )
+                return await finished
+
+            with patch("server.model_service._is_model_dir", return_value=False), \
+                    patch("server.model_service.ModelInfoCache.get", return_value=object()) as probe:
+                asyncio.run(scan())
+                # 没有变化的目录直接返回上次的结果
+                result = asyncio.run(scan())
+                self.assertEqual([model["path"] for model in result["models"]], [model_path])
+                self.assertEqual(probe.call_count, 1)
+
+                # 覆盖写入文件不改变目录的mtime，但仍要重新探测
+                root_mtime = os.stat(root).st_mtime_ns
+                with open(model_path, "wb") as f:
+                    f.write(b"new weights, longer")
+                os.utime(root, ns=(root_mtime, root_mtime))
+                result = asyncio.run(scan())
+                self.assertEqual([model["path"] for model in result["models"]], [model_path])
+                self.assertEqual(probe.call_count, 2)
+
+
+class TestFileIndex(unittest.TestCase):
+    def test_incremental_listing(self):
+        import tempfile
+        from server.file_index import FileIndex
+
+        with tempfile.TemporaryDirectory() as root:
+            output_dir = os.path.join(root, "output")
+            os.makedirs(output_dir)
+            for i, name in enumerate(["b.png", "a.PNG", "c.jpg", "workflow.py", "happy.txt"]):
+                path = os.path.join(output_dir if name != "workflow.py" else root, name)
+                with open(path, "wb") as f:
+                    f.write(b"x")
+                os.utime(path, ns=(i * 10**9, i * 10**9))
+
+            index = FileIndex()
+            total, files = index.list_files(root, "image")
+            self.assertEqual(total, 3)
+            self.assertEqual([os.path.basename(f) for f in files], ["a.PNG", "b.png", "c.jpg"])
+            self.assertEqual(index.list_files(root, "script")[1], [os.path.join(root, "workflow.py")])
+
+            # 分页和按修改时间排序
+            total, files = index.list_files(root, "image", offset=1, limit=1, sort="mtime")
+            self.assertEqual((total, [os.path.basename(f) for f in files]), (3, ["a.PNG"]))
+
+            # 覆盖写入文件不改变目录的mtime，按修改时间排序时仍使用文件当前的mtime
+            output_mtime = os.stat(output_dir).st_mtime_ns
+            os.utime(os.path.join(output_dir, "b.png"), ns=(10**17, 10**17))
+            os.utime(output_dir, ns=(output_mtime, output_mtime))
+            _, files = index.list_files(root, "image", sort="mtime")
+            self.assertEqual([os.path.basename(f) for f in files], ["b.png", "c.jpg", "a.PNG"])
+
+            # 没有变化的目录不会重新列出
+            with patch.object(index, "_scan_dir", wraps=index._scan_dir) as scan_dir:
+                index.list_files(root, "image")
+                scan_dir.assert_not_called()
+
+                os.remove(os.path.join(output_dir, "b.png"))
+                os.utime(output_dir, ns=(10**18, 10**18))
+                total, _ = index.list_files(root, "image")
+                self.assertEqual(total, 2)
+                scan_dir.assert_called_once_with(output_dir, 10**18)
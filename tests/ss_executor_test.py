@@ -3,8 +3,8 @@ import unittest
 import os
 import tempfile
 import yaml
-from ss_executor.loader import SSLoader, SSProject, search_project_root
-from ss_executor.model import Task
+from ss_executor.loader import SSLoader, SSProject, script_requirements, search_project_root
+from ss_executor.model import ExeMessage, ExecutorInfo, Task, TaskProgress, TaskStatus
 from ss_executor.scheduler import TaskScheduler
 from tests.utils import should_run_slow_tests
 
@@ -27,6 +27,166 @@ class TestSSLoader(unittest.TestCase):
         self.loader.load(path)
         self.loader.Execute()
         self.loader.GetConfig('txt2img')
+
+    def test_module_cache(self):
+        """测试脚本未修改时复用已执行的模块"""
+        path = os.path.join(os.path.dirname(__file__), '..', 'examples', 'basic', 'workflow-sd1.py')
+        first = SSLoader(use_cache=True)
+        first.load(path)
+        first.Execute()
+        second = SSLoader(use_cache=True)
+        second.load(path)
+        second.Execute()
+        self.assertIs(first.bundle, second.bundle)
+        self.assertIs(first.executor.compiled_code, second.executor.compiled_code)
+        self.assertEqual([f.__name__ for f, _, _ in first.callables], [f.__name__ for f, _, _ in second.callables])
+
+    def test_prepare_isolated_per_callable(self):
+        """测试共用缓存模块时，各函数prepare的结果只包含自己的参数，与prepare的顺序无关"""
+        from ss_executor import loader
+
+        with tempfile.TemporaryDirectory() as script_dir:
+            path = os.path.join(script_dir, 'workflow.py')
+            with open(path, 'w') as f:
+                f.write(
+                    'from ssui import workflow, Prompt\n'
+                    'from ssui.annotation import param\n'
+                    'from ssui.config import SSUIConfig\n'
+                    'from ssui.controller import Slider\n'
+                    'config = SSUIConfig()\n'
+                    '@param("steps", Slider(1, 100, 1), default=30)\n'
+                    'def Denoise(config, prompt):\n'
+                    '    return prompt\n'
+                    '@param("scale", Slider(0, 1, 0.1), default=0.5)\n'
+                    'def Lora(config, prompt):\n'
+                    '    return prompt\n'
+                    '@workflow\n'
+                    'def plain(prompt: Prompt) -> Prompt:\n'
+                    '    return Denoise(config("Denoise"), prompt)\n'
+                    '@workflow\n'
+                    'def withLora(prompt: Prompt) -> Prompt:\n'
+                    '    prompt = Lora(config("Apply Lora"), prompt)\n'
+                    '    return Denoise(config("Denoise"), prompt)\n'
+                )
+            for order in (['plain', 'withLora'], ['withLora', 'plain']):
+                loader._module_cache.clear()
+                results = {}
+                for name in order:
+                    script = SSLoader(use_cache=True)
+                    script.load(path)
+                    script.Execute()
+                    results[name] = script.GetConfig(name)
+                self.assertEqual(set(results['plain']), {'Denoise'})
+                self.assertEqual(set(results['withLora']), {'Apply Lora', 'Denoise'})
+                self.assertEqual(results['withLora']['Apply Lora']['scale']['default'], 0.5)
+
+                # 之后的prepare不会改动已缓存的结果
+                script.GetConfig('withLora' if order[-1] == 'plain' else 'plain')
+                script.GetPlan('withLora')
+                self.assertEqual(set(script.GetConfig('plain')), {'Denoise'})
+            loader._module_cache.clear()
+
+    def test_module_cache_replaced_on_edit(self):
+        """测试脚本修改后替换该路径的缓存，而不是为每个版本各保留一份"""
+        from ss_executor import loader
+        from ss_executor.sandbox import Sandbox
+
+        source = os.path.join(os.path.dirname(__file__), '..', 'examples', 'basic', 'workflow-sd1.py')
+        with open(source, 'r') as f:
+            code = f.read()
+        with tempfile.TemporaryDirectory() as script_dir:
+            path = os.path.join(script_dir, 'workflow.py')
+            for version in range(3):
+                with open(path, 'w') as f:
+                    f.write(code + f'\n# version {version}\n')
+                os.utime(path, ns=(version, version))
+                script = SSLoader(use_cache=True)
+                script.load(path)
+                script.Execute()
+            keys = [key for key in loader._module_cache if key[1] == os.path.abspath(path)]
+            self.assertEqual(len(keys), 1)
+            self.assertIs(loader._module_cache[keys[0]][1], script.bundle)
+            self.assertIs(Sandbox._compiled_cache[os.path.abspath(path)][1], script.executor.compiled_code)
+
+    def test_compile_cache(self):
+        """测试脚本未修改时不再重新编译，prepare结果按函数缓存"""
+        from unittest.mock import patch
+        from ss_executor import sandbox
+        from ss_executor.sandbox import Sandbox
+
+        path = os.path.join(os.path.dirname(__file__), '..', 'examples', 'basic', 'workflow-sd1.py')
+        with patch.object(Sandbox, "_compiled_cache", {}), \
+                patch.object(sandbox, "compile_restricted", wraps=sandbox.compile_restricted) as compile_restricted:
+            SSLoader().load(path)
+            loader = SSLoader()
+            loader.load(path)
+            self.assertEqual(compile_restricted.call_count, 1)
+
+            loader.Execute()
+            config = loader.GetConfig('txt2img')
+            self.assertIs(loader.GetConfig('txt2img'), config)
+
+    def test_sandbox_getattr(self):
+        """测试沙盒中的属性访问与普通Python一致：不存在的属性抛出AttributeError，允许str.format"""
+        from ss_executor.sandbox import Sandbox
+
+        with tempfile.TemporaryDirectory() as script_dir:
+            path = os.path.join(script_dir, 'attrs.py')
+            with open(path, 'w') as f:
+                f.write(
+                    'name = "{}-{:04d}".format("image", 7)\n'
+                    'missing = "returned"\n'
+                    'try:\n'
+                    '    "abc".no_such_attribute\n'
+                    'except AttributeError:\n'
+                    '    missing = "raised"\n'
+                )
+            sandbox = Sandbox()
+            self.assertIsNotNone(sandbox.execute_file(path))
+            self.assertEqual(sandbox.global_vars["name"], "image-0007")
+            self.assertEqual(sandbox.global_vars["missing"], "raised")
+
+    def test_model_plan(self):
+        """测试prepare阶段记录节点使用模型的顺序，并按顺序预取下一个节点的模型"""
+        from concurrent.futures import ThreadPoolExecutor
+        from ss_executor.prefetch import ModelPrefetcher
+
+        path = os.path.join(os.path.dirname(__file__), '..', 'examples', 'basic', 'workflow-sd1.py')
+        self.loader.load(path)
+        self.loader.Execute()
+        plan = self.loader.GetPlan('txt2img')
+        self.assertEqual(plan, [
+            ("SD1Clip", [("model", "clip")]),
+            ("SD1Denoise", [("model", "unet")]),
+            ("SD1LatentDecode", [("model", "vae")]),
+        ])
+        self.assertFalse(self.loader.config.is_prepare())
+
+        prefetched = []
+
+        class FakeLoadedModel:
+            def __init__(self, name):
+                self.name = name
+
+            def prefetch(self):
+                prefetched.append(self.name)
+
+        class FakeSubModel:
+            def __init__(self, name):
+                self.model = FakeLoadedModel(name)
+
+        class FakeModel:
+            clip = FakeSubModel("clip")
+            unet = FakeSubModel("unet")
+            vae = FakeSubModel("vae")
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            prefetcher = ModelPrefetcher(plan, {"model": FakeModel()}, pool)
+            prefetcher.start()
+            prefetcher.on_node("SD1Clip", {}, ("model.clip",))
+            prefetcher.on_node("SD1Denoise", {}, ("model.unet",))
+            prefetcher.on_node("SD1LatentDecode", {}, ("model.vae",))
+        self.assertEqual(prefetched, ["clip", "unet", "vae"])
         
 
 class TestSSProject(unittest.TestCase):
@@ -91,4 +251,191 @@ class TestScheduler(unittest.TestCase):
             await scheduler.stop()
         asyncio.run(run_scheduler())
 
+    def test_capability_dispatch(self):
+        class FakeWebSocket:
+            def __init__(self):
+                self.sent = []
+
+            async def send(self, message):
+                self.sent.append(message)
+
+        async def run():
+            scheduler = TaskScheduler()
+            cpu = ExecutorInfo("cpu", "localhost", 1, max_tasks=1, capabilities=["cpu"])
+            # 能力名与detect_capabilities上报的一致：设备类型和小写的扩展目录名
+            gpu = ExecutorInfo("gpu", "localhost", 2, max_tasks=2, capabilities=["cuda", "image", "voice"])
+            for executor in (cpu, gpu):
+                scheduler.executors[executor.executor_id] = executor
+                scheduler.executor_websockets[executor.executor_id] = FakeWebSocket()
+
+            # 有能力要求的任务只能分配给满足要求的执行器，要求由脚本导入的扩展包得到
+            script = os.path.join(os.path.dirname(__file__), '..', 'examples', 'basic', 'workflow-sd1.py')
+            requirements = script_requirements(script, {"ssui_image": "image", "cosyvoice": "voice"})
+            self.assertEqual(requirements, ["image"])
+            t1 = Task(script=script, callable="txt2img", requirements=requirements)
+            t2 = Task(script=script, callable="txt2img", requirements=requirements)
+            t3 = Task(script=script, callable="txt2img", requirements=requirements, priority=1)
+            scheduler.add_task(t1)
+            scheduler.add_task(t2)
+            scheduler.add_task(t3)
+            self.assertEqual(t1.executor_id, "gpu")
+            self.assertEqual(t2.executor_id, "gpu")
+            self.assertEqual(t3.status, TaskStatus.PENDING)
+
+            # 无要求的任务分配给负载最低的执行器
+            t4 = Task(script="test.py", callable="test")
+            scheduler.add_task(t4)
+            self.assertEqual(t4.executor_id, "cpu")
+
+            # 执行器空出容量后立即分配队列中的任务
+            gpu.current_tasks -= 1
+            scheduler._dispatch_pending()
+            self.assertEqual(t3.executor_id, "gpu")
+            self.assertTrue(scheduler.task_queue.empty())
+
+        asyncio.run(run())
+
+    def test_progress_forwarding(self):
+        scheduler = TaskScheduler()
+        received = []
+        scheduler.progress_callbacks["task"] = received.append
+
+        message = ExeMessage.validate_json(TaskProgress(task_id="task", step=3, total_steps=20).model_dump_json())
+        self.assertIsInstance(message, TaskProgress)
+        scheduler._handle_task_progress(message)
+        # 没有注册回调的任务进度直接忽略
+        scheduler._handle_task_progress(TaskProgress(task_id="other", step=1, total_steps=20))
+        self.assertEqual([(p.step, p.total_steps) for p in received], [(3, 20)])
+
+    def test_result_file_frames(self):
+        from ss_executor.transport import ResultCache, encode_file_frame
+
+        scheduler = TaskScheduler(ResultCache(max_bytes=10))
+        scheduler._handle_file_frame(encode_file_frame("/out/a.png", "image/png", b"aaaa"))
+        scheduler._handle_file_frame(encode_file_frame("/out/b.png", "image/png", b"bbbb"))
+        data, media_type = scheduler.result_cache.get("/out/a.png")
+        self.assertEqual((bytes(data), media_type), (b"aaaa", "image/png"))
+        # 超过上限时淘汰最久未读取的文件
+        scheduler._handle_file_frame(encode_file_frame("/out/c.png", "image/png", b"cccc"))
+        self.assertIsNone(scheduler.result_cache.get("/out/b.png"))
+        self.assertEqual(bytes(scheduler.result_cache.get("/out/c.png")[0]), b"cccc")
+        self.assertEqual(scheduler.result_cache.size, 8)
+
+    def test_cancel_pending_task(self):
+        async def run():
+            scheduler = TaskScheduler()
+            task = Task(script="test.py", callable="test")
+            scheduler.add_task(task)
+            self.assertTrue(await scheduler.cancel_task(task.task_id))
+            self.assertEqual(task.status, TaskStatus.CANCELLED)
+            # 已取消的任务不会再被分配，也不能重复取消
+            self.assertTrue(scheduler.task_queue.empty())
+            self.assertFalse(await scheduler.cancel_task(task.task_id))
+            self.assertEqual((await scheduler.wait_until_finished(task.task_id)).status, TaskStatus.CANCELLED)
+
+        asyncio.run(run())
+
+
+class TestOutputWriter(unittest.TestCase):
+    def test_parallel_unique_outputs(self):
+        """同一时刻保存的多张图片不能重名，PNG需要写入生成参数"""
+        from PIL import Image as PILImage
+        from backend.image_util.pngwriter import retrieve_metadata
+        from ss_executor.output import OutputWriter
+
+        writer = OutputWriter(format="png", compress_level=1, max_workers=4)
+        metadata = {"callable": "txt2img", "params": {"seed": 1}}
+        with tempfile.TemporaryDirectory() as output_dir:
+            futures = [writer.submit(PILImage.new("RGB", (64, 64)), output_dir, metadata) for _ in range(16)]
+            paths = [f.result().path for f in futures]
+            self.assertEqual(len(set(paths)), 16)
+            self.assertEqual(retrieve_metadata(paths[0])["sd-metadata"], metadata)
+
+            for format in ("webp", "jpeg"):
+                saved = OutputWriter(format=format).submit(PILImage.new("RGBA", (64, 64)), output_dir, metadata).result()
+                with open(saved.path, "rb") as f:
+                    self.assertEqual(f.read(), saved.data)
+        writer.shutdown()
+
+
+class TestNodeCache(unittest.TestCase):
+    def test_rerun_from_changed_node(self):
+        """只修改下游节点的参数时，上游节点直接返回缓存的结果"""
+        from ss_executor.node_cache import NodeCache
+        from ssui.annotation import memoize
+        from ssui.config import SSUIConfig
+        from ssui.progress import reset_node_cache, set_node_cache
+
+        calls = []
+
+        class Result:
+            def __init__(self, value):
+                self.value = value
+
+        @memoize
+        def encode(config, text):
+            calls.append("encode")
+            return Result(text.upper()), Result(text.lower())
+
+        @memoize
+        def denoise(config, positive, negative):
+            calls.append("denoise")
+            return Result(positive.value + negative.value + str(config["steps"]))
+
+        def run(cache, details):
+            config = SSUIConfig()
+            config._update = details
+            token = set_node_cache(cache.session())
+            try:
+                positive, negative = encode(config("Encode"), "Cat")
+                return denoise(config("Denoise"), positive, negative).value
+            finally:
+                reset_node_cache(token)
+
+        cache = NodeCache(max_entries=8)
+        self.assertEqual(run(cache, {"Denoise": {"steps": 10}}), "CATcat10")
+        self.assertEqual(calls, ["encode", "denoise"])
+
+        # 下游参数改变：只重新执行denoise
+        calls.clear()
+        self.assertEqual(run(cache, {"Denoise": {"steps": 20}}), "CATcat20")
+        self.assertEqual(calls, ["denoise"])
+
+        # 输入和参数都没变：全部命中
+        calls.clear()
+        self.assertEqual(run(cache, {"Denoise": {"steps": 10}}), "CATcat10")
+        self.assertEqual(calls, [])
+
+        # 上游参数改变：上游结果变了，下游也要重新执行
+        calls.clear()
+        run(cache, {"Encode": {"clipSkip": 1}, "Denoise": {"steps": 10}})
+        self.assertEqual(calls, ["encode", "denoise"])
+
+        # 没有缓存时照常执行
+        calls.clear()
+        config = SSUIConfig()
+        encode(config("Encode"), "Cat")
+        self.assertEqual(calls, ["encode"])
+
+    def test_byte_budget(self):
+        """按结果中张量的大小淘汰，超过预算的结果不缓存"""
+        import torch
+        from ss_executor.node_cache import NodeCache, value_size
+
+        class Latent:
+            def __init__(self, tensor):
+                self.tensor = tensor
+
+        latent = Latent(torch.zeros(1, 4, 64, 64))
+        # 同一个张量只计算一次
+        self.assertEqual(value_size((latent, [latent.tensor])), 4 * 64 * 64 * 4)
+
+        cache = NodeCache(max_entries=8, max_bytes=2 * value_size(latent))
+        for i in range(3):
+            cache.put(("node", i), Latent(torch.zeros(1, 4, 64, 64)))
+        self.assertEqual(len(cache), 2)
+        self.assertFalse(cache.get(("node", 0))[0])
+        self.assertLessEqual(cache.cur_bytes, 2 * value_size(latent))
 
+        cache.put(("large", 0), Latent(torch.zeros(1, 4, 128, 128)))
+        self.assertFalse(cache.get(("large", 0))[0])